@@ -0,0 +1,404 @@
+"""
+Blocked gzip (BGZF) files with a sidecar block index for random access to records
+"""
+import gzip
+import io
+import os
+import struct
+import zlib
+from bisect import bisect_right
+
+# Maximum uncompressed size of a block, as used by htslib
+BLOCK_SIZE = 65280
+
+# Empty block marking the end of a BGZF file
+EOF_BLOCK = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+# Gzip member header with the BC extra subfield holding the block size
+_HEADER = struct.Struct('<4BI2BH2BHH')
+
+# Extension of the sidecar index file
+INDEX_EXTENSION = '.bgzi'
+
+# Index header of the magic number, size and modification time of the indexed file, and number of blocks
+_INDEX_HEADER = struct.Struct('<8sQqQ')
+_INDEX_MAGIC = b'AIRRBGI1'
+
+
+def is_bgzf(filename):
+    """
+    Check whether a file is block gzipped
+
+    Arguments:
+      filename (str): file path.
+
+    Returns:
+      bool: True if the first block of the file has a BGZF header.
+    """
+    with open(filename, 'rb') as handle:
+        data = handle.read(_HEADER.size)
+    if len(data) < _HEADER.size:
+        return False
+    id1, id2, cm, flg, __, __, __, xlen, si1, si2, slen, __ = _HEADER.unpack(data)
+    return (id1, id2, cm, flg & 4, si1, si2, slen) == (31, 139, 8, 4, 66, 67, 2)
+
+
+def _blocks(handle):
+    """
+    Generator over the blocks of a BGZF file
+
+    Arguments:
+      handle (file): binary file handle positioned at the start of a block.
+
+    Returns:
+      generator: tuples of the block offset in the file and the compressed block data.
+    """
+    offset = handle.tell()
+    while True:
+        data = handle.read(_HEADER.size)
+        if not data:
+            return
+        if len(data) < _HEADER.size:
+            raise ValueError('Truncated BGZF block at offset %i' % offset)
+        id1, id2, __, flg, __, __, __, xlen, si1, si2, __, bsize = _HEADER.unpack(data)
+        if (id1, id2, flg & 4, si1, si2) != (31, 139, 4, 66, 67) or xlen != 6:
+            raise ValueError('Invalid BGZF block at offset %i' % offset)
+        block = handle.read(bsize + 1 - _HEADER.size)
+        yield offset, data + block
+        offset += bsize + 1
+
+
+def _compress_block(data, level):
+    """
+    Compress data into a single BGZF block
+
+    Arguments:
+      data (bytes): at most BLOCK_SIZE bytes of data.
+      level (int): compression level.
+
+    Returns:
+      bytes: the BGZF block.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    header = _HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(cdata) + 25)
+    return header + cdata + struct.pack('<II', zlib.crc32(data), len(data))
+
+
+def write_index(filename, index):
+    """
+    Write the sidecar block index of a BGZF file
+
+    The index is stored as a header recording the size and modification time of the
+    file and the number of blocks, followed by the compressed offset, uncompressed
+    offset and line number of each block starting at the beginning of a line, as
+    little-endian unsigned 64-bit integers. The file must be complete when the index
+    is written.
+
+    Arguments:
+      filename (str): path of the BGZF file. The index is written to filename + '.bgzi'.
+      index (list): tuples of compressed offset, uncompressed offset and line number.
+    """
+    st = os.stat(filename)
+    path = filename + INDEX_EXTENSION
+    with open(path + '.tmp', 'wb') as handle:
+        handle.write(_INDEX_HEADER.pack(_INDEX_MAGIC, st.st_size, st.st_mtime_ns, len(index)))
+        for entry in index:
+            handle.write(struct.pack('<QQQ', *entry))
+    os.replace(path + '.tmp', path)
+
+
+def read_index(filename):
+    """
+    Read the sidecar block index of a BGZF file
+
+    Arguments:
+      filename (str): path of the BGZF file.
+
+    Returns:
+      list: tuples of compressed offset, uncompressed offset and line number, or None
+            if the file has no index or the size or modification time of the file
+            changed since it was indexed.
+    """
+    try:
+        with open(filename + INDEX_EXTENSION, 'rb') as handle:
+            data = handle.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < _INDEX_HEADER.size:
+        return None
+    magic, size, mtime, count = _INDEX_HEADER.unpack_from(data)
+    st = os.stat(filename)
+    if magic != _INDEX_MAGIC or (size, mtime) != (st.st_size, st.st_mtime_ns) \
+            or len(data) != _INDEX_HEADER.size + 24 * count:
+        return None
+    return [struct.unpack_from('<QQQ', data, _INDEX_HEADER.size + 24 * i) for i in range(count)]
+
+
+def index_bgzf(filename, write=True):
+    """
+    Build the block index of an existing BGZF file
+
+    Arguments:
+      filename (str): path of the BGZF file.
+      write (bool): if True, write the index to the sidecar file.
+
+    Returns:
+      list: tuples of compressed offset, uncompressed offset and line number.
+    """
+    index = []
+    uoffset, lines, aligned = 0, 0, True
+    with open(filename, 'rb') as handle:
+        for offset, block in _blocks(handle):
+            data = zlib.decompress(block[_HEADER.size:-8], -15)
+            if not data:
+                continue
+            if aligned:
+                index.append((offset, uoffset, lines))
+            uoffset += len(data)
+            lines += data.count(b'\n')
+            aligned = data.endswith(b'\n')
+
+    if write:
+        write_index(filename, index)
+
+    return index
+
+
+def concatenate(out_filename, in_filenames, skip_lines=0, index=True):
+    """
+    Concatenate BGZF files by copying their compressed blocks
+
+    Only the blocks holding the skipped lines of the second and later files are
+    recompressed, with the data following the skipped lines compressed into a new block.
+    A block holding a line terminator is added after files whose last line is unterminated.
+    The index of the output file is built from the up to date indexes of the input
+    files, decompressing only the blocks that they do not describe.
+
+    Arguments:
+      out_filename (str): output file path.
+      in_filenames (list): list of BGZF files to concatenate.
+      skip_lines (int): number of leading lines to skip in the second and later files,
+                        such as a header line.
+      index (bool): if True, write the sidecar block index of the output file.
+                    Otherwise any existing index of the output file is removed.
+    """
+    entries = []
+    uoffset, lines, aligned = 0, 0, True
+
+    def write(block, data=None, count=None):
+        # Write a block, recording its position if it starts at the beginning of a line.
+        # Lines are counted in the block data unless count is given, which is only done
+        # when the following block starts at the beginning of a line.
+        nonlocal uoffset, lines, aligned
+        if index:
+            size, = struct.unpack_from('<I', block, len(block) - 4)
+            if size > 0:
+                if aligned:
+                    entries.append((output.tell(), uoffset, lines))
+                if count is None:
+                    if data is None:
+                        data = zlib.decompress(block[_HEADER.size:-8], -15)
+                    count = data.count(b'\n')
+                    aligned = data.endswith(b'\n')
+                else:
+                    aligned = True
+                uoffset += size
+                lines += count
+        output.write(block)
+
+    with open(out_filename, 'wb') as output:
+        for k, filename in enumerate(in_filenames):
+            skip = skip_lines if k > 0 else 0
+            # Line numbers of the blocks starting at the beginning of a line
+            known = {x[0]: x[2] for x in (read_index(filename) or [])} if index else {}
+            with open(filename, 'rb') as handle:
+                pending, newline = None, True
+                for offset, block in _blocks(handle):
+                    # Skip the empty blocks, including the end of file marker
+                    if struct.unpack_from('<I', block, len(block) - 4)[0] == 0:
+                        continue
+                    if skip > 0:
+                        # Skip lines, which may span blocks
+                        data = zlib.decompress(block[_HEADER.size:-8], -15)
+                        start = 0
+                        while skip > 0 and start < len(data):
+                            end = data.find(b'\n', start)
+                            if end < 0:
+                                start = len(data)
+                                break
+                            start = end + 1
+                            skip -= 1
+                        if start < len(data):
+                            write(_compress_block(data[start:], 6), data[start:])
+                            newline = data.endswith(b'\n')
+                        continue
+                    # Write the previous block, with its lines counted from the index if
+                    # both blocks start at the beginning of a line
+                    if pending is not None:
+                        start, previous = pending
+                        count = known[offset] - known[start] if start in known and offset in known else None
+                        write(previous, count=count)
+                    pending = (offset, block)
+                if pending is not None:
+                    data = zlib.decompress(pending[1][_HEADER.size:-8], -15)
+                    write(pending[1], data)
+                    newline = data.endswith(b'\n')
+                # Terminate the last line, so that it is not joined to the next file
+                if not newline:
+                    write(_compress_block(b'\n', 6), b'\n')
+        output.write(EOF_BLOCK)
+
+    if index:
+        write_index(out_filename, entries)
+    elif os.path.exists(out_filename + INDEX_EXTENSION):
+        os.remove(out_filename + INDEX_EXTENSION)
+
+
+class BgzfWriter(io.TextIOBase):
+    """
+    Text file writer producing BGZF blocks aligned to line boundaries and their index
+
+    Lines shorter than a block are never split across blocks, so that every block
+    can be decompressed and parsed independently.
+    """
+    def __init__(self, filename, level=6, index=True):
+        """
+        Initialization
+
+        Arguments:
+          filename (str): output file path.
+          level (int): compression level.
+          index (bool): if True, write the sidecar block index when the file is closed.
+
+        Returns:
+          airr.bgzf.BgzfWriter: writer object.
+        """
+        self.filename = filename
+        self.level = level
+        self._handle = open(filename, 'wb')
+        self._buffer = bytearray()
+        self._index = [] if index else None
+        self._uoffset = 0
+        self._lines = 0
+        self._aligned = True
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        """
+        Write text to the file
+
+        Arguments:
+          text (str): text to write.
+
+        Returns:
+          int: number of characters written.
+        """
+        self._buffer += text.encode('utf-8')
+        while len(self._buffer) >= BLOCK_SIZE:
+            end = self._buffer.rfind(b'\n', 0, BLOCK_SIZE) + 1
+            self._write_block(end if end > 0 else BLOCK_SIZE)
+        return len(text)
+
+    def _write_block(self, size):
+        """
+        Compress the start of the buffer into a block
+
+        Arguments:
+          size (int): number of bytes to compress.
+        """
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        if self._index is not None and self._aligned:
+            self._index.append((self._handle.tell(), self._uoffset, self._lines))
+        self._handle.write(_compress_block(data, self.level))
+        self._uoffset += len(data)
+        self._lines += data.count(b'\n')
+        self._aligned = data.endswith(b'\n')
+
+    def flush(self):
+        """
+        Write buffered text as a block
+        """
+        if self._buffer:
+            self._write_block(len(self._buffer))
+        self._handle.flush()
+
+    def close(self):
+        """
+        Write the remaining data, the end of file marker and the index, then close the file
+        """
+        if self.closed:
+            return
+        # Closing flushes the buffered text
+        super().close()
+        self._handle.write(EOF_BLOCK)
+        self._handle.close()
+        if self._index is not None:
+            write_index(self.filename, self._index)
+
+
+class _RecordStream(io.RawIOBase):
+    """
+    Binary stream of the header line of a BGZF file followed by the lines starting at a block
+    """
+    def __init__(self, filename, header, offset, skip):
+        self._raw = open(filename, 'rb')
+        self._raw.seek(offset)
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode='rb')
+        for __ in range(skip):
+            self._gzip.readline()
+        self._prefix = header
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            size = min(len(buffer), len(self._prefix))
+            buffer[:size] = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+            return size
+        data = self._gzip.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._gzip.close()
+            self._raw.close()
+        super().close()
+
+
+def open_bgzf(filename, start=0, index=None):
+    """
+    Open a text handle to a BGZF file positioned at a record
+
+    Arguments:
+      filename (str): path of the BGZF file.
+      start (int): number of records to skip after the header line.
+      index (list): block index of the file. If None, the sidecar index is read,
+                    or built from the file if it does not exist or is out of date.
+
+    Returns:
+      file: text file handle returning the header line followed by the lines
+            after the first start records.
+    """
+    if start <= 0:
+        return gzip.open(filename, 'rt')
+    with gzip.open(filename, 'rb') as handle:
+        header = handle.readline()
+
+    if index is None:
+        index = read_index(filename)
+    if index is None:
+        index = index_bgzf(filename, write=False)
+
+    # Find the last block starting at or before the line of the record
+    line = start + 1
+    i = bisect_right([x[2] for x in index], line) - 1
+    offset, __, first = index[i]
+
+    return io.TextIOWrapper(io.BufferedReader(_RecordStream(filename, header, offset, line - first)))
@@ -0,0 +1,342 @@
+"""
+Compressed text files, with compression of written data on a background thread
+"""
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+
+# File extensions of the supported compression formats
+EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd', '.zstd': 'zstd'}
+
+# Default compression levels
+LEVELS = {'gzip': 6, 'bz2': 9, 'xz': 6, 'zstd': 3}
+
+# Leading bytes of files of the supported compression formats
+MAGIC = [(b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'), (b'\x28\xb5\x2f\xfd', 'zstd')]
+
+# Size of the read buffer of input files
+BUFFER_SIZE = 2**20
+
+
+def _import_zstandard():
+    """
+    Import the zstandard module
+
+    Returns:
+      module: the zstandard module.
+    """
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('The zstandard package is required to use zstd compressed files')
+
+    return zstandard
+
+
+def compression_from_extension(filename):
+    """
+    Determine the compression of a file from its extension
+
+    Arguments:
+      filename (str): file path.
+
+    Returns:
+      str: one of 'gzip', 'bz2', 'xz' or 'zstd', or None for other extensions.
+    """
+    name = filename.lower()
+    for ext, compression in EXTENSIONS.items():
+        if name.endswith(ext):
+            return compression
+    return None
+
+
+def detect_compression(filename):
+    """
+    Determine the compression of a file from its leading bytes
+
+    Arguments:
+      filename (str): file path.
+
+    Returns:
+      str: one of 'gzip', 'bz2', 'xz' or 'zstd', or None for uncompressed files.
+    """
+    with open(filename, 'rb') as handle:
+        return _peek_compression(handle)
+
+
+def _peek_compression(handle):
+    """
+    Determine the compression of a file from its leading bytes without consuming them
+
+    Arguments:
+      handle (io.BufferedReader): binary file handle positioned at the start of the file.
+
+    Returns:
+      str: one of 'gzip', 'bz2', 'xz' or 'zstd', or None for uncompressed files.
+    """
+    data = handle.peek(6)
+    for magic, compression in MAGIC:
+        if data.startswith(magic):
+            return compression
+    return None
+
+
+def strip_extension(filename):
+    """
+    Remove the compression extension of a file name
+
+    Arguments:
+      filename (str): file path.
+
+    Returns:
+      str: file path without a trailing '.gz', '.bz2', '.xz', '.zst' or '.zstd' extension.
+    """
+    compression = compression_from_extension(filename)
+    if compression is None:
+        return filename
+    return filename[:filename.rfind('.')]
+
+
+def open_binary(filename, mode, compression, level=None):
+    """
+    Open a compressed file in binary mode
+
+    Arguments:
+      filename (str): file path.
+      mode (str): one of 'rb' or 'wb'.
+      compression (str): one of 'gzip', 'bz2', 'xz' or 'zstd'.
+      level (int): compression level of written files. If None, the default level of the
+                   compression format is used.
+
+    Returns:
+      file: binary file handle.
+    """
+    if compression not in LEVELS:
+        raise ValueError('Unknown compression: %s. Supported compression is "gzip", "bz2", "xz" or "zstd"'
+                         % compression)
+    if level is None:
+        level = LEVELS[compression]
+
+    if compression == 'gzip':
+        return gzip.open(filename, mode, compresslevel=level) if mode == 'wb' else gzip.open(filename, mode)
+    elif compression == 'bz2':
+        return bz2.open(filename, mode, compresslevel=level) if mode == 'wb' else bz2.open(filename, mode)
+    elif compression == 'xz':
+        return lzma.open(filename, mode, preset=level) if mode == 'wb' else lzma.open(filename, mode)
+    else:
+        zstandard = _import_zstandard()
+        if mode == 'wb':
+            return zstandard.open(filename, mode, cctx=zstandard.ZstdCompressor(level=level))
+        return zstandard.open(filename, mode)
+
+
+def _open_reader(filename, compression=None, buffer_size=BUFFER_SIZE):
+    """
+    Open a file for reading in binary mode, decompressing compressed files
+
+    The file is opened once, so that pipes and other files that cannot be reopened or
+    seeked are also read.
+
+    Arguments:
+      filename (str): file path.
+      compression (str): one of 'gzip', 'bz2', 'xz' or 'zstd'. If None, the compression is
+                         determined from the leading bytes of the file.
+      buffer_size (int): size of the read buffer.
+
+    Returns:
+      tuple: binary file handle of the decompressed data and the compression of the file.
+    """
+    handle = open(filename, 'rb', buffering=buffer_size)
+    try:
+        if compression is None:
+            compression = _peek_compression(handle)
+        if compression is None:
+            return handle, None
+        return io.BufferedReader(_DecompressedReader(handle, compression), buffer_size=buffer_size), compression
+    except BaseException:
+        handle.close()
+        raise
+
+
+def open_reader(filename, compression=None, buffer_size=BUFFER_SIZE):
+    """
+    Open a file for reading in binary mode, decompressing compressed files
+
+    Arguments:
+      filename (str): file path.
+      compression (str): one of 'gzip', 'bz2', 'xz' or 'zstd'. If None, the compression is
+                         determined from the leading bytes of the file.
+      buffer_size (int): size of the read buffer.
+
+    Returns:
+      file: binary file handle of the decompressed data.
+    """
+    return _open_reader(filename, compression, buffer_size)[0]
+
+
+def open_text(filename, mode='r', compression=None, level=None, threaded=True, encoding=None):
+    """
+    Open a text file, compressed according to its contents, extension or an explicit compression
+
+    Arguments:
+      filename (str): file path.
+      mode (str): one of 'r' or 'w'.
+      compression (str): one of 'gzip', 'bz2', 'xz' or 'zstd'. If None, the compression of
+                         files read is determined from their leading bytes, and the compression
+                         of files written from their extension, with files of other extensions
+                         not compressed.
+      level (int): compression level of written files. If None, the default level of the
+                   compression format is used.
+      threaded (bool): if True, compress written data on a background thread.
+      encoding (str): text encoding. If None, compressed files are UTF-8 encoded and
+                      uncompressed files use the default encoding.
+
+    Returns:
+      file: text file handle.
+    """
+    if mode == 'r':
+        handle, compression = _open_reader(filename, compression)
+        if compression is None:
+            return io.TextIOWrapper(handle, encoding=encoding)
+        return io.TextIOWrapper(handle, encoding=encoding or 'utf-8')
+
+    if compression is None:
+        compression = compression_from_extension(filename)
+    if compression is None:
+        return open(filename, 'w+', encoding=encoding)
+
+    handle = open_binary(filename, 'wb', compression, level)
+    if threaded:
+        handle = io.BufferedWriter(ThreadedWriter(handle), buffer_size=2**20)
+    return io.TextIOWrapper(handle, encoding=encoding or 'utf-8')
+
+
+class _DecompressedReader(io.RawIOBase):
+    """
+    Binary reader of the decompressed data of a file handle, closing the handle when closed
+    """
+    def __init__(self, handle, compression):
+        """
+        Initialization
+
+        Arguments:
+          handle (file): binary file handle of the compressed data.
+          compression (str): one of 'gzip', 'bz2', 'xz' or 'zstd'.
+
+        Returns:
+          airr.compression._DecompressedReader: reader object.
+        """
+        if compression == 'gzip':
+            stream = gzip.GzipFile(fileobj=handle, mode='rb')
+        elif compression == 'bz2':
+            stream = bz2.BZ2File(handle, 'rb')
+        elif compression == 'xz':
+            stream = lzma.LZMAFile(handle, 'rb')
+        elif compression == 'zstd':
+            stream = _import_zstandard().ZstdDecompressor().stream_reader(handle, closefd=False)
+        else:
+            raise ValueError('Unknown compression: %s. Supported compression is "gzip", "bz2", "xz" or "zstd"'
+                             % compression)
+        self._handle = handle
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._stream.readinto(buffer)
+
+    def close(self):
+        """
+        Close the decompressor and the file
+        """
+        if self.closed:
+            return
+        try:
+            super().close()
+            self._stream.close()
+        finally:
+            self._handle.close()
+
+
+class ThreadedWriter(io.RawIOBase):
+    """
+    Binary writer passing data to another file object on a background thread
+
+    Compression in the zlib, bz2, lzma and zstandard modules releases the global
+    interpreter lock, so that compression of written data overlaps with the formatting
+    of the following records. Errors of the background thread are raised by the next
+    write or by close.
+    """
+    def __init__(self, handle, queue_size=8):
+        """
+        Initialization
+
+        Arguments:
+          handle (file): binary file handle written on the background thread,
+                         closed when the writer is closed.
+          queue_size (int): maximum number of pending writes.
+
+        Returns:
+          airr.compression.ThreadedWriter: writer object.
+        """
+        self._handle = handle
+        self._queue = queue.Queue(queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def writable(self):
+        return True
+
+    def _run(self):
+        """
+        Write queued data until the end marker
+        """
+        try:
+            for data in iter(self._queue.get, None):
+                self._handle.write(data)
+        except BaseException as e:
+            self._error = e
+            # Discard pending data so that writes do not block
+            for __ in iter(self._queue.get, None):
+                pass
+
+    def _check(self):
+        """
+        Raise the error of the background thread
+        """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def write(self, data):
+        """
+        Queue data to write
+
+        Arguments:
+          data (bytes): data to write.
+
+        Returns:
+          int: number of bytes written.
+        """
+        self._check()
+        self._queue.put(bytes(data))
+        return len(data)
+
+    def close(self):
+        """
+        Write the queued data and close the file
+        """
+        if self.closed:
+            return
+        try:
+            super().close()
+            self._queue.put(None)
+            self._thread.join()
+        finally:
+            self._handle.close()
+        self._check()
@@ -0,0 +1,230 @@
+"""
+Sidecar index of the byte offsets of records in uncompressed rearrangement files by sequence_id
+"""
+import csv
+import hashlib
+import os
+import struct
+
+from airr.compression import detect_compression
+
+# Extension of the sidecar index file
+INDEX_EXTENSION = '.sidx'
+
+# Index header of the magic number, size and modification time of the indexed file, number of records
+# and hash of the indexed field
+_HEADER = struct.Struct('<8sQqQ8s')
+_MAGIC = b'AIRRSID2'
+
+
+def _hash(value):
+    """
+    Hash a sequence identifier
+
+    Arguments:
+      value (bytes): UTF-8 encoded sequence identifier.
+
+    Returns:
+      bytes: 8 byte digest.
+    """
+    return hashlib.blake2b(value, digest_size=8).digest()
+
+
+def _stat(filename):
+    """
+    Size and modification time of a file
+
+    Arguments:
+      filename (str): file path.
+
+    Returns:
+      tuple: size in bytes and modification time in nanoseconds.
+    """
+    st = os.stat(filename)
+    return st.st_size, st.st_mtime_ns
+
+
+def index_rearrangement(filename, field='sequence_id', write=True):
+    """
+    Build the sequence_id index of an uncompressed TSV rearrangements file
+
+    The index is stored next to the file as a header recording the size and modification
+    time of the file and the indexed field, followed by the sorted 64-bit hashes of the
+    identifiers and the byte offsets of their records, as little-endian unsigned integers.
+
+    Arguments:
+      filename (str): path of the rearrangements file.
+      field (str): field holding the record identifiers.
+      write (bool): if True, write the index to filename + '.sidx'.
+
+    Returns:
+      airr.index.SequenceIndex: the index.
+    """
+    # numpy is only required for indexes
+    import numpy as np
+
+    if detect_compression(filename) is not None:
+        raise ValueError('%s is compressed, only uncompressed files can be indexed' % filename)
+
+    with open(filename, 'rb') as handle:
+        header_line = handle.readline()
+        header = next(csv.reader([header_line.decode('utf-8')], dialect='excel-tab'), [])
+        if field not in header:
+            raise KeyError('field %s not found in the header of %s' % (field, filename))
+        column = header.index(field)
+
+        digests = []
+        offsets = []
+        offset = len(header_line)
+        for line in handle:
+            text = line.rstrip(b'\r\n')
+            if text:
+                if b'"' in text:
+                    row = next(csv.reader([text.decode('utf-8')], dialect='excel-tab'))
+                    value = row[column].encode('utf-8') if column < len(row) else b''
+                else:
+                    row = text.split(b'\t', column + 1)
+                    value = row[column] if column < len(row) else b''
+                digests.append(_hash(value))
+                offsets.append(offset)
+            offset += len(line)
+
+    hashes = np.frombuffer(b''.join(digests), dtype='<u8')
+    offsets = np.array(offsets, dtype='<u8')
+    order = np.argsort(hashes, kind='stable')
+    index = SequenceIndex(hashes[order], offsets[order])
+
+    if write:
+        _write_index(filename, index, field)
+
+    return index
+
+
+def _write_index(filename, index, field):
+    """
+    Write the index of a rearrangements file
+
+    Arguments:
+      filename (str): path of the rearrangements file.
+      index (airr.index.SequenceIndex): index of the file.
+      field (str): indexed field.
+    """
+    size, mtime = _stat(filename)
+    # Replace the index file, leaving any mapping of the previous index valid
+    path = filename + INDEX_EXTENSION
+    try:
+        with open(path + '.tmp', 'wb') as handle:
+            handle.write(_HEADER.pack(_MAGIC, size, mtime, len(index), _hash(field.encode('utf-8'))))
+            handle.write(index.hashes.tobytes())
+            handle.write(index.offsets.tobytes())
+        os.replace(path + '.tmp', path)
+    except OSError:
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        raise
+
+
+def read_index(filename, field='sequence_id'):
+    """
+    Read the sequence_id index of a rearrangements file
+
+    Arguments:
+      filename (str): path of the rearrangements file.
+      field (str): field holding the record identifiers.
+
+    Returns:
+      airr.index.SequenceIndex: the index, or None if the file has no index of the field or
+                                the size or modification time of the file changed since it
+                                was indexed.
+    """
+    import numpy as np
+
+    path = filename + INDEX_EXTENSION
+    try:
+        with open(path, 'rb') as handle:
+            data = handle.read(_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, size, mtime, count, digest = _HEADER.unpack(data)
+    if magic != _MAGIC or (size, mtime) != _stat(filename) or digest != _hash(field.encode('utf-8')) \
+            or os.path.getsize(path) != _HEADER.size + 16 * count:
+        return None
+    if count == 0:
+        return SequenceIndex(np.zeros(0, dtype='<u8'), np.zeros(0, dtype='<u8'))
+
+    hashes = np.memmap(path, dtype='<u8', mode='r', offset=_HEADER.size, shape=(count,))
+    offsets = np.memmap(path, dtype='<u8', mode='r', offset=_HEADER.size + 8 * count, shape=(count,))
+    return SequenceIndex(hashes, offsets)
+
+
+def load_index(filename, field='sequence_id'):
+    """
+    Read the sequence_id index of a rearrangements file, building it if it is missing or out of date
+
+    The index built is written next to the file when possible, and otherwise only kept in memory.
+
+    Arguments:
+      filename (str): path of the rearrangements file.
+      field (str): field holding the record identifiers.
+
+    Returns:
+      airr.index.SequenceIndex: the index.
+    """
+    index = read_index(filename, field=field)
+    if index is None:
+        index = index_rearrangement(filename, field=field, write=False)
+        try:
+            _write_index(filename, index, field)
+        except OSError:
+            pass
+    return index
+
+
+class SequenceIndex:
+    """
+    Sorted hashes of record identifiers and the byte offsets of their records
+
+    Attributes:
+      hashes (numpy.ndarray): sorted 64-bit hashes of the identifiers.
+      offsets (numpy.ndarray): byte offsets of the records in the order of the hashes.
+    """
+    def __init__(self, hashes, offsets):
+        """
+        Initialization
+
+        Arguments:
+          hashes (numpy.ndarray): sorted 64-bit hashes of the identifiers.
+          offsets (numpy.ndarray): byte offsets of the records in the order of the hashes.
+
+        Returns:
+          airr.index.SequenceIndex: index object.
+        """
+        self.hashes = hashes
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def lookup(self, ids):
+        """
+        Find the candidate records of identifiers
+
+        Records of other identifiers with the same hash are also returned, so that
+        candidates must be checked against the identifier of the record.
+
+        Arguments:
+          ids (list): record identifiers.
+
+        Returns:
+          list: lists of the byte offsets of the candidate records of each identifier,
+                in file order.
+        """
+        import numpy as np
+
+        keys = np.frombuffer(b''.join(_hash(str(x).encode('utf-8')) for x in ids), dtype='<u8')
+        starts = np.searchsorted(self.hashes, keys, side='left')
+        ends = np.searchsorted(self.hashes, keys, side='right')
+
+        return [sorted(self.offsets[s:e].tolist()) for s, e in zip(starts.tolist(), ends.tolist())]
@@ -4,30 +4,63 @@ Interface functions for file operations
 from __future__ import absolute_import
 
 # System imports
+import csv
 import gzip
+import heapq
 import json
+import multiprocessing
+import os
+import re
+import shutil
 import sys
-import pandas as pd
-import yaml
-import yamlordereddictloader
+import tempfile
+from bisect import bisect_left
 from collections import OrderedDict
 from itertools import chain
-from io import open
+from operator import itemgetter
+from io import open, BytesIO, StringIO
 from warnings import warn
 
-if (sys.version_info > (3, 0)):
-    from io import StringIO
-else:
-    # Python 2 code in this block
-    from io import BytesIO as StringIO
-
 # Load imports
-from airr.io import RearrangementReader, RearrangementWriter
-from airr.schema import Schema, RearrangementSchema, RepertoireSchema, AIRRSchema, DataFileSchema, ValidationError
+from airr.io import RearrangementReader, RearrangementWriter, MmapRearrangementReader, ArrowRearrangementReader, \
+    ArrowRearrangementWriter, _field_converter, _field_formatter, _import_pyarrow
+from airr import bgzf
+from airr.compression import compression_from_extension, detect_compression, open_binary, open_reader, \
+    open_text, strip_extension
+from airr.bgzf import BgzfWriter, is_bgzf, read_index
+from airr.schema import Schema, RearrangementSchema, RepertoireSchema, AIRRSchema, DataFileSchema, ValidationError, \
+    get_schema
 
 #### Rearrangement ####
 
-def read_rearrangement(filename, validate=False, debug=False):
+def _rearrangement_format(filename, format=None):
+    """
+    Determine the storage format of a rearrangements file
+
+    Arguments:
+      filename (str): file path.
+      format (str): explicit format. One of 'tsv', 'parquet' or 'feather'. If None,
+                    the format is determined from the file extension.
+
+    Returns:
+      str: one of 'tsv', 'parquet' or 'feather'.
+    """
+    if format is not None:
+        if format not in ('tsv', 'parquet', 'feather'):
+            raise ValueError('Unknown rearrangement file format: %s. Supported formats are "tsv", "parquet" or "feather"' % format)
+        return format
+
+    ext = str.lower(filename.split('.')[-1])
+    if ext in ('parquet', 'pq'):
+        return 'parquet'
+    elif ext in ('feather', 'arrow', 'ipc'):
+        return 'feather'
+    else:
+        return 'tsv'
+
+
+def read_rearrangement(filename, validate=False, debug=False, rows='dict', fields=None, format=None,
+                       mmap=False):
     """
     Open an iterator to read an AIRR rearrangements file
 
@@ -36,19 +69,37 @@ def read_rearrangement(filename, validate=False, debug=False):
       validate (bool): whether to validate data as it is read, raising a ValidationError
                        exception in the event of an error.
       debug (bool): debug flag. If True print debugging information to standard error.
+      rows (str): type of the returned rows. One of 'dict', 'tuple' or 'record'.
+                  See airr.io.RearrangementReader for details.
+      fields (list): fields to read. If specified, only these fields are converted and returned.
+                     If None, all fields in the file are returned.
+      format (str): file format. One of 'tsv', 'parquet' or 'feather'. If None, the format
+                    is determined from the file extension, with 'tsv' as the default.
+      mmap (bool): if True, memory-map uncompressed TSV files and only decode the columns
+                   of the returned fields. Ignored for compressed files and other formats.
+
+    gzip, bz2, xz and zstd compressed TSV files are detected from their leading bytes and
+    decompressed.
 
     Returns:
-      airr.io.RearrangementReader: iterable reader class.
+      airr.io.RearrangementReader: iterable reader class. An airr.io.ArrowRearrangementReader
+                                   is returned for Parquet and Arrow IPC (Feather) files, and an
+                                   airr.io.MmapRearrangementReader for memory-mapped files.
     """
-    if filename.endswith(".gz"):
-        handle = gzip.open(filename, 'rt')
-    else:
-        handle = open(filename, 'r')
-        
-    return RearrangementReader(handle, validate=validate, debug=debug)
+    format = _rearrangement_format(filename, format)
+    if format != 'tsv':
+        return ArrowRearrangementReader(open(filename, 'rb'), format=format, validate=validate,
+                                        debug=debug, rows=rows, fields=fields)
 
+    if mmap and os.path.isfile(filename) and detect_compression(filename) is None:
+        return MmapRearrangementReader(open(filename, 'rb'), validate=validate, debug=debug,
+                                       rows=rows, fields=fields)
 
-def create_rearrangement(filename, fields=None, debug=False):
+    handle = open_text(filename)
+    return RearrangementReader(handle, validate=validate, debug=debug, rows=rows, fields=fields)
+
+
+def create_rearrangement(filename, fields=None, debug=False, format=None, compression=None, level=None):
     """
     Create an empty AIRR rearrangements file writer
 
@@ -56,14 +107,34 @@ def create_rearrangement(filename, fields=None, debug=False):
       filename (str): output file path.
       fields (list): additional non-required fields to add to the output.
       debug (bool): debug flag. If True print debugging information to standard error.
+      format (str): file format. One of 'tsv', 'parquet' or 'feather'. If None, the format
+                    is determined from the file extension, with 'tsv' as the default.
+      compression (str): compression of TSV files. One of 'gzip', 'bz2', 'xz' or 'zstd',
+                         compressed on a background thread while records are formatted,
+                         or 'bgzf' for block gzipped blocks aligned to records with a sidecar
+                         block index (filename + '.bgzi') for random access and parallel
+                         decompression. If None, the compression is determined from the file
+                         extension ('.gz', '.bz2', '.xz', '.zst' or '.zstd'), and files with other
+                         extensions are not compressed. zstd requires the zstandard package.
+      level (int): compression level. If None, the default level of the compression is used.
 
     Returns:
-      airr.io.RearrangementWriter: open writer class.
+      airr.io.RearrangementWriter: open writer class. An airr.io.ArrowRearrangementWriter
+                                   is returned for Parquet and Arrow IPC (Feather) files.
     """
-    return RearrangementWriter(open(filename, 'w+'), fields=fields, debug=debug)
+    format = _rearrangement_format(filename, format)
+    if format != 'tsv':
+        return ArrowRearrangementWriter(open(filename, 'wb'), fields=fields, debug=debug, format=format)
+
+    if compression == 'bgzf':
+        handle = BgzfWriter(filename) if level is None else BgzfWriter(filename, level=level)
+    else:
+        handle = open_text(filename, 'w', compression=compression, level=level)
 
+    return RearrangementWriter(handle, fields=fields, debug=debug)
 
-def derive_rearrangement(out_filename, in_filename, fields=None, debug=False):
+
+def derive_rearrangement(out_filename, in_filename, fields=None, debug=False, compression=None, level=None):
     """
     Create an empty AIRR rearrangements file with fields derived from an existing file
 
@@ -72,19 +143,22 @@ def derive_rearrangement(out_filename, in_filename, fields=None, debug=False):
       in_filename (str): existing file to derive fields from.
       fields (list): additional non-required fields to add to the output.
       debug (bool): debug flag. If True print debugging information to standard error.
+      compression (str): compression of the output file. See create_rearrangement for details.
+      level (int): compression level. If None, the default level of the compression is used.
 
     Returns:
       airr.io.RearrangementWriter: open writer class.
     """
-    reader = RearrangementReader(open(in_filename, 'r'))
+    reader = read_rearrangement(in_filename)
     in_fields = list(reader.fields)
+    reader.close()
     if fields is not None:
         in_fields.extend([f for f in fields if f not in in_fields])
 
-    return RearrangementWriter(open(out_filename, 'w+'), fields=in_fields, debug=debug)
+    return create_rearrangement(out_filename, fields=in_fields, debug=debug, compression=compression, level=level)
 
 
-def load_rearrangement(filename, validate=False, debug=False):
+def load_rearrangement(filename, validate=False, debug=False, fields=None, format=None, chunksize=None):
     """
     Load the contents of an AIRR rearrangements file into a data frame
 
@@ -93,33 +167,323 @@ def load_rearrangement(filename, validate=False, debug=False):
       validate (bool): whether to validate data as it is read, raising a ValidationError
                        exception in the event of an error.
       debug (bool): debug flag. If True print debugging information to standard error.
+      fields (list): fields to load. If specified, other columns are not read from the file
+                     and validation is limited to the header and the values of these fields.
+                     If None, all fields in the file are loaded.
+      format (str): file format. One of 'tsv', 'parquet' or 'feather'. If None, the format
+                    is determined from the file extension, with 'tsv' as the default.
+      chunksize (int): if specified, return an iterator of data frames of at most chunksize records
+                       instead of loading the whole file. The data frames have the same column types
+                       and index as the corresponding rows of the complete data frame, and validation
+                       errors report the record number in the file.
 
     Returns:
-      pandas.DataFrame: Rearrangement records as rows of a data frame.
+      pandas.DataFrame: Rearrangement records as rows of a data frame. An iterator of data frames
+                        if chunksize is specified.
     """
-    # TODO: test pandas.DataFrame.read_csv with converters argument as an alterative
     schema = RearrangementSchema
+    format = _rearrangement_format(filename, format)
 
     try:
-        df = pd.read_csv(filename, sep='\t', header=0, index_col=None,
-                         dtype=schema.pandas_types(), true_values=schema.true_values,
-                         false_values=schema.false_values)
+        header, chunks, strings = _read_chunks(filename, format, schema, fields=fields,
+                                               chunksize=chunksize, validate=validate)
+        if chunksize is None:
+            df = _check_chunk(next(iter(chunks)), schema, strings)
     except Exception as e:
         sys.stderr.write('Error occurred while loading AIRR rearrangement file: %s\n' % e)
         return None
 
-    # added to use RearrangementReader without modifying it:
-    buffer = StringIO()  # create an empty buffer
-    df.to_csv(buffer, sep='\t', index=False)  # fill buffer
-    buffer.seek(0)  # set to the start of the stream
+    # Validate the complete header, as the loaded columns may be a subset.
+    # Values are validated by _check_chunk with the rules of the row reader.
+    if validate:
+        schema.validate_header(header)
+
+    if chunksize is not None:
+        return _iter_chunks(chunks, schema, fields=fields, strings=strings, chunksize=chunksize)
+
+    return _convert_dataframe(df, schema, fields=fields)
+
+
+def _arrow_batches(filename, format, fields=None, chunksize=None):
+    """
+    Read the record batches of a Parquet or Arrow IPC (Feather) rearrangements file
+
+    Arguments:
+      filename (str): input file path.
+      format (str): one of 'parquet' or 'feather'.
+      fields (list): fields to read. If None, all fields in the file are read.
+      chunksize (int): maximum number of records per batch. If None, the file is read as a single table.
+
+    Returns:
+      tuple: pyarrow.Schema of the file and an iterable of pyarrow tables.
+    """
+    pa = _import_pyarrow(format)
+    if format == 'parquet':
+        source = pa.parquet.ParquetFile(filename)
+        arrow_schema = source.schema_arrow
+    else:
+        source = pa.ipc.open_file(pa.memory_map(filename, 'r'))
+        arrow_schema = source.schema
+    columns = None if fields is None else [f for f in arrow_schema.names if f in set(fields)]
+
+    if chunksize is None:
+        if format == 'parquet':
+            table = source.read(columns=columns)
+        else:
+            table = source.read_all()
+            if columns is not None:  table = table.select(columns)
+        return arrow_schema, [table]
+
+    if format == 'parquet':
+        batches = source.iter_batches(batch_size=chunksize, columns=columns)
+    else:
+        table = source.read_all()
+        if columns is not None:  table = table.select(columns)
+        batches = table.to_batches(max_chunksize=chunksize)
+
+    return arrow_schema, (pa.Table.from_batches([b]) for b in batches)
+
+
+def _arrow_frame(table, schema, strings=()):
+    """
+    Convert a pyarrow table to a data frame with the types used for TSV files
+
+    Arguments:
+      table (pyarrow.Table): rearrangement data.
+      schema (airr.schema.Schema): schema defining the field types.
+      strings (list): typed fields to convert to strings instead of the schema type.
+
+    Returns:
+      pandas.DataFrame: the converted data frame.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    # Cast columns to the schema types, as with the dtypes used for TSV files
+    types = schema.arrow_types()
+    target = pa.schema([pa.field(f, pa.utf8() if f in strings else types.get(f, pa.utf8()))
+                        for f in table.column_names])
+    table = table.cast(target)
+    for f in table.column_names:
+        if schema.type(f) == 'boolean' and f not in strings and table.column(f).null_count > 0:
+            raise ValueError('Bool column %s has NA values' % f)
+
+    return table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+
+def _read_chunks(filename, format, schema, fields=None, chunksize=None, validate=False):
+    """
+    Read a rearrangements file as data frames of typed columns
+
+    Arguments:
+      filename (str): input file path.
+      format (str): one of 'tsv', 'parquet' or 'feather'.
+      schema (airr.schema.Schema): schema defining the field types.
+      fields (list): fields to read. If None, all fields in the file are read.
+      chunksize (int): maximum number of records per data frame. If None, the file is read as a single data frame.
+      validate (bool): if True, typed fields that are not stored with the schema type are read as strings
+                       so that _check_chunk can report the record of an invalid value.
+
+    Returns:
+      tuple: list of the field names in the file, an iterable of pandas.DataFrame and
+             the list of fields read as strings.
+    """
+    if format != 'tsv':
+        arrow_schema, tables = _arrow_batches(filename, format, fields=fields, chunksize=chunksize)
+        strings = []
+        if validate:
+            types = schema.arrow_types()
+            strings = [f.name for f in arrow_schema if f.name in types and
+                       schema.type(f.name) in ('integer', 'number', 'boolean') and
+                       not f.type.equals(types[f.name])]
+        return arrow_schema.names, (_arrow_frame(t, schema, strings) for t in tables), strings
+
+    # pandas is only required for data frames
+    import pandas as pd
+
+    usecols = None if fields is None else (lambda f, keep=set(fields): f in keep)
+    # The file is read through a single handle, parsing the header line separately
+    # to determine the column types
+    handle = open_reader(filename)
+    try:
+        header = pd.read_csv(BytesIO(handle.readline()), sep='\t', header=0, index_col=None,
+                             nrows=0).columns.tolist()
+        dtype = _pandas_dtypes(header, schema)
+        strings = []
+        if validate:
+            strings = [f for f in header if schema.type(f) in ('integer', 'number', 'boolean')]
+            dtype.update({f: str for f in strings})
+        chunks = pd.read_csv(handle, sep='\t', header=None, names=header, index_col=None, usecols=usecols,
+                             dtype=dtype, true_values=schema.true_values,
+                             false_values=schema.false_values, chunksize=chunksize)
+    except BaseException:
+        handle.close()
+        raise
+
+    if chunksize is None:
+        handle.close()
+        chunks = [chunks]
+    else:
+        chunks = _closing(chunks, handle)
+
+    return header, chunks, strings
+
+
+def _closing(chunks, handle):
+    """
+    Generator over data frames closing the file they are read from when exhausted
+
+    Arguments:
+      chunks (iterable): data frames.
+      handle (file): file handle.
+
+    Returns:
+      generator: data frames.
+    """
+    try:
+        yield from chunks
+    finally:
+        handle.close()
+
+
+def _check_chunk(df, schema, fields, start=0):
+    """
+    Convert and validate typed fields read as strings
+
+    Arguments:
+      df (pandas.DataFrame): data frame of rearrangement data.
+      schema (airr.schema.Schema): schema defining the field types.
+      fields (list): fields to convert.
+      start (int): number of records preceding the data frame in the file.
+
+    Returns:
+      pandas.DataFrame: the converted data frame.
+
+    Raises:
+      airr.ValidationError: raised with the record number of the first invalid value.
+    """
+    import pandas as pd
+
+    for f in fields:
+        if f not in df.columns:
+            continue
+        values = df[f]
+        spec = schema.type(f)
+        if spec == 'boolean':
+            converted = values.map(schema._to_bool_map)
+            invalid = values.notna() & converted.isna()
+            message = 'invalid bool %s'
+        elif spec == 'integer':
+            # Each distinct value is parsed as by the row reader
+            convert = _field_converter(schema, f, base=0)
+            converted = values.map({v: convert(v) for v in values.dropna().unique()})
+            invalid = values.notna() & converted.isna()
+            message = 'invalid int %s'
+        else:
+            converted = pd.to_numeric(values, errors='coerce')
+            invalid = values.notna() & converted.isna()
+            message = 'invalid float %s'
+
+        if invalid.any():
+            i = int(invalid.to_numpy().argmax())
+            raise ValidationError('record %i field %s has %s' % (start + i + 1, f, message % values.iloc[i]))
+
+        if spec == 'boolean':
+            if converted.isna().any():
+                i = int(converted.isna().to_numpy().argmax())
+                raise ValueError('Bool column %s has NA values at record %i' % (f, start + i + 1))
+            df[f] = converted.astype(bool)
+        elif spec == 'integer':
+            df[f] = converted.astype('Int64')
+        else:
+            df[f] = converted.astype('float64')
+
+    return df
+
+
+def _iter_chunks(chunks, schema, fields=None, strings=(), chunksize=None):
+    """
+    Generator converting data frames read by _read_chunks
+
+    Arguments:
+      chunks (iterable): data frames returned by _read_chunks.
+      schema (airr.schema.Schema): schema defining the field types.
+      fields (list): requested fields.
+      strings (list): typed fields read as strings to convert and validate.
+      chunksize (int): maximum number of records per data frame.
+
+    Returns:
+      generator: converted data frames.
+    """
+    import pandas as pd
+
+    start = 0
+    chunks = iter(chunks)
+    while True:
+        try:
+            df = next(chunks)
+        except StopIteration:
+            return
+        except ValidationError:
+            raise
+        except Exception as e:
+            raise ValueError('Error occurred while loading records %i to %i: %s' % (start + 1, start + chunksize, e))
+
+        df = _check_chunk(df, schema, strings, start=start)
+        df.index = pd.RangeIndex(start, start + len(df))
+        start += len(df)
+        yield _convert_dataframe(df, schema, fields=fields)
+
+
+def _pandas_dtypes(header, schema):
+    """
+    Map the columns of a file to pandas types
+
+    Arguments:
+      header (list): field names in the file.
+      schema (airr.schema.Schema): schema defining the field types.
+
+    Returns:
+      dict: mapping of field names to pandas types. Fields not defined by the schema are read as strings.
+    """
+    types = schema.pandas_types()
+    return {f: types.get(f, str) for f in header}
+
+
+def _convert_dataframe(df, schema, fields=None, base=1):
+    """
+    Adjust a data frame parsed with _pandas_dtypes to the conventions of RearrangementReader
+
+    Arguments:
+      df (pandas.DataFrame): data frame of rearrangement data.
+      schema (airr.schema.Schema): schema defining the field types.
+      fields (list): requested fields. Fields missing from the data frame are added with missing values.
+      base (int): coordinate schema of the data. If 1, then coordinate fields are converted
+                  to python style 0-based half-open intervals.
 
-    reader = RearrangementReader(buffer, validate=validate, debug=debug)
+    Returns:
+      pandas.DataFrame: the converted data frame.
+    """
+    for f in df.columns:
+        if schema.type(f) in ('integer', 'number', 'boolean'):
+            if f.endswith('_start') and base == 1:
+                df[f] = df[f] - 1
+        elif f.endswith('_start') and base == 1:
+            # Untyped coordinates cannot be shifted and are set to None
+            df[f] = None
+        else:
+            df[f] = df[f].fillna('')
+
+    if fields is not None:
+        for f in fields:
+            if f not in df.columns:
+                df[f] = None
+        df = df[list(fields)]
 
-    df = pd.DataFrame(list(reader))
     return df
 
 
-def dump_rearrangement(dataframe, filename, debug=False):
+def dump_rearrangement(dataframe, filename, debug=False, chunksize=100000, compression=None, level=None):
     """
     Write the contents of a data frame to an AIRR rearrangements file
 
@@ -127,68 +491,685 @@ def dump_rearrangement(dataframe, filename, debug=False):
       dataframe (pandas.DataFrame): data frame of rearrangement data.
       filename (str): output file path.
       debug (bool): debug flag. If True print debugging information to standard error.
+      chunksize (int): number of rows converted and written at a time.
+      compression (str): one of 'gzip', 'bz2', 'xz' or 'zstd'. If None, the compression is
+                         determined from the file extension. See create_rearrangement for details.
+      level (int): compression level. If None, the default level of the compression is used.
 
     Returns:
       bool: True if the file is written without error.
     """
-    # TODO: test pandas.DataFrame.to_csv with converters argument as an alterative
-    # dataframe.to_csv(handle, sep='\t', header=True, index=False, encoding='utf-8')
+    schema = RearrangementSchema
 
+    # Duplicated columns are resolved as for dictionaries, the last one wins
+    dataframe = dataframe.loc[:, ~dataframe.columns.duplicated(keep='last')]
     fields = dataframe.columns.tolist()
-    with open(filename, 'w+') as handle:
+
+    with open_text(filename, 'w', compression=compression, level=level) as handle:
+        # Writer orders the fields and writes the header
         writer = RearrangementWriter(handle, fields=fields, debug=debug)
-        for __, row in dataframe.iterrows():
-            writer.write(row.to_dict())
+        if debug:
+            for f in schema.required:
+                if f not in fields:
+                    sys.stderr.write('Warning: Data frame is missing AIRR required field (' + f + ').\n')
+
+        for start in range(0, len(dataframe), chunksize):
+            chunk = _format_dataframe(dataframe.iloc[start:start + chunksize], writer.fields, schema)
+            chunk.to_csv(handle, sep='\t', header=False, index=False, na_rep='', lineterminator='\n')
 
     return True
 
 
-def merge_rearrangement(out_filename, in_filenames, drop=False, debug=False):
+def _format_dataframe(df, fields, schema, base=1):
+    """
+    Convert the columns of a data frame for output as RearrangementWriter does for rows
+
+    Arguments:
+      df (pandas.DataFrame): data frame of rearrangement data.
+      fields (list): output fields. Fields missing from the data frame are written as empty values.
+      schema (airr.schema.Schema): schema defining the field types.
+      base (int): coordinate schema of the output. If 1, then coordinate fields
+                  are converted to 1-based closed intervals.
+
+    Returns:
+      pandas.DataFrame: data frame with the output fields in order.
+    """
+    import pandas as pd
+
+    columns = {}
+    for f in fields:
+        if f not in df.columns:
+            continue
+
+        values = df[f]
+        formatter = _field_formatter(schema, f, base=base)
+        if formatter is None:
+            columns[f] = values
+        elif f.endswith('_start') and base == 1 and pd.api.types.is_integer_dtype(values):
+            columns[f] = values + 1
+        elif schema.type(f) == 'boolean' and not f.endswith('_start') and \
+                pd.api.types.is_bool_dtype(values) and not values.hasnans:
+            columns[f] = values.map(schema._from_bool_map)
+        else:
+            # Other types are converted per value with missing values passed as None
+            values = values.astype(object).where(values.notna(), None)
+            columns[f] = pd.Series([formatter(x) for x in values], index=values.index, dtype=object)
+
+    return pd.DataFrame(columns, index=df.index).reindex(columns=fields)
+
+
+def merge_rearrangement(out_filename, in_filenames, drop=False, debug=False, workers=1, sort_key=None):
     """
     Merge one or more AIRR rearrangements files
 
+    When all input files have the same fields, records are copied without parsing: files
+    with identical headers are concatenated at the byte level, including block gzipped
+    (BGZF) blocks when all inputs and the output are gzipped, and files with the fields
+    in a different order only have their columns reordered. The output then keeps the
+    field order of the first input file.
+
     Arguments:
-      out_filename (str): output file path.
+      out_filename (str): output file path. Output is compressed according to the file extension.
       in_filenames (list): list of input files to merge.
       drop (bool): drop flag. If True then drop fields that do not exist in all input
                    files, otherwise combine fields from all input files.
       debug (bool): debug flag. If True print debugging information to standard error.
+      workers (int): number of processes used to parse input files when their fields differ.
+                     Records are written in the order of the input files.
+      sort_key (str): field name, or list of field names, by which the input files are sorted.
+                      If specified, records of all files are merged into a single output sorted
+                      by these fields, streaming the files without loading them into memory.
+                      Values are compared according to their type in the schema, with missing
+                      values last. Input files must be sorted by the same fields.
 
     Returns:
       bool: True if files were successfully merged, otherwise False.
     """
+    parts = []
+    written = False
     try:
+        # Copy records when all files have the same fields
+        headers = [_read_header(f) for f in in_filenames]
+        if sort_key is None and all(len(set(h)) == len(h) and set(h) == set(headers[0]) for h in headers):
+            if debug:
+                sys.stderr.write('Merging files with matching headers without parsing records\n')
+            written = True
+            _merge_text(out_filename, in_filenames, headers)
+            return True
+
         # gather fields from input files
-        readers = (RearrangementReader(open(f, 'r'), debug=False) for f in in_filenames)
-        field_list = [x.fields for x in readers]
         if drop:
-            field_set = set.intersection(*map(set, field_list))
+            field_set = set.intersection(*map(set, headers))
         else:
-            field_set = set.union(*map(set, field_list))
-        field_order = OrderedDict([(f, None) for f in chain(*field_list)])
+            field_set = set.union(*map(set, headers))
+        field_order = OrderedDict([(f, None) for f in chain(*headers)])
         out_fields = [f for f in field_order if f in field_set]
 
-        # write input files to output file sequentially
-        readers = (RearrangementReader(open(f, 'r'), debug=debug) for f in in_filenames)
-        with open(out_filename, 'w+') as handle:
+        written = True
+        with _open_text(out_filename, 'w') as handle:
             writer = RearrangementWriter(handle, fields=out_fields, debug=debug)
-            for reader in readers:
-                for r in reader:  writer.write(r)
-                reader.close()
+            if sort_key is not None:
+                # Merge sorted input files
+                _merge_sorted(writer, in_filenames, sort_key, debug=debug)
+            elif workers <= 1 or len(in_filenames) < 2:
+                # write input files to output file sequentially
+                for f in in_filenames:
+                    with _open_text(f) as in_handle:
+                        writer.writerows(RearrangementReader(in_handle, debug=debug))
+            else:
+                # convert input files in parallel to temporary files appended in input order
+                directory = os.path.dirname(os.path.abspath(out_filename))
+                for f in in_filenames:
+                    descriptor, part = tempfile.mkstemp(suffix='.tsv', prefix='.airr-merge-', dir=directory)
+                    os.close(descriptor)
+                    parts.append(part)
+                tasks = [(f, part, out_fields, debug) for f, part in zip(in_filenames, parts)]
+                with multiprocessing.Pool(workers) as pool:
+                    for part in pool.imap(_merge_part, tasks):
+                        with open(part, 'r') as part_handle:
+                            part_handle.readline()
+                            shutil.copyfileobj(part_handle, handle, 2**20)
+                        os.remove(part)
     except Exception as e:
         sys.stderr.write('Error occurred while merging AIRR rearrangement files: %s\n' % e)
+        # Remove the incomplete output
+        if written:
+            for f in (out_filename, out_filename + bgzf.INDEX_EXTENSION):
+                if os.path.exists(f):
+                    os.remove(f)
         return False
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
 
     return True
 
 
-def validate_rearrangement(filename, debug=False):
+def _sort_key(fields, schema=RearrangementSchema):
+    """
+    Build the function returning the sort key of a record
+
+    Arguments:
+      fields (list): field names to sort by.
+      schema (airr.schema.Schema): schema defining the field types.
+
+    Returns:
+      function: function taking a record dictionary and returning a tuple comparing
+                values by their schema type, with missing values sorted last.
+    """
+    defaults = {'integer': 0, 'number': 0.0, 'boolean': False}
+    keys = [(f, defaults.get(schema.type(f), '')) for f in fields]
+
+    def key(row):
+        values = []
+        for f, default in keys:
+            v = row.get(f)
+            missing = v is None or v == ''
+            values.append((missing, default if missing else v))
+        return tuple(values)
+
+    return key
+
+
+def _merge_sorted(writer, in_filenames, sort_key, debug=False):
+    """
+    Write the records of sorted rearrangements files as a single sorted output
+
+    Arguments:
+      writer (airr.io.RearrangementWriter): output writer.
+      in_filenames (list): list of sorted input files.
+      sort_key (str): field name, or list of field names, by which the input files are sorted.
+      debug (bool): debug flag. If True print debugging information to standard error.
+    """
+    fields = [sort_key] if isinstance(sort_key, str) else list(sort_key)
+    key = _sort_key(fields)
+
+    def stream(filename, reader):
+        previous = None
+        for row in reader:
+            current = key(row)
+            if previous is not None and current < previous:
+                raise ValueError('%s is not sorted by %s' % (filename, ', '.join(fields)))
+            previous = current
+            yield current, row
+
+    handles = []
+    try:
+        readers = []
+        for f in in_filenames:
+            handles.append(_open_text(f))
+            reader = RearrangementReader(handles[-1], debug=debug)
+            missing = [x for x in fields if x not in reader.fields]
+            if missing:
+                raise KeyError('field(s) %s not found in the header of %s' % (', '.join(missing), f))
+            readers.append(reader)
+        streams = [stream(f, r) for f, r in zip(in_filenames, readers)]
+        merged = heapq.merge(*streams, key=itemgetter(0))
+        writer.writerows(row for __, row in merged)
+    finally:
+        for h in handles:
+            h.close()
+
+
+def _merge_part(task):
+    """
+    Convert a rearrangements file to the fields of a merged file
+
+    Arguments:
+      task (tuple): input file path, temporary output file path, output fields and debug flag.
+
+    Returns:
+      str: path of the temporary file holding the converted records.
+    """
+    filename, part, fields, debug = task
+    with open(part, 'w') as handle, _open_text(filename) as in_handle:
+        writer = RearrangementWriter(handle, fields=fields, debug=debug)
+        writer.writerows(RearrangementReader(in_handle, debug=debug))
+
+    return part
+
+
+def _open_text(filename, mode='r'):
+    """
+    Open a TSV file as text, detecting the compression of files read and using the
+    extension for the compression of files written
+
+    Arguments:
+      filename (str): file path.
+      mode (str): one of 'r' or 'w'.
+
+    Returns:
+      file: text file handle.
+    """
+    return open_text(filename, mode)
+
+
+def _open_binary(filename):
+    """
+    Open an output file in binary mode, compressed according to its extension
+
+    Arguments:
+      filename (str): file path.
+
+    Returns:
+      file: binary file handle.
+    """
+    compression = compression_from_extension(filename)
+    return open(filename, 'wb') if compression is None else open_binary(filename, 'wb', compression)
+
+
+def _read_header(filename):
+    """
+    Read the field names of a TSV rearrangements file
+
+    Arguments:
+      filename (str): file path.
+
+    Returns:
+      list: field names.
+    """
+    with _open_text(filename) as handle:
+        return next(csv.reader(handle, dialect='excel-tab'), [])
+
+
+def _merge_text(out_filename, in_filenames, headers):
+    """
+    Merge TSV files with the same fields without parsing records
+
+    Arguments:
+      out_filename (str): output file path.
+      in_filenames (list): list of input files to merge.
+      headers (list): field names of each input file.
+    """
+    # Concatenate BGZF blocks when possible
+    if out_filename.endswith('.gz') and all(h == headers[0] for h in headers) \
+            and all(is_bgzf(f) for f in in_filenames):
+        bgzf.concatenate(out_filename, in_filenames, skip_lines=1)
+        return
+
+    with _open_binary(out_filename) as output:
+        _write_lines(output, [headers[0]])
+        for filename, header in zip(in_filenames, headers):
+            with open_reader(filename) as handle:
+                handle.readline()
+                if header == headers[0]:
+                    # Copy the records, terminating the last line
+                    last = b'\n'
+                    for data in iter(lambda: handle.read(2**20), b''):
+                        output.write(data)
+                        last = data[-1:]
+                    if last != b'\n':
+                        output.write(b'\n')
+                else:
+                    # Reorder columns, with missing trailing values of short rows as empty values
+                    width = len(header)
+                    columns = [header.index(f) for f in headers[0]]
+                    order = itemgetter(*columns) if len(columns) > 1 else lambda row: (row[columns[0]],)
+                    for line in handle:
+                        line = line.rstrip(b'\r\n')
+                        if not line:
+                            continue
+                        if b'"' in line:
+                            row = next(csv.reader([line.decode('utf-8')], dialect='excel-tab'))
+                            if len(row) < width:
+                                row.extend([''] * (width - len(row)))
+                            _write_lines(output, [order(row)])
+                        else:
+                            row = line.split(b'\t')
+                            if len(row) < width:
+                                row.extend([b''] * (width - len(row)))
+                            output.write(b'\t'.join(order(row)) + b'\n')
+
+
+def _write_lines(output, rows):
+    """
+    Write rows of text values as TSV lines to a binary file
+
+    Arguments:
+      output (file): binary file handle.
+      rows (list): rows of values.
+    """
+    buffer = StringIO()
+    csv.writer(buffer, dialect='excel-tab', lineterminator='\n').writerows(rows)
+    output.write(buffer.getvalue().encode('utf-8'))
+
+
+def sort_rearrangement(in_filename, out_filename, keys, memory_limit=2**30, compress=False,
+                       temp_dir=None, debug=False):
+    """
+    Sort an AIRR rearrangements file by one or more fields under a memory budget
+
+    Record lines are read into sorted runs of bounded memory that are written to temporary
+    files and merged. Lines are copied without parsing, only the values of the key fields
+    are read. Values are compared according to their type in the schema, with missing and
+    invalid values last, and records with equal keys keep their order in the input file.
+
+    Arguments:
+      in_filename (str): input file path.
+      out_filename (str): output file path. Output is compressed according to the file extension.
+      keys (list): field names to sort by. A single field name may be given as a string.
+      memory_limit (int): approximate number of bytes of records held in memory.
+      compress (bool): if True, gzip compress the temporary files of the sorted runs.
+      temp_dir (str): directory of the temporary files. If None, the default temporary
+                      directory is used.
+      debug (bool): debug flag. If True print debugging information to standard error.
+
+    Returns:
+      bool: True if the file was successfully sorted, otherwise False.
+    """
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    run_dir = None
+    try:
+        with open_reader(in_filename) as handle:
+            header_line = handle.readline()
+            header = next(csv.reader([header_line.decode('utf-8')], dialect='excel-tab'), [])
+            missing = [f for f in keys if f not in header]
+            if missing:
+                raise KeyError('field(s) %s not found in the header' % ', '.join(missing))
+            if not header_line.endswith(b'\n'):
+                header_line += b'\n'
+            key = _line_sort_key(header, keys)
+
+            # Write sorted runs of at most memory_limit bytes
+            runs = []
+            lines = []
+            size = 0
+            for line in handle:
+                if not line.rstrip(b'\r\n'):
+                    continue
+                if not line.endswith(b'\n'):
+                    line += b'\n'
+                lines.append(line)
+                size += sys.getsizeof(line)
+                if size >= memory_limit:
+                    if run_dir is None:
+                        run_dir = tempfile.mkdtemp(prefix='airr-sort-', dir=temp_dir)
+                    runs.append(_write_run(lines, header_line, key, run_dir, len(runs), compress, debug))
+                    lines = []
+                    size = 0
+
+        # Sort in memory if a single run is required
+        if not runs:
+            lines.sort(key=key)
+            with _open_binary(out_filename) as output:
+                output.write(header_line)
+                output.writelines(lines)
+            return True
+        if lines:
+            runs.append(_write_run(lines, header_line, key, run_dir, len(runs), compress, debug))
+        del lines
+
+        # Merge runs, in several passes if there are too many files to open at once
+        count = len(runs)
+        while len(runs) > _MAX_RUNS:
+            merged = []
+            for i in range(0, len(runs), _MAX_RUNS):
+                group = runs[i:i + _MAX_RUNS]
+                run = _run_name(run_dir, count, compress)
+                count += 1
+                with (gzip.open(run, 'wb', compresslevel=1) if compress else open(run, 'wb')) as output:
+                    _merge_runs(output, header_line, group, key)
+                for f in group:
+                    os.remove(f)
+                merged.append(run)
+            runs = merged
+
+        if debug:
+            sys.stderr.write('Merging %i sorted runs\n' % len(runs))
+        with _open_binary(out_filename) as output:
+            _merge_runs(output, header_line, runs, key)
+    except Exception as e:
+        sys.stderr.write('Error occurred while sorting AIRR rearrangement file: %s\n' % e)
+        return False
+    finally:
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    return True
+
+
+# Maximum number of sorted runs merged at once
+_MAX_RUNS = 256
+
+
+def _line_sort_key(header, fields, schema=RearrangementSchema):
+    """
+    Build the function returning the sort key of a record line
+
+    Arguments:
+      header (list): field names of the header.
+      fields (list): field names to sort by.
+      schema (airr.schema.Schema): schema defining the field types.
+
+    Returns:
+      function: function taking a record line as bytes and returning the key of the
+                record returned by the function built by _sort_key, with invalid values
+                considered missing.
+    """
+    key = _sort_key(fields, schema=schema)
+    columns = [header.index(f) for f in fields]
+    maxsplit = max(columns) + 1
+    identity = lambda value: value
+    converters = [(f, i, _field_converter(schema, f, base=0) or identity) for f, i in zip(fields, columns)]
+
+    def line_key(line):
+        if b'"' in line:
+            row = next(csv.reader([line.decode('utf-8')], dialect='excel-tab'))
+        else:
+            row = line.rstrip(b'\r\n').split(b'\t', maxsplit)
+            row = [x.decode('utf-8') for x in row[:maxsplit]]
+        return key({f: convert(row[i]) if i < len(row) else None for f, i, convert in converters})
+
+    return line_key
+
+
+def _run_name(run_dir, index, compress):
+    """
+    Path of the temporary file of a sorted run
+
+    Arguments:
+      run_dir (str): temporary directory.
+      index (int): run number.
+      compress (bool): whether the run is gzip compressed.
+
+    Returns:
+      str: file path.
+    """
+    return os.path.join(run_dir, 'run%06i.tsv%s' % (index, '.gz' if compress else ''))
+
+
+def _write_run(lines, header_line, key, run_dir, index, compress, debug=False):
+    """
+    Sort record lines and write them to a temporary file
+
+    Arguments:
+      lines (list): record lines.
+      header_line (bytes): header line.
+      key (function): sort key function of a line.
+      run_dir (str): temporary directory.
+      index (int): run number.
+      compress (bool): whether to gzip compress the run.
+      debug (bool): debug flag. If True print debugging information to standard error.
+
+    Returns:
+      str: path of the run file.
+    """
+    lines.sort(key=key)
+    run = _run_name(run_dir, index, compress)
+    if debug:
+        sys.stderr.write('Writing sorted run of %i records to %s\n' % (len(lines), run))
+    with (gzip.open(run, 'wb', compresslevel=1) if compress else open(run, 'wb')) as output:
+        output.write(header_line)
+        output.writelines(lines)
+
+    return run
+
+
+def _merge_runs(output, header_line, runs, key):
+    """
+    Write the record lines of sorted runs as a single sorted output
+
+    Arguments:
+      output (file): binary output file handle.
+      header_line (bytes): header line.
+      runs (list): paths of the sorted runs, in input order.
+      key (function): sort key function of a line.
+    """
+    handles = []
+    try:
+        for run in runs:
+            handles.append(gzip.open(run, 'rb') if run.endswith('.gz') else open(run, 'rb'))
+            handles[-1].readline()
+        output.write(header_line)
+        # Lines with equal keys are taken from the earlier run first
+        output.writelines(heapq.merge(*handles, key=key))
+    finally:
+        for h in handles:
+            h.close()
+
+
+def split_rearrangement(in_filename, by, out_dir='.', prefix=None, max_open=256, buffer_size=2**26,
+                        debug=False):
+    """
+    Split an AIRR rearrangements file into one file per value of one or more fields
+
+    The input file is read once and each record line is copied without parsing to the
+    output file of its key. Lines are buffered in memory and written in batches, keeping
+    at most max_open output files open at a time. The least recently used file is closed
+    and later reopened for appending when more partitions are written, so that the number
+    of partitions is not limited by the number of open files allowed by the operating system.
+
+    Output files are named prefix, followed by the values of the fields joined by '_'
+    and the extension '.tsv', with missing values written as 'NA' and characters other
+    than letters, digits, '.' and '-' replaced by '_'.
+
+    Arguments:
+      in_filename (str): input file path.
+      by (list): field names to split by. A single field name may be given as a string.
+      out_dir (str): directory of the output files.
+      prefix (str): prefix of the output file names. If None, the name of the input file
+                    without its extensions followed by '_' is used.
+      max_open (int): maximum number of output files open at the same time.
+      buffer_size (int): number of bytes of record lines buffered before writing.
+      debug (bool): debug flag. If True print debugging information to standard error.
+
+    Returns:
+      dict: dictionary of output file paths keyed by tuples of field values, with
+            None for missing values, or None if an error occurred.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    if prefix is None:
+        prefix = os.path.basename(in_filename).split('.')[0] + '_'
+
+    paths = OrderedDict()
+    names = set()
+    handles = OrderedDict()
+
+    def flush(pending):
+        for key, lines in pending.items():
+            # Output file of the key, closing the least recently used file when too many are open
+            output = handles.get(key)
+            if output is not None:
+                handles.move_to_end(key)
+            else:
+                if len(handles) >= max_open:
+                    handles.popitem(last=False)[1].close()
+                path = paths.get(key)
+                if path is None:
+                    path = _split_name(out_dir, prefix, key, names)
+                    paths[key] = path
+                    if debug:
+                        sys.stderr.write('Writing records of %s to %s\n' % (key, path))
+                    output = open(path, 'wb')
+                    output.write(header_line)
+                else:
+                    output = open(path, 'ab')
+                handles[key] = output
+            output.writelines(lines)
+
+    try:
+        with open_reader(in_filename) as handle:
+            header_line = handle.readline()
+            header = next(csv.reader([header_line.decode('utf-8')], dialect='excel-tab'), [])
+            missing = [f for f in by if f not in header]
+            if missing:
+                raise KeyError('field(s) %s not found in the header' % ', '.join(missing))
+            columns = [header.index(f) for f in by]
+            maxsplit = max(columns) + 1
+            if not header_line.endswith(b'\n'):
+                header_line += b'\n'
+
+            pending = {}
+            size = 0
+            for line in handle:
+                if not line.rstrip(b'\r\n'):
+                    continue
+                if not line.endswith(b'\n'):
+                    line += b'\n'
+
+                # Key values of the record
+                if b'"' in line:
+                    row = next(csv.reader([line.decode('utf-8')], dialect='excel-tab'))
+                    key = tuple(row[i] if i < len(row) and row[i] else None for i in columns)
+                else:
+                    row = line.rstrip(b'\r\n').split(b'\t', maxsplit)
+                    key = tuple(row[i].decode('utf-8') if i < len(row) and row[i] else None for i in columns)
+
+                lines = pending.get(key)
+                if lines is None:
+                    pending[key] = lines = []
+                lines.append(line)
+                size += len(line)
+                if size >= buffer_size:
+                    flush(pending)
+                    pending = {}
+                    size = 0
+            flush(pending)
+    except Exception as e:
+        sys.stderr.write('Error occurred while splitting AIRR rearrangement file: %s\n' % e)
+        return None
+    finally:
+        for output in handles.values():
+            output.close()
+
+    return dict(paths)
+
+
+def _split_name(out_dir, prefix, key, names):
+    """
+    Path of the output file of a partition
+
+    Arguments:
+      out_dir (str): output directory.
+      prefix (str): file name prefix.
+      key (tuple): field values of the partition.
+      names (set): file names already in use, updated with the new name.
+
+    Returns:
+      str: file path.
+    """
+    base = prefix + '_'.join(re.sub(r'[^\w.-]', '_', 'NA' if x is None else x) for x in key)
+    name = base + '.tsv'
+    i = 1
+    while name in names:
+        name = '%s-%i.tsv' % (base, i)
+        i += 1
+    names.add(name)
+
+    return os.path.join(out_dir, name)
+
+
+def validate_rearrangement(filename, debug=False, workers=1):
     """
     Validates an AIRR rearrangements file
 
     Arguments:
       filename (str): path of the file to validate.
       debug (bool): debug flag. If True print debugging information to standard error.
+      workers (int): number of processes used to validate the records. If greater than 1,
+                     uncompressed TSV files are split into shards of whole lines that are
+                     validated in parallel. Errors are reported in record order.
 
     Returns:
       bool: True if files passed validation, otherwise False.
@@ -197,8 +1178,18 @@ def validate_rearrangement(filename, debug=False):
     if debug:
         sys.stderr.write('Validating: %s\n' % filename)
 
+    # Shards are read from regular files, pipes are validated serially
+    if workers > 1 and _rearrangement_format(filename) == 'tsv' and os.path.isfile(filename):
+        if detect_compression(filename) is None:
+            return _validate_parallel(filename, workers, debug=debug)
+        elif is_bgzf(filename):
+            # Files without an up to date block index are validated serially
+            index = read_index(filename)
+            if index is not None:
+                return _validate_parallel(filename, workers, debug=debug, index=index)
+
     # Open reader
-    handle = open(filename, 'r')
+    handle = open_text(filename)
     reader = RearrangementReader(handle, validate=True)
 
     # Validate header
@@ -227,8 +1218,155 @@ def validate_rearrangement(filename, debug=False):
 
     return valid
 
+
+def _validate_parallel(filename, workers, debug=False, shard_size=2**26, index=None):
+    """
+    Validates an uncompressed or block gzipped AIRR rearrangements file with a pool of processes
+
+    Arguments:
+      filename (str): path of the file to validate.
+      workers (int): number of processes.
+      debug (bool): debug flag. If True print debugging information to standard error.
+      shard_size (int): maximum number of bytes validated by a process at a time.
+      index (list): block index of a BGZF file, as returned by airr.bgzf.read_index.
+                    If None, the file is assumed to be uncompressed.
+
+    Returns:
+      bool: True if files passed validation, otherwise False.
+    """
+    valid = True
+
+    # Validate header
+    opener = open if index is None else gzip.open
+    with opener(filename, 'rb') as handle:
+        header = handle.readline()
+    try:
+        RearrangementSchema.validate_header(next(csv.reader([header.decode('utf-8')], dialect='excel-tab')))
+    except ValidationError as e:
+        valid = False
+        if debug:
+            sys.stderr.write('%s has validation error: %s\n' % (filename, e))
+
+    # Split records into shards of whole lines
+    size = os.path.getsize(filename)
+    if index is None:
+        offset = len(header)
+        count = max(workers, -(-(size - offset) // shard_size))
+        bounds = [offset]
+        with open(filename, 'rb') as handle:
+            for k in range(1, count):
+                position = offset + k * (size - offset) // count
+                if position <= bounds[-1]:
+                    continue
+                handle.seek(position - 1)
+                handle.readline()
+                if handle.tell() > bounds[-1]:
+                    bounds.append(handle.tell())
+    else:
+        # Blocks starting at a line boundary, the first containing the header
+        offset = 0
+        count = max(workers, -(-size // shard_size))
+        blocks = [x[0] for x in index]
+        bounds = [offset]
+        for k in range(1, count):
+            i = bisect_left(blocks, k * size // count)
+            if i < len(blocks) and blocks[i] > bounds[-1]:
+                bounds.append(blocks[i])
+    if bounds[-1] < size:
+        bounds.append(size)
+
+    # Validate shards and report errors in record order
+    shards = [(filename, header, a, b, index is not None) for a, b in zip(bounds, bounds[1:])]
+    records = 0
+    with multiprocessing.Pool(workers) as pool:
+        for n, errors in pool.imap(_validate_shard, shards):
+            for i, e in errors:
+                valid = False
+                if debug:
+                    sys.stderr.write('%s at record %i has validation error: %s\n' % (filename, records + i, e))
+            records += n
+
+    return valid
+
+
+def _validate_shard(shard):
+    """
+    Validates the records of a byte range of a rearrangements file
+
+    Arguments:
+      shard (tuple): file path, header line, start and end positions of the byte range and
+                     whether the byte range is a sequence of BGZF blocks.
+
+    Returns:
+      tuple: number of records and a list of the record number in the shard and the error message
+             of invalid records.
+    """
+    filename, header, start, end, compressed = shard
+    with open(filename, 'rb') as handle:
+        handle.seek(start)
+        data = handle.read(end - start)
+    if compressed:
+        data = gzip.decompress(data)
+        if start == 0:
+            data = data[len(header):]
+
+    # Rows are validated without calling iter, which validates the header
+    reader = RearrangementReader(StringIO((header + data).decode('utf-8')), validate=True)
+    errors = []
+    i = 0
+    while True:
+        try:
+            i = i + 1
+            next(reader)
+        except StopIteration:
+            break
+        except ValidationError as e:
+            errors.append((i, str(e)))
+
+    return i - 1, errors
+
 #### AIRR Data Model ####
 
+def _yaml_loader(libyaml=True):
+    """
+    YAML loader class, loading mappings as dictionaries in the order of the file
+
+    Arguments:
+      libyaml (bool): if True, use the libyaml based loader when PyYAML is built with libyaml.
+
+    Returns:
+      type: yaml.CLoader, or yaml.Loader if libyaml is False or unavailable.
+    """
+    # yaml is only required for YAML files
+    import yaml
+    return getattr(yaml, 'CLoader', yaml.Loader) if libyaml else yaml.Loader
+
+
+def _yaml_dumper(libyaml=True):
+    """
+    YAML dumper class, writing dictionaries and OrderedDict objects as plain mappings
+
+    Arguments:
+      libyaml (bool): if True, use the libyaml based dumper when PyYAML is built with libyaml.
+
+    Returns:
+      type: subclass of yaml.CDumper, or of yaml.Dumper if libyaml is False or unavailable.
+            Keys are written in order when dumped with sort_keys=False.
+    """
+    import yaml
+    base = getattr(yaml, 'CDumper', yaml.Dumper) if libyaml else yaml.Dumper
+    dumper = _yaml_dumpers.get(base)
+    if dumper is None:
+        dumper = type('Dumper', (base,), {})
+        dumper.add_representer(OrderedDict, yaml.representer.SafeRepresenter.represent_dict)
+        _yaml_dumpers[base] = dumper
+    return dumper
+
+
+# YAML dumper classes keyed by their base class
+_yaml_dumpers = {}
+
+
 def read_airr(filename, format=None, validate=False, model=True, debug=False, check_nullable=True):
     """
     Load an AIRR Data file
@@ -250,12 +1388,13 @@ def read_airr(filename, format=None, validate=False, model=True, debug=False, ch
     """
     # Because the AIRR Data File is read in completely, we do not bother with a reader class.
     # Determine file type from extension and use appropriate loader
-    ext = str.lower(filename.split('.')[-1]) if not format else format
+    ext = str.lower(strip_extension(filename).split('.')[-1]) if not format else format
     if ext in ('yaml', 'yml'):
-        with open(filename, 'r', encoding='utf-8') as handle:
-            data = yaml.load(handle, Loader=yamlordereddictloader.Loader)
+        import yaml
+        with open_text(filename, encoding='utf-8') as handle:
+            data = yaml.load(handle, Loader=_yaml_loader())
     elif ext == 'json':
-        with open(filename, 'r', encoding='utf-8') as handle:
+        with open_text(filename, encoding='utf-8') as handle:
             data = json.load(handle)
     else:
         if debug:  sys.stderr.write('Unknown file type: %s. Supported file extensions are "yaml", "yml" or "json"\n' % ext)
@@ -275,7 +1414,7 @@ def read_airr(filename, format=None, validate=False, model=True, debug=False, ch
     return data
 
 
-def validate_airr(data, model=True, debug=False, check_nullable=True):
+def validate_airr(data, model=True, debug=False, check_nullable=True, compiled=True):
     """
     Validates an AIRR Data file
 
@@ -284,6 +1423,10 @@ def validate_airr(data, model=True, debug=False, check_nullable=True):
       model (bool): If True only validate objects defined in the AIRR DataFile schema.
                   If False, attempt validation of all top-level objects
       debug (bool): debug flag. If True print debugging information to standard error.
+      check_nullable (bool): whether to check for nullable fields.
+      compiled (bool): if True, validate objects with the compiled validators of their schema,
+                       as returned by airr.schema.Schema.compile, otherwise with
+                       airr.schema.Schema.validate_object.
 
     Returns:
       bool: True if files passed validation, otherwise False.
@@ -305,7 +1448,8 @@ def validate_airr(data, model=True, debug=False, check_nullable=True):
             continue
 
         # Get Schema
-        schema = AIRRSchema.get(k, Schema(k))
+        schema = AIRRSchema[k] if k in AIRRSchema else get_schema(k)
+        validate = schema.compile() if compiled else schema.validate_object
 
         # Determine input type and set appropriate iterator
         if hasattr(object, 'items'):
@@ -325,7 +1469,7 @@ def validate_airr(data, model=True, debug=False, check_nullable=True):
         # Validate each record in array
         for i, record in obj_iter:
             try:
-                schema.validate_object(record, check_nullable=check_nullable)
+                validate(record, check_nullable=check_nullable)
             except ValidationError as e:
                 valid = False
                 if debug:  sys.stderr.write('%s at array position %s with validation error: %s\n' % (k, i, e))
@@ -389,8 +1533,9 @@ def write_airr(filename, data, format=None, info=None, validate=False, model=Tru
     # Determine file type from extension and use appropriate loader
     ext = str.lower(filename.split('.')[-1]) if not format else format
     if ext in ('yaml', 'yml'):
+        import yaml
         with open(filename, 'w') as handle:
-            yaml.dump(md, handle, default_flow_style=False)
+            yaml.dump(md, handle, Dumper=_yaml_dumper(), default_flow_style=False, sort_keys=False)
     elif ext == 'json':
         with open(filename, 'w') as handle:
             json.dump(md, handle, sort_keys=False, indent=2)
@@ -4,9 +4,216 @@ Reference library for AIRR schema for Ig/TCR rearrangements
 from __future__ import print_function
 import sys
 import csv
+import mmap
+import os
+from io import StringIO
+from itertools import chain, islice, repeat
+from operator import itemgetter
+from airr.index import load_index
 from airr.schema import RearrangementSchema, ValidationError
 
 
+def _field_converter(schema, field, base=1, validate=False):
+    """
+    Build the function converting a field from its string representation
+
+    Arguments:
+      schema (airr.schema.Schema): schema defining the field types.
+      field (str): field name.
+      base (int): coordinate schema of the input. If 1, then coordinate fields
+                  are shifted to python style 0-based half-open intervals.
+      validate (bool): when True the converter raises a ValidationError for an invalid value.
+                       Otherwise, invalid values are converted to None.
+
+    Returns:
+      function: converter taking a string and returning the typed value, or None if the
+                field does not require conversion.
+    """
+    spec = schema.type(field)
+    shift = field.endswith('_start') and base == 1
+    offset = 1 if shift else 0
+
+    if spec == 'boolean':
+        bool_map = schema._to_bool_map
+        def convert(value):
+            if value == '' or value is None:
+                return None
+            bool_value = bool_map.get(value)
+            if bool_value is None and validate:
+                raise ValidationError('invalid bool %s' % value)
+            return bool_value
+    elif spec == 'integer':
+        def convert(value):
+            if value == '' or value is None:
+                return None
+            try:
+                return int(value) - offset
+            except ValueError:
+                if validate:
+                    raise ValidationError('invalid int %s' % value)
+                return None
+    elif spec == 'number':
+        def convert(value):
+            if value == '' or value is None:
+                return None
+            try:
+                return float(value) - offset
+            except ValueError:
+                if validate:
+                    raise ValidationError('invalid float %s' % value)
+                return None
+    else:
+        convert = None
+
+    # Untyped coordinates cannot be shifted and are set to None
+    if shift and convert is None:
+        convert = lambda value: None
+
+    return convert
+
+
+def _field_formatter(schema, field, base=1):
+    """
+    Build the function converting a field value for output
+
+    Arguments:
+      schema (airr.schema.Schema): schema defining the field types.
+      field (str): field name.
+      base (int): coordinate schema of the output. If 1, then coordinate fields
+                  are shifted from python style 0-based half-open intervals.
+
+    Returns:
+      function: converter taking a value and returning the value to write, or None if the
+                field does not require conversion.
+    """
+    spec = schema.type(field)
+    shift = field.endswith('_start') and base == 1
+
+    if shift:
+        to_int = schema.to_int
+        def convert(value):
+            if value.__class__ is int:
+                return value + 1
+            try:
+                return to_int(value) + 1
+            except TypeError:
+                return None
+    else:
+        convert = None
+
+    if spec == 'boolean':
+        bool_map = schema._from_bool_map
+        def from_bool(value):
+            if value == '' or value is None:
+                return ''
+            return bool_map.get(value)
+        if convert is None:
+            convert = from_bool
+        else:
+            shift_value = convert
+            convert = lambda value: from_bool(shift_value(value))
+
+    return convert
+
+
+def _output_fields(schema, fields=None):
+    """
+    Order output fields according to the schema
+
+    Arguments:
+      schema (airr.schema.Schema): schema defining the fields.
+      fields (list): list of non-required fields to add.
+
+    Returns:
+      list: the required fields, followed by the optional fields and then by the
+            fields undefined by the schema, in the order they are provided.
+    """
+    field_names = list(schema.required)
+    if fields is not None:
+        additional_fields = []
+        for f in fields:
+            if f in schema.required:
+                continue
+            elif f in schema.optional:
+                field_names.append(f)
+            else:
+                additional_fields.append(f)
+        field_names.extend(additional_fields)
+
+    return field_names
+
+
+class RearrangementRecord(tuple):
+    """
+    Base class for Rearrangement records returned by RearrangementReader in record mode
+
+    Record classes are generated from the header of each file and provide attribute
+    access to the values by field name, e.g. ``record.sequence_id``.
+
+    Attributes:
+      _fields (tuple): field names of the record.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__,
+                           ', '.join('%s=%r' % (f, v) for f, v in zip(self._fields, self)))
+
+    def _asdict(self):
+        """
+        Convert the record to a dictionary
+
+        Returns:
+          dict: dictionary of field names and values.
+        """
+        return dict(zip(self._fields, self))
+
+
+def _record_class(fields):
+    """
+    Generate a record class for a list of fields
+
+    Arguments:
+      fields (list): field names.
+
+    Returns:
+      type: subclass of RearrangementRecord with a property for each field.
+
+    Raises:
+      ValueError: raised if a field name starts with an underscore or is the name of an
+                  attribute of the records, as for collections.namedtuple.
+    """
+    invalid = [f for f in fields if f.startswith('_') or hasattr(RearrangementRecord, f)]
+    if invalid:
+        raise ValueError('field name(s) %s cannot be used as record attributes' % ', '.join(invalid))
+
+    namespace = {'__slots__': (), '_fields': tuple(fields)}
+    for i, f in enumerate(fields):
+        namespace[f] = property(itemgetter(i), doc='Alias for field %s' % f)
+
+    return type('Rearrangement', (RearrangementRecord,), namespace)
+
+
+def _row_constructor(rows, fields):
+    """
+    Build the function creating rows from lists of values
+
+    Arguments:
+      rows (str): type of the rows. One of 'dict', 'tuple' or 'record'.
+      fields (list): field names.
+
+    Returns:
+      function: constructor taking a sequence of values in the order of the fields.
+    """
+    if rows == 'tuple':
+        return tuple
+    elif rows == 'record':
+        return _record_class(fields)
+    else:
+        return lambda row: dict(zip(fields, row))
+
+
 class RearrangementReader:
     """
     Iterator for reading Rearrangement objects in TSV format
@@ -37,7 +244,7 @@ class RearrangementReader:
         return [f for f in self.dict_reader.fieldnames \
                 if f not in self.schema.properties]
 
-    def __init__(self, handle, base=1, validate=False, debug=False):
+    def __init__(self, handle, base=1, validate=False, debug=False, rows='dict', fields=None):
         """
         Initialization
 
@@ -51,19 +258,34 @@ class RearrangementReader:
                            performed will reading the data. A ValidationError exception
                            will be raised if an error is found.
           debug (bool): debug state. If True prints debug information.
+          rows (str): type of the returned rows. One of 'dict' for a dictionary of field names
+                      and values, 'tuple' for a tuple of values in the order of the fields, or
+                      'record' for a RearrangementRecord providing attribute access by field name.
+                      Records cannot be created for field names starting with an underscore or
+                      naming record methods, such as count and index.
+          fields (list): fields to return. If specified, only these fields are converted and
+                         returned, in the given order, and validation is limited to the header
+                         and the values of these fields. Fields missing from the file are returned
+                         as None. If None, then all fields in the file are returned.
 
         Returns:
           airr.io.RearrangementReader: reader object.
         """
+        if rows not in ('dict', 'tuple', 'record'):
+            raise ValueError('rows must be one of "dict", "tuple" or "record"')
+
         # arguments
         self.handle = handle
         self.base = base
         self.debug = debug
         self.validate = validate
+        self.rows = rows
         self.schema = RearrangementSchema
+        self._projection = list(fields) if fields is not None else None
 
         # data reader, collect field names
         self.dict_reader = csv.DictReader(self.handle, dialect='excel-tab')
+        self._converters = None
 
     def __iter__(self):
         """
@@ -74,7 +296,10 @@ class RearrangementReader:
         """
         # Validate fields
         if (self.validate):
-            self.schema.validate_header(self.dict_reader.fieldnames)
+            self.schema.validate_header(self.fields)
+
+        # Build the conversion plan for the header
+        self._compile()
 
         return self
 
@@ -83,41 +308,385 @@ class RearrangementReader:
         Next method
 
         Returns:
-          dict: parsed Rearrangement data.
+          dict: parsed Rearrangement data. A tuple or airr.io.RearrangementRecord is
+                returned instead if the reader was created with rows='tuple' or rows='record'.
+        """
+        if self._converters is None:
+            self._compile()
+
+        return self._make_row(self._read())
+
+    def _read(self):
+        """
+        Read and convert the values of the next row
+
+        Returns:
+          list: converted values of the returned fields.
+        """
+        return self._convert(self._next_row())
+
+    def _next_row(self):
+        """
+        Read the next row
+
+        Returns:
+          list: column values of the row.
+        """
+        row = next(self._csv_reader)
+        # skip blank lines, as csv.DictReader does
+        while row == []:
+            row = next(self._csv_reader)
+
+        return row
+
+    def _read_columns(self, size):
+        """
+        Read the next rows split into columns
+
+        Blocks of plain lines are split at once, other blocks are parsed with the csv module.
+
+        Arguments:
+          size (int): maximum number of rows.
+
+        Returns:
+          tuple: number of rows read and list of the values of each column, followed
+                 by a column of None for the fields missing from the file. Only the
+                 columns of the returned fields are filled.
         """
+        handle = self.handle
+        if iter(handle) is not handle:
+            return self._transpose(list(islice(filter(None, self._csv_reader), size)))
+
+        lines = list(islice(handle, size))
+        text = ''.join(lines)
+        columns = self._split_block(text, lines, '\t')
+        if columns is None:
+            rows = csv.reader(chain(lines, handle), dialect='excel-tab')
+            return self._transpose(list(islice(filter(None, rows), size)))
+
+        return len(lines), columns
+
+    def _split_block(self, text, lines, tab):
+        """
+        Split a block of lines into columns
+
+        Arguments:
+          text (str): lines of the block joined, as str or bytes.
+          lines (list): lines of the block.
+          tab (str): tab character, of the same type as the lines.
+
+        Returns:
+          list: values of each column as returned by RearrangementReader._read_columns,
+                or None if the block holds quotes, carriage returns, blank lines or rows
+                with a different number of columns than the header.
+        """
+        if not lines or self._width == 0:
+            return None
+        if not isinstance(text, str):
+            if b'"' in text or b'\r' in text or b'\n\n' in text:
+                return None
+            text = text.decode('utf-8')
+        elif '"' in text or '\r' in text or '\n\n' in text:
+            return None
+        if text.startswith('\n') or set(map(type(tab).count, lines, repeat(tab))) != {self._width - 1}:
+            return None
+
+        # Flatten the lines and slice the columns of the returned fields
+        if text.endswith('\n'):
+            text = text[:-1]
+        cells = text.replace('\n', '\t').split('\t')
+        columns = [None] * self._width
+        for i in set(self._columns):
+            if i < self._width:
+                columns[i] = cells[i::self._width]
+        columns.append((None,) * len(lines))
+
+        return columns
+
+    def _transpose(self, rows):
+        """
+        Split rows into columns
+
+        Arguments:
+          rows (list): column values of each row.
+
+        Returns:
+          tuple: number of rows and list of the values of each column, as returned by
+                 RearrangementReader._read_columns.
+        """
+        if not rows:
+            return 0, None
+
+        # Check the row lengths once for the block
+        if max(map(len, rows)) > self._width:
+            if self.validate:
+                raise ValidationError('row has extra data')
+            else:
+                raise ValueError('row has extra data')
+        if min(map(len, rows)) < self._width:
+            for row in rows:
+                row.extend([None] * (self._width - len(row)))
+
+        columns = list(zip(*rows))
+        columns.append((None,) * len(rows))
+
+        return len(rows), columns
+
+    def _convert(self, row):
+        """
+        Convert the values of a row split into columns
+
+        Arguments:
+          row (list): column values of the row.
+
+        Returns:
+          list: converted values of the returned fields.
+        """
+        # row entry with no header
+        if len(row) > self._width:
+            if self.validate:
+                raise ValidationError('row has extra data')
+            else:
+                raise ValueError('row has extra data')
+        elif len(row) < self._width:
+            row.extend([None] * (self._width - len(row)))
+
+        # Convert types and adjust coordinates
+        f = None
         try:
-            row = next(self.dict_reader)
-        except StopIteration:
-            raise StopIteration
-
-        for f in row:
-            # row entry with no header
-            if f is None:
-                if self.validate:
-                    raise ValidationError('row has extra data')
-                else:
-                    raise ValueError('row has extra data')
+            for i, f, convert in self._converters:
+                row[i] = convert(row[i])
+        except ValidationError as e:
+            raise ValidationError('field %s has %s' %(f, e))
+
+        # Select requested fields, the trailing None fills fields missing from the file
+        if self._select is not None:
+            row.append(None)
+            row = self._select(row)
+
+        return row
+
+    def iter_batches(self, batch_size=10000):
+        """
+        Iterate over the records in column-oriented batches
+
+        Values are typed and coordinates adjusted as for rows. Integer and boolean fields are
+        returned as numpy masked arrays, with missing values masked. Number fields are returned
+        as float64 numpy arrays, with missing values set to NaN. All other fields are returned
+        as lists.
+
+        Arguments:
+          batch_size (int): maximum number of records in each batch.
+
+        Returns:
+          generator: yielding dictionaries of field names and column values.
+        """
+        # numpy is only required for batches
+        import numpy as np
+
+        if batch_size < 1:
+            raise ValueError('batch_size must be a positive integer')
+
+        iter(self)
+        plan = [(f, self.schema.type(f),
+                 _field_converter(self.schema, f, base=self.base, validate=self.validate))
+                for f in self._fieldnames]
 
-            # Convert types
-            spec = self.schema.type(f)
+        def _fallback(values, f, convert):
             try:
-                if spec == 'boolean':
-                    row[f] = self.schema.to_bool(row[f], validate=self.validate)
-                if spec == 'integer':
-                    row[f] = self.schema.to_int(row[f], validate=self.validate)
-                if spec == 'number':
-                    row[f] = self.schema.to_float(row[f], validate=self.validate)
+                return [convert(v) for v in values]
             except ValidationError as e:
-                raise ValidationError('field %s has %s' %(f, e))
+                raise ValidationError('field %s has %s' % (f, e))
+
+        def _masked(values, dtype, fill):
+            data = np.array(values, dtype=object)
+            mask = np.equal(data, None)
+            data[mask] = fill
+            return np.ma.MaskedArray(data.astype(dtype), mask=mask)
 
-            # Adjust coordinates
-            if f and f.endswith('_start') and self.base == 1:
+        def _column(values, f, spec, convert):
+            if convert is None:
+                return list(values)
+            elif spec in ('integer', 'number'):
+                # Parse the whole column at once, falling back to the converter
+                # for the values that are not plain numbers
+                dtype = np.int64 if spec == 'integer' else np.float64
+                data = np.array(values, dtype=object)
+                mask = np.equal(data, None) | (data == '')
+                data[mask] = '0'
                 try:
-                    row[f] = row[f] - 1
-                except TypeError:
-                    row[f] = None
+                    data = data.astype(dtype)
+                except (TypeError, ValueError):
+                    data = _masked(_fallback(values, f, convert), dtype, 0)
+                    data, mask = data.data, data.mask
+                else:
+                    if f.endswith('_start') and self.base == 1:
+                        data -= 1
+                if spec == 'number':
+                    data[mask] = np.nan
+                    return data
+                return np.ma.MaskedArray(data, mask=mask)
+            elif spec == 'boolean':
+                # Convert each distinct value once
+                try:
+                    lookup = {v: convert(v) for v in set(values)}
+                except ValidationError as e:
+                    raise ValidationError('field %s has %s' % (f, e))
+                return _masked([lookup[v] for v in values], bool, False)
+            else:
+                return _fallback(values, f, convert)
 
-        return row
+        def _concatenate(parts):
+            if len(parts) == 1:
+                return parts[0]
+            elif isinstance(parts[0], list):
+                return list(chain.from_iterable(parts))
+            elif isinstance(parts[0], np.ma.MaskedArray):
+                return np.ma.MaskedArray(np.concatenate([p.data for p in parts]),
+                                         mask=np.concatenate([p.mask for p in parts]))
+            else:
+                return np.concatenate(parts)
+
+        # Batches are converted in blocks of rows small enough for their values to stay in cache
+        block_size = min(batch_size, 8192)
+
+        while True:
+            count = 0
+            parts = [[] for __ in plan]
+            while count < batch_size:
+                size = min(block_size, batch_size - count)
+                n, columns = self._read_columns(size)
+                if n == 0:
+                    break
+                for part, i, (f, spec, convert) in zip(parts, self._columns, plan):
+                    part.append(_column(columns[i], f, spec, convert))
+                count += n
+                if n < size:
+                    break
+            if count == 0:
+                return
+
+            yield {f: _concatenate(part) for (f, __, __), part in zip(plan, parts)}
+
+            if count < batch_size:
+                return
+
+    def get(self, sequence_id):
+        """
+        Get the record of a sequence identifier
+
+        Arguments:
+          sequence_id (str): sequence identifier.
+
+        Returns:
+          dict: parsed Rearrangement data, as returned by the iterator, or None if the file has
+                no record with this identifier. The first record is returned for duplicated identifiers.
+        """
+        return self.get_many([sequence_id])[0]
+
+    def get_many(self, ids):
+        """
+        Get the records of sequence identifiers
+
+        Records are read directly from their position in the file using the sequence_id
+        index stored next to the file. The index is built if it does not exist, and rebuilt
+        if the size or modification time of the file changed since it was built. Only
+        uncompressed files can be indexed. The position of the iterator is unchanged.
+
+        Arguments:
+          ids (list): sequence identifiers.
+
+        Returns:
+          list: parsed Rearrangement data of each identifier, or None for identifiers without
+                a record in the file.
+        """
+        filename = getattr(self.handle, 'name', None)
+        if not isinstance(filename, str):
+            raise ValueError('records can only be looked up in files opened by name')
+        if self._converters is None:
+            self._compile()
+        header = self.fields or []
+        if 'sequence_id' not in header:
+            raise KeyError('field sequence_id not found in the header of %s' % filename)
+        column = header.index('sequence_id')
+
+        ids = [str(x) for x in ids]
+        candidates = load_index(filename).lookup(ids)
+
+        # Read the candidate lines in file order
+        rows = {}
+        with open(filename, 'rb') as handle:
+            for offset in sorted({o for c in candidates for o in c}):
+                handle.seek(offset)
+                text = handle.readline().rstrip(b'\r\n').decode('utf-8')
+                rows[offset] = next(csv.reader([text], dialect='excel-tab')) if '"' in text else text.split('\t')
+
+        results = []
+        for x, offsets in zip(ids, candidates):
+            record = None
+            for offset in offsets:
+                row = rows[offset]
+                if column < len(row) and row[column] == x:
+                    record = self._make_row(self._convert(list(row)))
+                    break
+            results.append(record)
+
+        return results
+
+    def _compile(self):
+        """
+        Build the per-column conversion plan from the header
+
+        The plan holds one converter for each column that requires type conversion
+        or coordinate adjustment, so that rows only need to be passed through their
+        converters instead of looking up the schema for every field.
+        """
+        header = self._open()
+        self._width = len(header)
+
+        # Map output fields to columns
+        if self._projection is None:
+            self._fieldnames = header
+            columns = list(range(self._width))
+            self._select = None
+        else:
+            # Last column wins for duplicated field names, as for dictionaries
+            position = {f: i for i, f in enumerate(header)}
+            self._fieldnames = self._projection
+            columns = [position.get(f, self._width) for f in self._fieldnames]
+            if len(columns) == 1:
+                column = columns[0]
+                self._select = lambda row: (row[column],)
+            elif columns:
+                self._select = itemgetter(*columns)
+            else:
+                self._select = lambda row: ()
+
+        self._columns = columns
+
+        # Converters for the columns that are returned
+        self._converters = []
+        converted = set()
+        for i, f in zip(columns, self._fieldnames):
+            if i == self._width or i in converted:
+                continue
+            convert = _field_converter(self.schema, f, base=self.base, validate=self.validate)
+            if convert is not None:
+                self._converters.append((i, f, convert))
+                converted.add(i)
+
+        # Row constructor
+        self._make_row = _row_constructor(self.rows, self._fieldnames)
+
+    def _open(self):
+        """
+        Prepare the reader of the rows following the header
+
+        Returns:
+          list: field names of the header.
+        """
+        self._csv_reader = self.dict_reader.reader
+        return self.dict_reader.fieldnames or []
 
     def close(self):
         """
@@ -132,6 +701,175 @@ class RearrangementReader:
         return self.__next__()
 
 
+class MmapRearrangementReader(RearrangementReader):
+    """
+    Iterator for reading Rearrangement objects from a memory-mapped uncompressed TSV file
+
+    Rows are split on tabs and newlines directly from the mapped file, and only the
+    columns of the returned fields are decoded. Lines containing quotes are parsed
+    with the csv module, as by RearrangementReader.
+
+    Attributes:
+      fields (list): field names in the input Rearrangement file.
+      external_fields (list): list of fields in the input file that are not
+                              part of the Rearrangement definition.
+    """
+    @property
+    def fields(self):
+        """
+        Get list of fields
+
+        Returns:
+          list : field names.
+        """
+        return self._header
+
+    @property
+    def external_fields(self):
+        """
+        Get list of field that are not in the Rearrangement schema
+
+        Returns:
+          list : field names.
+        """
+        return [f for f in self._header if f not in self.schema.properties]
+
+    def __init__(self, handle, base=1, validate=False, debug=False, rows='dict', fields=None):
+        """
+        Initialization
+
+        Arguments:
+          handle (file): binary file handle of the open Rearrangement file.
+          base (int): one of 0 or 1 specifying the coordinate schema in the input file.
+                      See RearrangementReader for details.
+          validate (bool): perform validation. If True then basic validation will be
+                           performed will reading the data. A ValidationError exception
+                           will be raised if an error is found.
+          debug (bool): debug state. If True prints debug information.
+          rows (str): type of the returned rows. One of 'dict', 'tuple' or 'record'.
+                      See RearrangementReader for details.
+          fields (list): fields to return. If None, then all fields in the file are returned.
+                         See RearrangementReader for details.
+
+        Returns:
+          airr.io.MmapRearrangementReader: reader object.
+        """
+        if rows not in ('dict', 'tuple', 'record'):
+            raise ValueError('rows must be one of "dict", "tuple" or "record"')
+
+        # arguments
+        self.handle = handle
+        self.base = base
+        self.debug = debug
+        self.validate = validate
+        self.rows = rows
+        self.schema = RearrangementSchema
+        self._projection = list(fields) if fields is not None else None
+        self._converters = None
+
+        # map file, empty files cannot be mapped
+        if os.fstat(handle.fileno()).st_size > 0:
+            self._buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._buffer = None
+
+        # collect field names, skipping blank lines
+        self._lines = iter(self._buffer.readline, b'') if self._buffer is not None else iter(())
+        self._header = None
+        for line in self._lines:
+            line = line.rstrip(b'\r\n')
+            if line:
+                self._header = self._split(line.decode('utf-8'))
+                break
+
+    @staticmethod
+    def _split(text):
+        """
+        Split a line into columns
+
+        Arguments:
+          text (str): line without the line terminator.
+
+        Returns:
+          list: column values.
+        """
+        if '"' in text:
+            return next(csv.reader([text], dialect='excel-tab'))
+        return text.split('\t')
+
+    def _open(self):
+        """
+        Prepare the decoding of the columns of the returned fields
+
+        Returns:
+          list: field names of the header.
+        """
+        header = self._header or []
+        if self._projection is None:
+            self._decode = None
+        else:
+            position = {f: i for i, f in enumerate(header)}
+            self._decode = sorted({position[f] for f in self._projection if f in position})
+        return header
+
+    def _read_columns(self, size):
+        """
+        Read the next rows split into columns
+
+        Arguments:
+          size (int): maximum number of rows.
+
+        Returns:
+          tuple: number of rows read and list of the values of each column, as returned
+                 by RearrangementReader._read_columns.
+        """
+        lines = list(islice(self._lines, size))
+        columns = self._split_block(b''.join(lines), lines, b'\t')
+        if columns is not None:
+            return len(lines), columns
+
+        rows = []
+        for line in lines:
+            line = line.rstrip(b'\r\n')
+            if line:
+                rows.append(self._split(line.decode('utf-8')))
+        rows.extend(islice(iter(self._next_row, None), size - len(rows)))
+
+        return self._transpose(rows)
+
+    def _next_row(self):
+        """
+        Read the next row
+
+        Returns:
+          list: column values of the row.
+        """
+        line = next(self._lines).rstrip(b'\r\n')
+        # skip blank lines, as csv.DictReader does
+        while not line:
+            line = next(self._lines).rstrip(b'\r\n')
+
+        if self._decode is None or b'"' in line:
+            row = self._split(line.decode('utf-8'))
+        else:
+            # Columns of fields that are not returned are left undecoded
+            row = line.split(b'\t')
+            n = len(row)
+            for i in self._decode:
+                if i < n:
+                    row[i] = row[i].decode('utf-8')
+
+        return row
+
+    def close(self):
+        """
+        Closes the Rearrangement file
+        """
+        if self._buffer is not None:
+            self._buffer.close()
+        self.handle.close()
+
+
 class RearrangementWriter:
     """
     Writer class for Rearrangement objects in TSV format
@@ -185,23 +923,20 @@ class RearrangementWriter:
         self.schema = RearrangementSchema
 
         # order fields according to spec
-        field_names = list(self.schema.required)
-        if fields is not None:
-            additional_fields = []
-            for f in fields:
-                if f in self.schema.required:
-                    continue
-                elif f in self.schema.optional:
-                    field_names.append(f)
-                else:
-                    additional_fields.append(f)
-            field_names.extend(additional_fields)
+        field_names = _output_fields(self.schema, fields)
 
         # open writer and write header
         self.dict_writer = csv.DictWriter(self.handle, fieldnames=field_names, dialect='excel-tab',
                                           extrasaction='ignore', lineterminator='\n')
         self.dict_writer.writeheader()
 
+        # Output conversions for the fields that require them
+        self._formatters = []
+        for i, f in enumerate(field_names):
+            convert = _field_formatter(self.schema, f, base=self.base)
+            if convert is not None:
+                self._formatters.append((i, convert))
+
     def close(self):
         """
         Closes the Rearrangement file
@@ -215,26 +950,479 @@ class RearrangementWriter:
         Arguments:
             row (dict): row to write.
         """
+        self.dict_writer.writer.writerow(self._values(row))
+
+    def writerows(self, rows, buffer_size=10000):
+        """
+        Write multiple rows to the Rearrangement file
+
+        Arguments:
+            rows (iterable): rows to write, as dictionaries.
+            buffer_size (int): number of rows serialized before each write to the file.
+        """
+        rows = iter(rows)
+        while True:
+            values = [self._values(r) for r in islice(rows, buffer_size)]
+            if not values:
+                break
+            self._write_buffered(values)
+
+    def write_batch(self, columns):
+        """
+        Write a batch of records given as columns to the Rearrangement file
+
+        Arguments:
+            columns (dict): dictionary of field names and column values, such as the
+                            batches returned by RearrangementReader.iter_batches. Columns
+                            must be of the same length. Fields missing from the dictionary are
+                            written as empty values, as are None values, masked values and NaN
+                            values in numpy float arrays.
+        """
+        size = None
+        values = []
+        for f in self.dict_writer.fieldnames:
+            column = columns.get(f)
+            if column is not None:
+                # numpy arrays are converted to python types, with masked and NaN values as None
+                if hasattr(column, 'tolist'):
+                    nan = getattr(column, 'dtype', None) is not None and column.dtype.kind == 'f'
+                    column = column.tolist()
+                    if nan:
+                        column = [None if x != x else x for x in column]
+                if size is None:
+                    size = len(column)
+                elif len(column) != size:
+                    raise ValueError('columns must be of the same length')
+            values.append(column)
+
+        if size is None:
+            return
+        values = [[''] * size if c is None else c for c in values]
+
+        # Convert types and adjust coordinates
+        for i, convert in self._formatters:
+            values[i] = [convert(x) for x in values[i]]
+
+        if self.debug:
+            for i, f in enumerate(self.dict_writer.fieldnames):
+                if f in self.schema.required and any(x is None or x == '' for x in values[i]):
+                    sys.stderr.write('Warning: Batch has records missing AIRR required field (' + f + ').\n')
+
+        self._write_buffered(zip(*values))
+
+    def _values(self, row):
+        """
+        Convert a row to the list of output values
+
+        Arguments:
+            row (dict): row to convert.
+
+        Returns:
+          list: values in the order of the fields.
+        """
         # validate row
         if self.debug:
             for field in self.schema.required:
                 if row.get(field, None) is None:
                     sys.stderr.write('Warning: Record is missing AIRR required field (' + field + ').\n')
 
-        entry = row.copy()
-        for f in entry.keys():
-            # Adjust coordinates
-            if f.endswith('_start') and self.base == 1:
-                try:
-                    entry[f] = self.schema.to_int(entry[f]) + 1
-                except TypeError:
-                    entry[f] = None
+        get = row.get
+        values = [get(f, '') for f in self.dict_writer.fieldnames]
+        for i, convert in self._formatters:
+            values[i] = convert(values[i])
+
+        return values
+
+    def _write_buffered(self, values):
+        """
+        Serialize rows of values and write them to the file in a single call
+
+        Arguments:
+            values (list): lists of values in the order of the fields.
+        """
+        buffer = StringIO()
+        csv.writer(buffer, dialect='excel-tab', lineterminator='\n').writerows(values)
+        self.handle.write(buffer.getvalue())
+
+
+def _import_pyarrow(format):
+    """
+    Import pyarrow and the module for a file format
+
+    Arguments:
+      format (str): one of 'parquet' or 'feather'.
+
+    Returns:
+      module: the pyarrow module.
+    """
+    if format not in ('parquet', 'feather'):
+        raise ValueError('format must be one of "parquet" or "feather"')
+
+    try:
+        import pyarrow
+        if format == 'parquet':
+            import pyarrow.parquet
+        else:
+            import pyarrow.ipc
+    except ImportError:
+        raise ImportError('The pyarrow package is required to use %s files' % format)
+
+    return pyarrow
+
+
+class ArrowRearrangementReader:
+    """
+    Iterator for reading Rearrangement objects in Parquet or Arrow IPC (Feather) format
+
+    Coordinates are stored in the same schema as in TSV files and records are returned
+    as by RearrangementReader.
+
+    Attributes:
+      fields (list): field names in the input Rearrangement file.
+      external_fields (list): list of fields in the input file that are not
+                              part of the Rearrangement definition.
+    """
+    @property
+    def fields(self):
+        """
+        Get list of fields
+
+        Returns:
+          list : field names.
+        """
+        return self._arrow_schema.names
+
+    @property
+    def external_fields(self):
+        """
+        Get list of field that are not in the Rearrangement schema
+
+        Returns:
+          list : field names.
+        """
+        return [f for f in self.fields if f not in self.schema.properties]
+
+    def __init__(self, handle, format='parquet', base=1, validate=False, debug=False, rows='dict',
+                 fields=None, batch_size=65536):
+        """
+        Initialization
+
+        Arguments:
+          handle (file): binary file handle of the open Rearrangement file.
+          format (str): one of 'parquet' or 'feather' specifying the file format.
+          base (int): one of 0 or 1 specifying the coordinate schema in the input file.
+                      If 1, then the file is assumed to contain 1-based closed intervals
+                      that will be converted to python style 0-based half-open intervals
+                      for known fields. If 0, then values will be unchanged.
+          validate (bool): perform validation. If True then basic validation will be
+                           performed will reading the data. A ValidationError exception
+                           will be raised if an error is found.
+          debug (bool): debug state. If True prints debug information.
+          rows (str): type of the returned rows. One of 'dict', 'tuple' or 'record'.
+                      See RearrangementReader for details.
+          fields (list): fields to return. If None, then all fields in the file are returned.
+                         See RearrangementReader for details.
+          batch_size (int): number of records read from the file at a time.
+
+        Returns:
+          airr.io.ArrowRearrangementReader: reader object.
+        """
+        if rows not in ('dict', 'tuple', 'record'):
+            raise ValueError('rows must be one of "dict", "tuple" or "record"')
+        pa = _import_pyarrow(format)
+
+        # arguments
+        self.handle = handle
+        self.format = format
+        self.base = base
+        self.debug = debug
+        self.validate = validate
+        self.rows = rows
+        self.batch_size = batch_size
+        self.schema = RearrangementSchema
+        self._projection = list(fields) if fields is not None else None
+
+        # open file and collect field names
+        if format == 'parquet':
+            self._file = pa.parquet.ParquetFile(handle)
+            self._arrow_schema = self._file.schema_arrow
+        else:
+            self._file = pa.ipc.open_file(handle)
+            self._arrow_schema = self._file.schema
+        self._types = self.schema.arrow_types()
+        self._rows = None
+
+    def __iter__(self):
+        """
+        Iterator initializer
+
+        Returns:
+          airr.io.ArrowRearrangementReader
+        """
+        # Validate fields
+        if (self.validate):
+            self.schema.validate_header(self.fields)
+
+        if self._rows is None:
+            self._rows = self._iter_rows()
+        return self
+
+    def __next__(self):
+        """
+        Next method
+
+        Returns:
+          dict: parsed Rearrangement data. A tuple or airr.io.RearrangementRecord is
+                returned instead if the reader was created with rows='tuple' or rows='record'.
+        """
+        if self._rows is None:
+            self._rows = self._iter_rows()
+
+        return next(self._rows)
+
+    def _iter_rows(self):
+        """
+        Generator converting record batches to rows
+        """
+        fieldnames = self.fields if self._projection is None else self._projection
+        make_row = _row_constructor(self.rows, fieldnames)
+
+        # Only read requested columns
+        columns = None
+        if self._projection is not None:
+            columns = [f for f in dict.fromkeys(self._projection) if f in self.fields]
+
+        if self.format == 'parquet':
+            batches = self._file.iter_batches(batch_size=self.batch_size, columns=columns)
+        else:
+            batches = (self._file.get_batch(i) for i in range(self._file.num_record_batches))
+            if columns is not None:
+                batches = (b.select(columns) for b in batches)
+
+        for batch in batches:
+            values = [self._column(batch, f) for f in fieldnames]
+            for row in zip(*values):
+                yield make_row(row)
+
+    def _column(self, batch, field):
+        """
+        Convert a column of a record batch
+
+        Arguments:
+          batch (pyarrow.RecordBatch): record batch.
+          field (str): field name.
+
+        Returns:
+          list: converted values.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        index = batch.schema.get_field_index(field)
+        if index < 0:
+            return [None] * batch.num_rows
+        column = batch.column(index)
+
+        # Columns of the schema type are converted directly
+        spec = self.schema.type(field)
+        shift = field.endswith('_start') and self.base == 1
+        if column.type.equals(self._types.get(field, pa.utf8())):
+            if spec == 'integer' and shift:
+                return pc.subtract(column, 1).to_pylist()
+            elif spec in ('integer', 'number', 'boolean'):
+                return column.to_pylist()
+            elif not shift:
+                return pc.fill_null(column, '').to_pylist()
+
+        # Other columns are converted from their string representation as for TSV files
+        convert = _field_converter(self.schema, field, base=self.base, validate=self.validate)
+        values = ['' if x is None else str(x) for x in column.to_pylist()]
+        if convert is None:
+            return values
+        try:
+            return [convert(x) for x in values]
+        except ValidationError as e:
+            raise ValidationError('field %s has %s' % (field, e))
+
+    def close(self):
+        """
+        Closes the Rearrangement file
+        """
+        self.handle.close()
+
+    def next(self):
+        """
+        Next method
+        """
+        return self.__next__()
+
+
+def _arrow_formatter(schema, field, base=1):
+    """
+    Build the function converting a field value for Parquet or Arrow IPC output
+
+    Arguments:
+      schema (airr.schema.Schema): schema defining the field types.
+      field (str): field name.
+      base (int): coordinate schema of the output. If 1, then coordinate fields
+                  are shifted from python style 0-based half-open intervals.
+
+    Returns:
+      function: converter taking a value and returning the typed value to write.
+    """
+    spec = schema.type(field)
+    shift = field.endswith('_start') and base == 1
+    offset = 1 if shift else 0
+
+    if spec == 'integer':
+        def convert(value):
+            value = schema.to_int(value)
+            return None if value is None else value + offset
+    elif spec == 'number':
+        def convert(value):
+            value = schema.to_float(value)
+            return None if value is None or value != value else value
+    elif spec == 'boolean':
+        convert = schema.to_bool
+    elif shift:
+        # Coordinates are shifted as integers, as by RearrangementWriter
+        def convert(value):
+            try:
+                return str(schema.to_int(value) + 1)
+            except TypeError:
+                return None
+    else:
+        def convert(value):
+            if value is None or value.__class__ is str:
+                return value
+            return None if value != value else str(value)
+
+    return convert
+
+
+class ArrowRearrangementWriter:
+    """
+    Writer class for Rearrangement objects in Parquet or Arrow IPC (Feather) format
+
+    Column types are defined by the Rearrangement schema, with fields undefined by the
+    schema written as strings.
+
+    Attributes:
+      fields (list): field names in the output Rearrangement file.
+      external_fields (list): list of fields in the output file that are not
+                              part of the Rearrangement definition.
+    """
+    @property
+    def fields(self):
+        """
+        Get list of fields
+
+        Returns:
+          list : field names.
+        """
+        return self._fieldnames
+
+    @property
+    def external_fields(self):
+        """
+        Get list of field that are not in the Rearrangements schema
+
+        Returns:
+          list : field names.
+        """
+        return [f for f in self._fieldnames if f not in self.schema.properties]
+
+    def __init__(self, handle, fields=None, base=1, debug=False, format='parquet', buffer_size=65536):
+        """
+        Initialization
+
+        Arguments:
+          handle (file): binary file handle of the open Rearrangements file.
+          fields (list) : list of non-required fields to add. May include fields undefined by the schema.
+          base (int): one of 0 or 1 specifying the coordinate schema in the output file.
+                      Data provided to the write is assumed to be in python style 0-based
+                      half-open intervals. If 1, then data will be converted to 1-based
+                      closed intervals for known fields before writing. If 0, then values will be unchanged.
+          debug (bool): debug state. If True prints debug information.
+          format (str): one of 'parquet' or 'feather' specifying the file format.
+          buffer_size (int): number of records written to the file at a time.
+
+        Returns:
+          airr.io.ArrowRearrangementWriter: writer object.
+        """
+        pa = _import_pyarrow(format)
+
+        # arguments
+        self.handle = handle
+        self.base = base
+        self.debug = debug
+        self.format = format
+        self.buffer_size = buffer_size
+        self.schema = RearrangementSchema
+
+        # order fields according to spec and define column types
+        self._fieldnames = _output_fields(self.schema, fields)
+        types = self.schema.arrow_types()
+        self._arrow_schema = pa.schema([pa.field(f, types.get(f, pa.utf8())) for f in self._fieldnames])
+        self._converters = [_arrow_formatter(self.schema, f, base=self.base) for f in self._fieldnames]
+        self._columns = [[] for __ in self._fieldnames]
+
+        # open writer
+        if format == 'parquet':
+            self._writer = pa.parquet.ParquetWriter(handle, self._arrow_schema)
+        else:
+            self._writer = pa.ipc.new_file(handle, self._arrow_schema)
+
+    def close(self):
+        """
+        Writes buffered records and closes the Rearrangement file
+        """
+        self.flush()
+        self._writer.close()
+        self.handle.close()
+
+    def write(self, row):
+        """
+        Write a row to the Rearrangement file
+
+        Arguments:
+            row (dict): row to write.
+        """
+        # validate row
+        if self.debug:
+            for field in self.schema.required:
+                if row.get(field, None) is None:
+                    sys.stderr.write('Warning: Record is missing AIRR required field (' + field + ').\n')
+
+        get = row.get
+        for f, column, convert in zip(self._fieldnames, self._columns, self._converters):
+            column.append(convert(get(f)))
+
+        if len(self._columns[0]) >= self.buffer_size:
+            self.flush()
+
+    def writerows(self, rows):
+        """
+        Write multiple rows to the Rearrangement file
+
+        Arguments:
+            rows (iterable): rows to write, as dictionaries.
+        """
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """
+        Write buffered records to the Rearrangement file
+        """
+        import pyarrow as pa
 
-            # Convert types
-            spec = self.schema.type(f)
-            if spec == 'boolean':  entry[f] = self.schema.from_bool(entry[f])
+        if not self._columns[0]:
+            return
 
-        self.dict_writer.writerow(entry)
+        arrays = [pa.array(c, type=f.type) for c, f in zip(self._columns, self._arrow_schema)]
+        self._writer.write_batch(pa.record_batch(arrays, schema=self._arrow_schema))
+        self._columns = [[] for __ in self._fieldnames]
 
 
 # TODO: pandas validation need if we load with pandas directly
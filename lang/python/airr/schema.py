@@ -4,14 +4,14 @@ AIRR Data Representation Schema
 
 # Imports
 import sys
-import yaml
-import yamlordereddictloader
 from collections import OrderedDict
+from collections.abc import MutableMapping
 import importlib.resources
+from airr.specs.cache import CACHE_FILE, SPEC_FILE, load_spec
 
-# For Python 3.9+
-with importlib.resources.files('airr').joinpath('specs/airr-schema.yaml').open('rb') as f:
-    DEFAULT_SPEC = yaml.load(f, Loader=yamlordereddictloader.Loader)
+# For Python 3.9+, the pickled specification is used unless the YAML specification changed
+_specs = importlib.resources.files('airr').joinpath('specs')
+DEFAULT_SPEC = load_spec(_specs.joinpath(SPEC_FILE), _specs.joinpath(CACHE_FILE))
 
 class ValidationError(Exception):
     """
@@ -20,6 +20,69 @@ class ValidationError(Exception):
     pass
 
 
+# Accepted python types of the basic field types
+_BASIC_TYPES = {'string': str, 'boolean': bool, 'integer': int, 'number': (float, int)}
+
+
+def _full_field(context, f):
+    """
+    Name of a field within the object hierarchy
+
+    Arguments:
+      context (str): name of the enclosing field, or None for top-level objects.
+      f (str): field name.
+
+    Returns:
+      str: field name prefixed with the context.
+    """
+    return f if context is None else context + '.' + f
+
+
+# Resolved schema objects of definition names
+_schema_registry = {}
+
+# Schema objects of inline object definitions, keyed by the id of the definition with a reference
+# to the definition keeping the id valid
+_inline_registry = {}
+
+
+def get_schema(definition):
+    """
+    Get the schema object of a definition
+
+    Schema objects are resolved once per process and shared by all callers, which must not
+    modify them.
+
+    Arguments:
+      definition (string): the schema definition name.
+
+    Returns:
+      airr.schema.Schema : schema object.
+    """
+    schema = _schema_registry.get(definition)
+    if schema is None:
+        schema = Schema(definition)
+        _schema_registry[definition] = schema
+    return schema
+
+
+def _inline_schema(definition):
+    """
+    Get the schema object of an inline object definition
+
+    Arguments:
+      definition (dict): object definition with a properties entry.
+
+    Returns:
+      airr.schema.Schema : schema object.
+    """
+    entry = _inline_registry.get(id(definition))
+    if entry is None:
+        entry = (definition, Schema({'properties': definition.get('properties')}))
+        _inline_registry[id(definition)] = entry
+    return entry[1]
+
+
 class Schema:
     """
     AIRR schema definitions
@@ -91,8 +154,7 @@ class Schema:
             for s in self.definition['allOf']:
                 if s.get('$ref') is not None:
                     schema_name = s['$ref'].split('/')[-1]
-                    # cannot use cache here
-                    schema = Schema(schema_name)
+                    schema = get_schema(schema_name)
                     # no nested allOf ...
                     self.properties.update(schema.properties)
                     self.required.extend(schema.required)
@@ -105,6 +167,9 @@ class Schema:
 
         self.optional = [f for f in self.properties if f not in self.required]
 
+        # Compiled validator, built on first use
+        self._validator = None
+
     def spec(self, field):
         """
         Get the properties for a field
@@ -151,6 +216,30 @@ class Schema:
 
         return type_mapping
 
+    def arrow_types(self):
+        """
+        Map of schema types to Apache Arrow types
+
+        Requires the pyarrow package. Fields without a basic type are mapped to strings.
+
+        Returns:
+          dict: mapping dictionary for pyarrow types
+        """
+        import pyarrow as pa
+
+        type_mapping = {}
+        for property in self.properties:
+            if self.type(property) == 'boolean':
+                type_mapping[property] = pa.bool_()
+            elif self.type(property) == 'integer':
+                type_mapping[property] = pa.int64()
+            elif self.type(property) == 'number':
+                type_mapping[property] = pa.float64()
+            else:
+                type_mapping[property] = pa.utf8()
+
+        return type_mapping
+
     def to_bool(self, value, validate=False):
         """
         Convert a string to a boolean
@@ -398,11 +487,7 @@ class Schema:
             if field_type is None:
                 # for referenced object, recursively call validate with object and schema
                 if spec.get('$ref') is not None:
-                    schema_name = spec['$ref'].split('/')[-1]
-                    if AIRRSchema.get(schema_name):
-                        schema = AIRRSchema[schema_name]
-                    else:
-                        schema = Schema(schema_name)
+                    schema = get_schema(spec['$ref'].split('/')[-1])
                     schema.validate_object(obj[f], missing, nonairr, full_field, check_nullable)
                 else:
                     raise ValidationError('Internal error: field "%s" in schema not handled by validation. File a bug report.' % full_field)
@@ -413,17 +498,12 @@ class Schema:
                 # for array, check each object in it
                 for row in obj[f]:
                     if spec['items'].get('$ref') is not None:
-                        schema_name = spec['items']['$ref'].split('/')[-1]
-                        schema = Schema(schema_name)
+                        schema = get_schema(spec['items']['$ref'].split('/')[-1])
                         schema.validate_object(row, missing, nonairr, full_field, check_nullable)
                     elif spec['items'].get('allOf') is not None:
                         for s in spec['items']['allOf']:
                             if s.get('$ref') is not None:
-                                schema_name = s['$ref'].split('/')[-1]
-                                if AIRRSchema.get(schema_name):
-                                    schema = AIRRSchema[schema_name]
-                                else:
-                                    schema = Schema(schema_name)
+                                schema = get_schema(s['$ref'].split('/')[-1])
                                 schema.validate_object(row, missing, False, full_field, check_nullable)
                     elif spec['items'].get('enum') is not None:
                         if row not in spec['items']['enum']:
@@ -441,7 +521,7 @@ class Schema:
                         if not isinstance(row, float) and not isinstance(row, int):
                             raise ValidationError('array field "%s" does not have number type: %s' % (full_field, row))
                     elif spec['items'].get('type') == 'object':
-                        sub_schema = Schema({'properties': spec['items'].get('properties')})
+                        sub_schema = _inline_schema(spec['items'])
                         sub_schema.validate_object(row, missing, nonairr, context, check_nullable)
                     else:
                         raise ValidationError('Internal error: array field "%s" in schema not handled by validation. File a bug report.' % full_field)
@@ -477,6 +557,230 @@ class Schema:
 
         return True
 
+    def compile(self):
+        """
+        Compile the schema definition into a validation function
+
+        The definition is translated once into a tree of validation functions for each field,
+        including referenced and inline object definitions, with deprecated fields removed and
+        enumerations converted to sets. The compiled function accepts the same arguments as
+        validate_object and reports the same warnings and errors.
+
+        Returns:
+          function: validation function of an object, returning True if a ValidationError exception
+                    is not raised.
+        """
+        if self._validator is not None:
+            return self._validator
+
+        # Recursive references call the validator once it is compiled
+        self._validator = lambda *args, **kwargs: validator(*args, **kwargs)
+
+        known = frozenset(f for f, spec in self.properties.items() if spec is not None)
+        checks = []
+        for f, spec in self.properties.items():
+            xairr = spec.get('x-airr')
+            if xairr and xairr.get('deprecated'):
+                continue
+            checks.append(self._compile_field(f, spec, xairr))
+        checks = tuple(checks)
+
+        def validator(obj, missing=True, nonairr=True, context=None, check_nullable=True):
+            # object has to be a dictionary
+            if not hasattr(obj, 'items'):
+                if context is None:
+                    raise ValidationError('object is not a dictionary')
+                else:
+                    raise ValidationError('field "%s" is not a dictionary object' % context)
+
+            # first warn about non-AIRR fields
+            if nonairr:
+                for f in obj:
+                    if f not in known:
+                        full_field = f if context is None else context + '.' + f
+                        sys.stderr.write('Warning: Object has non-AIRR field that cannot be validated (' + full_field + ').\n')
+
+            for check in checks:
+                check(obj, missing, nonairr, context, check_nullable)
+
+            return True
+
+        self._validator = validator
+        return validator
+
+    def _compile_field(self, f, spec, xairr):
+        """
+        Compile the validation of a field
+
+        Arguments:
+          f (str): field name.
+          spec (dict): field definition.
+          xairr (dict): x-airr properties of the field.
+
+        Returns:
+          function: validation function of the field of an object.
+        """
+        miairr = bool(xairr) and xairr.get('miairr') == ""
+        required = f in self.required
+        identifier = bool(xairr) and bool(xairr.get('identifier'))
+        identifier_nullable = identifier and bool(xairr.get('nullable'))
+        nullable = not xairr or bool(xairr.get('nullable')) or xairr.get('nullable', 'missing') == 'missing'
+        check_value = self._compile_value(f, spec)
+
+        def check(obj, missing, nonairr, context, check_nullable):
+            value = obj.get(f)
+            if value is not None:
+                check_value(value, missing, nonairr, context, check_nullable)
+                return
+
+            if obj.get(f, 'missing') == 'missing':
+                # check MiAIRR keys exist
+                if check_nullable and miairr:
+                    raise ValidationError('MiAIRR field "%s" is missing' % _full_field(context, f))
+
+                # check if required field
+                if check_nullable and required:
+                    raise ValidationError('Required field "%s" is missing' % _full_field(context, f))
+
+                # check if identifier field
+                if identifier:
+                    if identifier_nullable:
+                        sys.stderr.write('Warning: Nullable identifier field "%s" is missing.\n' % _full_field(context, f))
+                    else:
+                        raise ValidationError('Not-nullable identifier field "%s" is missing' % _full_field(context, f))
+
+            # check nullable requirements
+            if check_nullable and not nullable:
+                raise ValidationError('Non-nullable field "%s" is null or missing' % _full_field(context, f))
+
+        return check
+
+    def _compile_value(self, f, spec):
+        """
+        Compile the type validation of a field value
+
+        Arguments:
+          f (str): field name.
+          spec (dict): field definition.
+
+        Returns:
+          function: validation function of a value that is not None.
+        """
+        field_type = spec.get('type', None) if spec else None
+
+        def internal_error(value, missing, nonairr, context, check_nullable):
+            raise ValidationError('Internal error: field "%s" in schema not handled by validation. File a bug report.'
+                                  % _full_field(context, f))
+
+        if field_type is None:
+            # for referenced object, recursively validate with the object schema
+            if spec.get('$ref') is None:
+                return internal_error
+            ref = get_schema(spec['$ref'].split('/')[-1]).compile()
+
+            def check(value, missing, nonairr, context, check_nullable):
+                ref(value, missing, nonairr, _full_field(context, f), check_nullable)
+
+            return check
+        elif field_type == 'array':
+            check_items = self._compile_items(f, spec['items'])
+
+            def check(value, missing, nonairr, context, check_nullable):
+                if not isinstance(value, list):
+                    raise ValidationError('field "%s" is not an array' % _full_field(context, f))
+                if value:
+                    check_items(value, missing, nonairr, context, check_nullable)
+
+            return check
+        elif field_type == 'object':
+            # right now all arrays of objects use $ref
+            return internal_error
+
+        # basic types
+        types = _BASIC_TYPES.get(field_type)
+        if types is None:
+            def check(value, missing, nonairr, context, check_nullable):
+                raise ValidationError('Internal error: Field "%s" with type %s in schema not handled by validation. File a bug report.'
+                                      % (_full_field(context, f), field_type))
+            return check
+
+        enums = spec.get('enum')
+        enum_set = frozenset(enums) if enums is not None else None
+
+        def check(value, missing, nonairr, context, check_nullable):
+            if not isinstance(value, types):
+                raise ValidationError('Field "%s" does not have %s type: %s' % (_full_field(context, f), field_type, value))
+            if enum_set is not None and value not in enum_set:
+                raise ValidationError('field "%s" has value "%s" not among possible enumeration values %s'
+                                      % (_full_field(context, f), value, enums))
+
+        return check
+
+    def _compile_items(self, f, items):
+        """
+        Compile the validation of the items of an array field
+
+        Arguments:
+          f (str): field name.
+          items (dict): definition of the array items.
+
+        Returns:
+          function: validation function of a non-empty list.
+        """
+        if items.get('$ref') is not None:
+            ref = get_schema(items['$ref'].split('/')[-1]).compile()
+
+            def check(rows, missing, nonairr, context, check_nullable):
+                full_field = _full_field(context, f)
+                for row in rows:
+                    ref(row, missing, nonairr, full_field, check_nullable)
+        elif items.get('allOf') is not None:
+            refs = tuple(get_schema(s['$ref'].split('/')[-1]).compile()
+                         for s in items['allOf'] if s.get('$ref') is not None)
+
+            def check(rows, missing, nonairr, context, check_nullable):
+                full_field = _full_field(context, f)
+                for row in rows:
+                    for ref in refs:
+                        ref(row, missing, False, full_field, check_nullable)
+        elif items.get('enum') is not None:
+            enums = items['enum']
+            try:
+                enum_set = frozenset(enums)
+            except TypeError:
+                enum_set = None
+
+            def check(rows, missing, nonairr, context, check_nullable):
+                for row in rows:
+                    try:
+                        found = row in enum_set if enum_set is not None else row in enums
+                    except TypeError:
+                        found = row in enums
+                    if not found:
+                        raise ValidationError('field "%s" has value "%s" not among possible enumeration values'
+                                              % (_full_field(context, f), row))
+        elif items.get('type') in _BASIC_TYPES:
+            item_type = items['type']
+            types = _BASIC_TYPES[item_type]
+
+            def check(rows, missing, nonairr, context, check_nullable):
+                for row in rows:
+                    if not isinstance(row, types):
+                        raise ValidationError('array field "%s" does not have %s type: %s'
+                                              % (_full_field(context, f), item_type, row))
+        elif items.get('type') == 'object':
+            sub = _inline_schema(items).compile()
+
+            def check(rows, missing, nonairr, context, check_nullable):
+                for row in rows:
+                    sub(row, missing, nonairr, context, check_nullable)
+        else:
+            def check(rows, missing, nonairr, context, check_nullable):
+                raise ValidationError('Internal error: array field "%s" in schema not handled by validation. File a bug report.'
+                                      % _full_field(context, f))
+
+        return check
+
     def template(self):
         """
         Create an empty template object
@@ -489,8 +793,7 @@ class Schema:
 
         # Fetch schema template definition for a $ref string
         def _reference(ref):
-            x = ref.split('/')[-1]
-            schema = AIRRSchema.get(x, Schema(x))
+            schema = get_schema(ref.split('/')[-1])
             return(schema.template())
 
         # Get default value
@@ -526,35 +829,77 @@ class Schema:
         return(object)
 
 
-# Preloaded schema
-AIRRSchema = {
-    'Info': Schema('InfoObject'),
-    'DataFile': Schema('DataFile'),
-    'Rearrangement': Schema('Rearrangement'),
-    'Repertoire': Schema('Repertoire'),
-    'RepertoireGroup': Schema('RepertoireGroup'),
-    'Ontology': Schema('Ontology'),
-    'Study': Schema('Study'),
-    'Subject': Schema('Subject'),
-    'Diagnosis': Schema('Diagnosis'),
-    'SampleProcessing': Schema('SampleProcessing'),
-    'CellProcessing': Schema('CellProcessing'),
-    'PCRTarget': Schema('PCRTarget'),
-    'NucleicAcidProcessing': Schema('NucleicAcidProcessing'),
-    'SequencingRun': Schema('SequencingRun'),
-    'SequencingData': Schema('SequencingData'),
-    'DataProcessing': Schema('DataProcessing'),
-    'GermlineSet': Schema('GermlineSet'),
-    'Contributor': Schema('Contributor'),
-    'RearrangedSequence': Schema('RearrangedSequence'),
-    'UnrearrangedSequence': Schema('UnrearrangedSequence'),
-    'SequenceDelineationV': Schema('SequenceDelineationV'),
-    'AlleleDescription': Schema('AlleleDescription'),
-    'GenotypeSet': Schema('GenotypeSet'),
-    'Genotype': Schema('Genotype'),
-    'Cell': Schema('Cell'),
-    'Clone': Schema('Clone')
-}
+class _SchemaTable(MutableMapping):
+    """
+    Dictionary of schema objects built from their definition on first access
+    """
+    def __init__(self, definitions):
+        """
+        Initialization
+
+        Arguments:
+          definitions (dict): schema definition names keyed by schema name.
+        """
+        self._definitions = dict(definitions)
+        self._schemas = {}
+
+    def __getitem__(self, key):
+        schema = self._schemas.get(key)
+        if schema is None:
+            schema = get_schema(self._definitions[key])
+            self._schemas[key] = schema
+        return schema
+
+    def __setitem__(self, key, schema):
+        self._definitions[key] = None
+        self._schemas[key] = schema
+
+    def __delitem__(self, key):
+        del self._definitions[key]
+        self._schemas.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._definitions
+
+    def __iter__(self):
+        return iter(self._definitions)
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, list(self._definitions))
+
+
+# Schema objects, built on first access
+AIRRSchema = _SchemaTable({
+    'Info': 'InfoObject',
+    'DataFile': 'DataFile',
+    'Rearrangement': 'Rearrangement',
+    'Repertoire': 'Repertoire',
+    'RepertoireGroup': 'RepertoireGroup',
+    'Ontology': 'Ontology',
+    'Study': 'Study',
+    'Subject': 'Subject',
+    'Diagnosis': 'Diagnosis',
+    'SampleProcessing': 'SampleProcessing',
+    'CellProcessing': 'CellProcessing',
+    'PCRTarget': 'PCRTarget',
+    'NucleicAcidProcessing': 'NucleicAcidProcessing',
+    'SequencingRun': 'SequencingRun',
+    'SequencingData': 'SequencingData',
+    'DataProcessing': 'DataProcessing',
+    'GermlineSet': 'GermlineSet',
+    'Contributor': 'Contributor',
+    'RearrangedSequence': 'RearrangedSequence',
+    'UnrearrangedSequence': 'UnrearrangedSequence',
+    'SequenceDelineationV': 'SequenceDelineationV',
+    'AlleleDescription': 'AlleleDescription',
+    'GenotypeSet': 'GenotypeSet',
+    'Genotype': 'Genotype',
+    'Cell': 'Cell',
+    'Clone': 'Clone'
+})
 
 InfoSchema = AIRRSchema['Info']
 DataFileSchema = AIRRSchema['DataFile']
@@ -0,0 +1,74 @@
+"""
+Pickled copy of the AIRR schema specification, loaded instead of parsing the YAML specification
+
+The pickle records the SHA-256 hash of the YAML file it was generated from and is only
+used when the hash matches. Regenerate it after changing the specification with::
+
+    python airr/specs/cache.py
+"""
+import hashlib
+import os
+import pickle
+
+# Specification and cache file names
+SPEC_FILE = 'airr-schema.yaml'
+CACHE_FILE = 'airr-schema.pickle'
+
+
+def _parse(data):
+    """
+    Parse the YAML specification
+
+    Arguments:
+      data (bytes): contents of the YAML file.
+
+    Returns:
+      dict: the specification, with mappings in the order of the file.
+    """
+    import yaml
+    return yaml.load(data, Loader=getattr(yaml, 'CLoader', yaml.Loader))
+
+
+def load_spec(spec_file, cache_file):
+    """
+    Load the specification from the cache, or from the YAML file if the cache is missing or stale
+
+    Arguments:
+      spec_file (importlib.resources.abc.Traversable): path of the YAML specification.
+      cache_file (importlib.resources.abc.Traversable): path of the pickled specification.
+
+    Returns:
+      dict: the specification.
+    """
+    data = spec_file.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        with cache_file.open('rb') as handle:
+            cached = pickle.load(handle)
+        if cached['sha256'] == digest:
+            return cached['spec']
+    except Exception:
+        pass
+
+    return _parse(data)
+
+
+def write_cache(directory=None):
+    """
+    Write the pickled specification of the YAML specification in a directory
+
+    Arguments:
+      directory (str): directory of the specification. Defaults to the directory of this module.
+    """
+    if directory is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(directory, SPEC_FILE), 'rb') as handle:
+        data = handle.read()
+
+    cached = {'sha256': hashlib.sha256(data).hexdigest(), 'spec': _parse(data)}
+    with open(os.path.join(directory, CACHE_FILE), 'wb') as handle:
+        pickle.dump(cached, handle, protocol=4)
+
+
+if __name__ == '__main__':
+    write_cache()
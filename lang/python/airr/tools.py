@@ -27,7 +27,7 @@ from airr import __version__
 import airr.interface
 
 # internal wrapper function before calling merge interface method
-def merge_cmd(out_file, airr_files, drop=False, debug=False):
+def merge_cmd(out_file, airr_files, drop=False, debug=False, workers=1, sort_key=None):
     """
     Merge one or more AIRR rearrangements files
 
@@ -37,20 +37,107 @@ def merge_cmd(out_file, airr_files, drop=False, debug=False):
       drop (bool): drop flag. If True then drop fields that do not exist in all input
                    files, otherwise combine fields from all input files.
       debug (bool): debug flag. If True print debugging information to standard error.
+      workers (int): number of processes used to parse input files.
+      sort_key (list): field names by which the input files are sorted. If specified, the
+                       sorted input files are merged into a sorted output.
 
     Returns:
       bool: True if files were successfully merged, otherwise False.
     """
-    return airr.interface.merge_rearrangement(out_file, airr_files, drop=drop, debug=debug)
+    return airr.interface.merge_rearrangement(out_file, airr_files, drop=drop, debug=debug, workers=workers,
+                                              sort_key=sort_key)
+
+# internal wrapper function before calling read and create interface methods
+def convert_cmd(out_file, airr_file, format=None, debug=False):
+    """
+    Convert an AIRR rearrangements file between the TSV, Parquet and Arrow IPC (Feather) formats
+
+    Arguments:
+      out_file (str): output file name.
+      airr_file (str): input file name.
+      format (str): output file format. One of 'tsv', 'parquet' or 'feather'. If None,
+                    the format is determined from the output file extension.
+      debug (bool): debug flag. If True print debugging information to standard error.
+
+    Returns:
+      bool: True if the file was successfully converted, otherwise False.
+    """
+    reader = None
+    try:
+        reader = airr.interface.read_rearrangement(airr_file, debug=debug)
+        writer = airr.interface.create_rearrangement(out_file, fields=reader.fields, debug=debug,
+                                                     format=format)
+        try:
+            writer.writerows(reader)
+        finally:
+            writer.close()
+    except Exception as e:
+        sys.stderr.write('%s\n' % e)
+        sys.stderr.write('Conversion failed for file: %s\n' % airr_file)
+        return False
+    finally:
+        if reader is not None:
+            reader.close()
+
+    return True
+
+# internal wrapper function before calling sort interface method
+def sort_cmd(out_file, airr_file, keys, memory_limit='1G', compress=False, temp_dir=None, debug=False):
+    """
+    Sort an AIRR rearrangements file
+
+    Arguments:
+      out_file (str): output file name.
+      airr_file (str): input file name.
+      keys (list): field names to sort by.
+      memory_limit (str): approximate memory used for records, as a number of bytes with
+                          an optional K, M or G suffix.
+      compress (bool): if True, compress the temporary files of the sorted runs.
+      temp_dir (str): directory of the temporary files.
+      debug (bool): debug flag. If True print debugging information to standard error.
+
+    Returns:
+      bool: True if the file was successfully sorted, otherwise False.
+    """
+    units = {'K': 2**10, 'M': 2**20, 'G': 2**30}
+    suffix = memory_limit[-1:].upper()
+    if suffix in units:
+        memory_limit = int(float(memory_limit[:-1]) * units[suffix])
+    else:
+        memory_limit = int(memory_limit)
+
+    return airr.interface.sort_rearrangement(airr_file, out_file, keys, memory_limit=memory_limit,
+                                             compress=compress, temp_dir=temp_dir, debug=debug)
+
+# internal wrapper function before calling split interface method
+def split_cmd(airr_file, by, out_dir='.', prefix=None, max_open=256, debug=False):
+    """
+    Split an AIRR rearrangements file into one file per value of one or more fields
+
+    Arguments:
+      airr_file (str): input file name.
+      by (list): field names to split by.
+      out_dir (str): directory of the output files.
+      prefix (str): prefix of the output file names.
+      max_open (int): maximum number of output files open at the same time.
+      debug (bool): debug flag. If True print debugging information to standard error.
+
+    Returns:
+      bool: True if the file was successfully split, otherwise False.
+    """
+    paths = airr.interface.split_rearrangement(airr_file, by, out_dir=out_dir, prefix=prefix,
+                                               max_open=max_open, debug=debug)
+    return paths is not None
 
 # internal wrapper function before calling validate interface method
-def validate_rearrangement_cmd(airr_files, debug=True):
+def validate_rearrangement_cmd(airr_files, debug=True, workers=1):
     """
     Validates one or more AIRR rearrangements files
 
     Arguments:
       airr_files (list): list of input files to validate.
       debug (bool): debug flag. If True print debugging information to standard error.
+      workers (int): number of processes used to validate each file.
 
     Returns:
       boolean: True if all files passed validation, otherwise False
@@ -58,7 +145,7 @@ def validate_rearrangement_cmd(airr_files, debug=True):
     valid = []
     for f in airr_files:
         try:
-            v = airr.interface.validate_rearrangement(f, debug=debug)
+            v = airr.interface.validate_rearrangement(f, debug=debug, workers=workers)
             valid.append(v)
         except Exception as e:
             sys.stderr.write('%s\n' % e)
@@ -176,8 +263,72 @@ def define_args():
                                    with empty strings.''')
     group_merge.add_argument('-a', nargs='+', action='store', dest='airr_files', required=True,
                              help='A list of AIRR rearrangement files.')
+    group_merge.add_argument('-j', '--threads', action='store', dest='workers', type=int, default=1,
+                             help='''Number of processes used to parse input files with different fields.
+                                  Records are written in the order of the input files.''')
+    group_merge.add_argument('--sort-key', nargs='+', action='store', dest='sort_key', default=None,
+                             help='''Fields by which the input files are sorted. If specified, records are
+                                  merged into a single output sorted by these fields, comparing values
+                                  according to their type in the schema.''')
     parser_merge.set_defaults(func=merge_cmd)
 
+    # Subparser to convert files
+    parser_convert = subparsers.add_parser('convert', parents=[common_parser],
+                                           add_help=False,
+                                           help='Convert AIRR rearrangement files between TSV, Parquet and Arrow IPC formats.',
+                                           description='Convert AIRR rearrangement files between TSV, Parquet and Arrow IPC formats.')
+    group_convert = parser_convert.add_argument_group('convert arguments')
+    group_convert.add_argument('-o', action='store', dest='out_file', required=True,
+                               help='''Output file name.''')
+    group_convert.add_argument('-a', action='store', dest='airr_file', required=True,
+                               help='An AIRR rearrangement file.')
+    group_convert.add_argument('--format', action='store', dest='format', default=None,
+                               choices=('tsv', 'parquet', 'feather'),
+                               help='''Output file format. If unspecified, the format is determined
+                                    from the extension of the output file name.''')
+    parser_convert.set_defaults(func=convert_cmd)
+
+    # Subparser to sort files
+    parser_sort = subparsers.add_parser('sort', parents=[common_parser],
+                                        add_help=False,
+                                        help='Sort AIRR rearrangement files.',
+                                        description='Sort AIRR rearrangement files.')
+    group_sort = parser_sort.add_argument_group('sort arguments')
+    group_sort.add_argument('-o', action='store', dest='out_file', required=True,
+                            help='''Output file name.''')
+    group_sort.add_argument('-a', action='store', dest='airr_file', required=True,
+                            help='An AIRR rearrangement file.')
+    group_sort.add_argument('-k', '--keys', nargs='+', action='store', dest='keys', required=True,
+                            help='''Fields to sort by. Values are compared according to their type
+                                 in the schema, with missing values last.''')
+    group_sort.add_argument('--memory', action='store', dest='memory_limit', default='1G',
+                            help='''Approximate memory used for records, with an optional K, M or G
+                                 suffix. Larger files are sorted in runs written to temporary files.''')
+    group_sort.add_argument('--compress', action='store_true', dest='compress',
+                            help='''If specified, compress the temporary files of the sorted runs.''')
+    group_sort.add_argument('--tmpdir', action='store', dest='temp_dir', default=None,
+                            help='''Directory of the temporary files.''')
+    parser_sort.set_defaults(func=sort_cmd)
+
+    # Subparser to split files
+    parser_split = subparsers.add_parser('split', parents=[common_parser],
+                                         add_help=False,
+                                         help='Split AIRR rearrangement files by field values.',
+                                         description='Split AIRR rearrangement files by field values.')
+    group_split = parser_split.add_argument_group('split arguments')
+    group_split.add_argument('-a', action='store', dest='airr_file', required=True,
+                             help='An AIRR rearrangement file.')
+    group_split.add_argument('--by', nargs='+', action='store', dest='by', required=True,
+                             help='''Fields to split by. One file is written for each combination of values.''')
+    group_split.add_argument('--outdir', action='store', dest='out_dir', default='.',
+                             help='''Directory of the output files.''')
+    group_split.add_argument('--prefix', action='store', dest='prefix', default=None,
+                             help='''Prefix of the output file names. Defaults to the input file name
+                                  without extensions followed by an underscore.''')
+    group_split.add_argument('--max-open', action='store', dest='max_open', type=int, default=256,
+                             help='''Maximum number of output files open at the same time.''')
+    parser_split.set_defaults(func=split_cmd)
+
     # Subparser to validate files
     parser_validate = subparsers.add_parser('validate', parents=[common_parser],
                                             add_help=False,
@@ -194,6 +345,9 @@ def define_args():
     group_validate = parser_validate.add_argument_group('validate arguments')
     group_validate.add_argument('-a', nargs='+', action='store', dest='airr_files', required=True,
                                 help='A list of AIRR rearrangement files.')
+    group_validate.add_argument('-j', '--threads', action='store', dest='workers', type=int, default=1,
+                                help='''Number of processes used to validate each file. Uncompressed
+                                     files are split into shards validated in parallel.''')
     parser_validate.set_defaults(func=validate_rearrangement_cmd)
 
     # Subparser to validate AIRR Data Model files
@@ -244,6 +398,6 @@ def main():
     result = args.func(**args_dict)
 
     # set return code to non-zero if error occurred
-    if args.__dict__['command'] == 'validate' or args.__dict__['command'] == 'merge':
+    if args.__dict__['command'] in ('validate', 'merge', 'convert', 'sort', 'split'):
         if not result:
             sys.exit(1)
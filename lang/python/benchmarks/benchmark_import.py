@@ -0,0 +1,67 @@
+"""
+Benchmark of the import time of the airr package
+
+The airr package is imported in a new interpreter with ``python -X importtime``, and
+the median cumulative import time of each module is compared with a time budget.
+Modules imported earlier by another module are not included in the cumulative time.
+The exit status is 1 if any budget is exceeded.
+
+Usage:
+  python benchmarks/benchmark_import.py [--repeat N] [--scale X]
+
+Run from an environment where the airr package is importable, e.g. after
+``pip install -e .`` or with ``PYTHONPATH=.`` in the package directory.
+"""
+# System imports
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+# Import time budgets in seconds
+BUDGETS = {'airr.schema': 0.15, 'airr': 0.3}
+
+# Lines of the -X importtime report: self and cumulative microseconds, and module name
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)\s*$')
+
+
+def import_times():
+    """
+    Cumulative import times of the modules imported by the airr package in a new interpreter
+
+    Returns:
+      dict: import time in seconds keyed by module name.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import airr'],
+                            check=True, capture_output=True, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            times[match.group(3)] = int(match.group(2)) / 1e6
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the airr package.')
+    parser.add_argument('--repeat', type=int, default=7, help='Number of imports of each module.')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Factor applied to the time budgets, for slow machines.')
+    args = parser.parse_args()
+
+    runs = [import_times() for __ in range(args.repeat)]
+    status = 0
+    for module, budget in BUDGETS.items():
+        elapsed = statistics.median(x[module] for x in runs)
+        budget *= args.scale
+        passed = elapsed <= budget
+        print('%-16s %8.3f s  budget %6.3f s  %s' % (module, elapsed, budget, 'ok' if passed else 'EXCEEDED'))
+        if not passed:
+            status = 1
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Benchmarks for reading and writing AIRR rearrangement files
+
+Usage:
+  python benchmarks/benchmark_io.py [--rows N] [--repeat N]
+
+Run from an environment where the airr package is importable, e.g. after
+``pip install -e .`` or with ``PYTHONPATH=.`` in the package directory.
+"""
+# System imports
+import argparse
+import csv
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+
+# airr imports
+import airr
+import airr.compression
+import airr.index
+from airr.schema import RearrangementSchema
+
+# Synthetic data shape
+FIELDS = RearrangementSchema.required + \
+         ['v_sequence_start', 'v_sequence_end', 'v_germline_start', 'v_germline_end',
+          'j_sequence_start', 'j_sequence_end', 'junction_length', 'v_score', 'v_identity',
+          'duplicate_count', 'complete_vdj', 'repertoire_id', 'clone_id']
+
+
+def synthetic_rearrangements(filename, rows, seed=1):
+    """
+    Write a synthetic rearrangement file
+
+    Arguments:
+      filename (str): output file path.
+      rows (int): number of records to write.
+      seed (int): random seed.
+    """
+    rng = random.Random(seed)
+    nt = 'ACGT'
+    with open(filename, 'w') as handle:
+        writer = csv.writer(handle, dialect='excel-tab', lineterminator='\n')
+        writer.writerow(FIELDS)
+        for i in range(rows):
+            seq = ''.join(rng.choices(nt, k=60))
+            record = {'sequence_id': 'seq%i' % i, 'sequence': seq,
+                      'rev_comp': 'F', 'productive': rng.choice('TF'),
+                      'v_call': 'IGHV1-2*02', 'd_call': 'IGHD3-10*01', 'j_call': 'IGHJ4*02',
+                      'sequence_alignment': seq, 'germline_alignment': seq,
+                      'junction': seq[:30], 'junction_aa': 'CARDRGYW',
+                      'v_cigar': '60=', 'd_cigar': '', 'j_cigar': '',
+                      'v_sequence_start': 1, 'v_sequence_end': 40,
+                      'v_germline_start': 1, 'v_germline_end': 40,
+                      'j_sequence_start': rng.choice([41, '']), 'j_sequence_end': 60,
+                      'junction_length': 30, 'v_score': rng.random() * 500,
+                      'v_identity': rng.random(), 'duplicate_count': rng.randint(1, 100),
+                      'complete_vdj': rng.choice('TF'), 'repertoire_id': 'rep%i' % rng.randint(1, 10),
+                      'clone_id': str(rng.randint(1, 10000))}
+            writer.writerow([record[f] for f in FIELDS])
+
+
+def timed(func, repeat=1):
+    """
+    Return the best wall time of repeated calls
+    """
+    best = None
+    for __ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_rss(func, *args):
+    """
+    Run a function in a fresh process and return its wall time and peak resident memory
+
+    Returns:
+      tuple: elapsed seconds and peak resident set size in MB.
+    """
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(_measure, (func,) + args)
+
+
+def _measure(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(label, elapsed, rows, reference=None, rss=None):
+    """
+    Print a benchmark result
+    """
+    line = '%-32s %8.2f s  %10.0f rows/s' % (label, elapsed, rows / elapsed)
+    if reference is not None:
+        line += '  %5.2fx' % (reference / elapsed)
+    if rss is not None:
+        line += '  %8.1f MB peak' % rss
+    print(line)
+
+
+def read_reference(filename):
+    """
+    Reference reader performing per-cell schema lookups
+    """
+    schema = RearrangementSchema
+    with open(filename, 'r') as handle:
+        for row in csv.DictReader(handle, dialect='excel-tab'):
+            for f in row:
+                spec = schema.type(f)
+                if spec == 'boolean':  row[f] = schema.to_bool(row[f])
+                if spec == 'integer':  row[f] = schema.to_int(row[f])
+                if spec == 'number':  row[f] = schema.to_float(row[f])
+                if f.endswith('_start'):
+                    try:
+                        row[f] = row[f] - 1
+                    except TypeError:
+                        row[f] = None
+
+
+def read_rearrangement(filename, rows='dict', fields=None, mmap=False):
+    """
+    Read all records with airr.read_rearrangement
+    """
+    reader = airr.read_rearrangement(filename, rows=rows, fields=fields, mmap=mmap)
+    for __ in reader:
+        pass
+    reader.close()
+
+
+def read_batches(filename, batch_size=100000):
+    """
+    Read all records with RearrangementReader.iter_batches
+    """
+    reader = airr.read_rearrangement(filename)
+    for __ in reader.iter_batches(batch_size):
+        pass
+    reader.close()
+
+
+def load_reference(filename):
+    """
+    Reference loader parsing the file with pandas and again with RearrangementReader
+    """
+    import pandas as pd
+    from io import StringIO
+    schema = RearrangementSchema
+    df = pd.read_csv(filename, sep='\t', header=0, index_col=None,
+                     dtype=schema.pandas_types(), true_values=schema.true_values,
+                     false_values=schema.false_values)
+    buffer = StringIO()
+    df.to_csv(buffer, sep='\t', index=False)
+    buffer.seek(0)
+    return pd.DataFrame(list(airr.io.RearrangementReader(buffer)))
+
+
+def load_rearrangement(filename):
+    """
+    Load all records with airr.load_rearrangement
+    """
+    return airr.load_rearrangement(filename)
+
+
+def load_chunks(filename, chunksize=10000):
+    """
+    Load all records with airr.load_rearrangement in chunks
+    """
+    for __ in airr.load_rearrangement(filename, chunksize=chunksize):
+        pass
+
+
+def write_reference(rows, fields, filename):
+    """
+    Reference writer performing per-cell schema lookups
+    """
+    schema = RearrangementSchema
+    with open(filename, 'w') as handle:
+        writer = airr.io.RearrangementWriter(handle, fields=fields)
+        for row in rows:
+            entry = row.copy()
+            for f in entry.keys():
+                if f.endswith('_start'):
+                    try:
+                        entry[f] = schema.to_int(entry[f]) + 1
+                    except TypeError:
+                        entry[f] = None
+                if schema.type(f) == 'boolean':  entry[f] = schema.from_bool(entry[f])
+            writer.dict_writer.writerow(entry)
+
+
+def write_rearrangement(rows, fields, filename, method='write'):
+    """
+    Write all records with a RearrangementWriter method
+    """
+    writer = airr.create_rearrangement(filename, fields=fields)
+    if method == 'write':
+        for row in rows:
+            writer.write(row)
+    elif method == 'writerows':
+        writer.writerows(rows)
+    else:
+        for batch in rows:
+            writer.write_batch(batch)
+    writer.close()
+
+
+def write_compressed(rows, fields, filename, threaded=True):
+    """
+    Write all records to a compressed file with RearrangementWriter.writerows
+    """
+    handle = airr.compression.open_text(filename, 'w', threaded=threaded)
+    writer = airr.io.RearrangementWriter(handle, fields=fields)
+    writer.writerows(rows)
+    writer.close()
+
+
+def dump_reference(df, filename):
+    """
+    Reference writer converting each data frame row with RearrangementWriter
+    """
+    with open(filename, 'w') as handle:
+        writer = airr.io.RearrangementWriter(handle, fields=df.columns.tolist())
+        for __, row in df.iterrows():
+            writer.write(row.to_dict())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark AIRR rearrangement file operations.')
+    parser.add_argument('--rows', type=int, default=2000000, help='Number of synthetic records.')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of repetitions per benchmark.')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='airr-benchmark-')
+    try:
+        filename = os.path.join(tmp_dir, 'input.tsv')
+        synthetic_rearrangements(filename, args.rows)
+        print('%i records, %.1f MB' % (args.rows, os.path.getsize(filename) / 1e6))
+
+        # Row and batch readers
+        reference = timed(lambda: read_reference(filename), args.repeat)
+        report('read (per-cell reference)', reference, args.rows)
+        for rows in ('dict', 'tuple', 'record'):
+            elapsed = timed(lambda: read_rearrangement(filename, rows=rows), args.repeat)
+            report('read_rearrangement(rows=%s)' % rows, elapsed, args.rows, reference)
+        elapsed = timed(lambda: read_batches(filename), args.repeat)
+        report('iter_batches', elapsed, args.rows, reference)
+        fields = ['sequence_id', 'v_call', 'junction_length']
+        for mmap in (False, True):
+            elapsed = timed(lambda: read_rearrangement(filename, rows='tuple', mmap=mmap), args.repeat)
+            report('read_rearrangement(mmap=%s)' % mmap, elapsed, args.rows, reference)
+            elapsed = timed(lambda: read_rearrangement(filename, rows='tuple', fields=fields, mmap=mmap),
+                            args.repeat)
+            report('read_rearrangement(fields, mmap=%s)' % mmap, elapsed, args.rows, reference)
+
+        # Lookups by sequence_id
+        ids = ['seq%i' % i for i in random.Random(1).sample(range(args.rows), min(args.rows, 5000))]
+        elapsed = timed(lambda: airr.index.index_rearrangement(filename), args.repeat)
+        report('index_rearrangement', elapsed, args.rows)
+        reader = airr.read_rearrangement(filename)
+        elapsed = timed(lambda: reader.get_many(ids), args.repeat)
+        reader.close()
+        report('get_many(%i ids)' % len(ids), elapsed, len(ids))
+
+        # Data frames
+        reference, rss = peak_rss(load_reference, filename)
+        report('load (round trip reference)', reference, args.rows, rss=rss)
+        elapsed, rss = peak_rss(load_rearrangement, filename)
+        report('load_rearrangement', elapsed, args.rows, reference, rss)
+        elapsed, rss = peak_rss(load_chunks, filename)
+        report('load_rearrangement(chunksize)', elapsed, args.rows, reference, rss)
+
+        # Validation
+        reference = timed(lambda: airr.validate_rearrangement(filename), args.repeat)
+        report('validate_rearrangement', reference, args.rows)
+        workers = os.cpu_count()
+        elapsed = timed(lambda: airr.validate_rearrangement(filename, workers=workers), args.repeat)
+        report('validate_rearrangement(workers=%i)' % workers, elapsed, args.rows, reference)
+
+        # Writers
+        output = os.path.join(tmp_dir, 'output.tsv')
+        reader = airr.read_rearrangement(filename)
+        rows = list(reader)
+        reader.close()
+        reference = timed(lambda: write_reference(rows, FIELDS, output), args.repeat)
+        report('write (per-cell reference)', reference, args.rows)
+        for method in ('write', 'writerows'):
+            elapsed = timed(lambda: write_rearrangement(rows, FIELDS, output, method), args.repeat)
+            report('RearrangementWriter.%s' % method, elapsed, args.rows, reference)
+        for threaded in (False, True):
+            elapsed = timed(lambda: write_compressed(rows, FIELDS, output + '.gz', threaded), args.repeat)
+            report('write gzip (threaded=%s)' % threaded, elapsed, args.rows, reference)
+        reader = airr.read_rearrangement(filename)
+        batches = list(reader.iter_batches(100000))
+        reader.close()
+        elapsed = timed(lambda: write_rearrangement(batches, FIELDS, output, 'write_batch'), args.repeat)
+        report('RearrangementWriter.write_batch', elapsed, args.rows, reference)
+        del rows, batches
+
+        df = airr.load_rearrangement(filename)
+        reference = timed(lambda: dump_reference(df, output), args.repeat)
+        report('dump (iterrows reference)', reference, args.rows)
+        elapsed = timed(lambda: airr.dump_rearrangement(df, output), args.repeat)
+        report('dump_rearrangement', elapsed, args.rows, reference)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
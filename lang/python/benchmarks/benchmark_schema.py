@@ -0,0 +1,135 @@
+"""
+Benchmarks for validating AIRR data model objects
+
+Usage:
+  python benchmarks/benchmark_schema.py [--repertoires N] [--repeat N]
+
+Run from an environment where the airr package is importable, e.g. after
+``pip install -e .`` or with ``PYTHONPATH=.`` in the package directory.
+"""
+# System imports
+import argparse
+import copy
+import os
+import time
+from unittest import mock
+
+# airr imports
+import airr
+import airr.schema
+from airr.schema import RepertoireSchema, Schema
+
+# Paths
+data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'tests', 'data')
+
+
+def synthetic_repertoires(count, samples=3):
+    """
+    Copies of the test repertoire with several samples and data processing entries
+
+    Arguments:
+      count (int): number of repertoires.
+      samples (int): number of sample and data processing entries of each repertoire.
+
+    Returns:
+      list: repertoire dictionaries.
+    """
+    rep = airr.read_airr(os.path.join(data_path, 'good_repertoire.yaml'))['Repertoire'][0]
+    rep['sample'] = [copy.deepcopy(rep['sample'][0]) for __ in range(samples)]
+    rep['data_processing'] = [copy.deepcopy(rep['data_processing'][0]) for __ in range(samples)]
+    reps = []
+    for i in range(count):
+        r = copy.deepcopy(rep)
+        r['repertoire_id'] = 'rep%i' % i
+        reps.append(r)
+    return reps
+
+
+def timed(func, repeat=1):
+    """
+    Return the best wall time of repeated calls
+    """
+    best = None
+    for __ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(label, elapsed, count, reference=None):
+    """
+    Print a benchmark result
+    """
+    line = '%-32s %8.2f s  %10.0f objects/s' % (label, elapsed, count / elapsed)
+    if reference is not None:
+        line += '  %5.2fx' % (reference / elapsed)
+    print(line)
+
+
+def validate(reps):
+    """
+    Validate repertoires with RepertoireSchema.validate_object
+    """
+    for r in reps:
+        RepertoireSchema.validate_object(r, nonairr=False)
+
+
+def validate_compiled(reps):
+    """
+    Validate repertoires with the compiled RepertoireSchema validator
+    """
+    validate = RepertoireSchema.compile()
+    for r in reps:
+        validate(r, nonairr=False)
+
+
+def uncached_schema(definition):
+    """
+    Reference resolution constructing a new schema for every reference
+    """
+    return Schema(definition)
+
+
+def uncached_inline(definition):
+    """
+    Reference construction of inline object schemas for every object
+    """
+    return Schema({'properties': definition.get('properties')})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark AIRR data model validation.')
+    parser.add_argument('--repertoires', type=int, default=20000, help='Number of repertoires.')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of repetitions per benchmark.')
+    args = parser.parse_args()
+
+    reps = synthetic_repertoires(args.repertoires)
+    print('%i repertoires' % len(reps))
+
+    # Validation constructing schemas for each reference, as without the registry
+    with mock.patch.object(airr.schema, 'get_schema', uncached_schema), \
+            mock.patch.object(airr.schema, '_inline_schema', uncached_inline):
+        reference = timed(lambda: validate(reps), args.repeat)
+    report('validate_object (no registry)', reference, len(reps))
+    elapsed = timed(lambda: validate(reps), args.repeat)
+    report('validate_object', elapsed, len(reps), reference)
+    elapsed = timed(lambda: validate_compiled(reps), args.repeat)
+    report('compile', elapsed, len(reps), reference)
+    data = {'Repertoire': reps}
+    interpreted = timed(lambda: airr.validate_airr(data, compiled=False), args.repeat)
+    report('validate_airr(compiled=False)', interpreted, len(reps), reference)
+    elapsed = timed(lambda: airr.validate_airr(data), args.repeat)
+    report('validate_airr', elapsed, len(reps), reference)
+
+    # Templates
+    with mock.patch.object(airr.schema, 'get_schema', uncached_schema):
+        reference = timed(lambda: [RepertoireSchema.template() for __ in range(100)], args.repeat)
+    report('template (no registry)', reference, 100)
+    elapsed = timed(lambda: [RepertoireSchema.template() for __ in range(100)], args.repeat)
+    report('template', elapsed, 100, reference)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmarks for reading and writing YAML AIRR data files with the libyaml and pure Python backends
+
+Usage:
+  python benchmarks/benchmark_yaml.py [--repertoires N] [--repeat N]
+
+Run from an environment where the airr package is importable, e.g. after
+``pip install -e .`` or with ``PYTHONPATH=.`` in the package directory.
+"""
+# System imports
+import argparse
+import copy
+import os
+import shutil
+import tempfile
+import time
+import yaml
+
+# airr imports
+import airr
+from airr.interface import _yaml_dumper, _yaml_loader
+
+# Paths
+data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'tests', 'data')
+
+
+def synthetic_repertoires(count):
+    """
+    Copies of the test repertoire
+
+    Arguments:
+      count (int): number of repertoires.
+
+    Returns:
+      dict: AIRR data with the repertoires.
+    """
+    rep = airr.read_airr(os.path.join(data_path, 'good_repertoire.yaml'))['Repertoire'][0]
+    reps = []
+    for i in range(count):
+        r = copy.deepcopy(rep)
+        r['repertoire_id'] = 'rep%i' % i
+        reps.append(r)
+    return {'Repertoire': reps}
+
+
+def timed(func, repeat=1):
+    """
+    Return the best wall time of repeated calls
+    """
+    best = None
+    for __ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(label, elapsed, size, reference=None):
+    """
+    Print a benchmark result
+    """
+    line = '%-28s %8.2f s  %8.2f MB/s' % (label, elapsed, size / elapsed / 2**20)
+    if reference is not None:
+        line += '  %5.2fx' % (reference / elapsed)
+    print(line)
+
+
+def load(filename, loader):
+    """
+    Parse a YAML file
+    """
+    with open(filename, 'r', encoding='utf-8') as handle:
+        return yaml.load(handle, Loader=loader)
+
+
+def dump(data, filename, dumper):
+    """
+    Write a YAML file as write_airr does
+    """
+    with open(filename, 'w') as handle:
+        yaml.dump(data, handle, Dumper=dumper, default_flow_style=False, sort_keys=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reading and writing YAML AIRR data files.')
+    parser.add_argument('--repertoires', type=int, default=2000, help='Number of repertoires.')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of repetitions per benchmark.')
+    args = parser.parse_args()
+
+    if not hasattr(yaml, 'CLoader'):
+        print('PyYAML is not built with libyaml, the libyaml backend falls back to pure Python')
+
+    data = synthetic_repertoires(args.repertoires)
+    out_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(out_dir, 'repertoires.yaml')
+        airr.write_airr(filename, data)
+        size = os.path.getsize(filename)
+        print('%i repertoires, %.1f MB' % (args.repertoires, size / 2**20))
+
+        # Reading
+        reference = timed(lambda: load(filename, _yaml_loader(libyaml=False)), args.repeat)
+        report('load (python)', reference, size)
+        elapsed = timed(lambda: load(filename, _yaml_loader(libyaml=True)), args.repeat)
+        report('load (libyaml)', elapsed, size, reference)
+        elapsed = timed(lambda: airr.read_airr(filename), args.repeat)
+        report('read_airr', elapsed, size, reference)
+
+        # Writing
+        output = os.path.join(out_dir, 'output.yaml')
+        reference = timed(lambda: dump(data, output, _yaml_dumper(libyaml=False)), args.repeat)
+        report('dump (python)', reference, size)
+        elapsed = timed(lambda: dump(data, output, _yaml_dumper(libyaml=True)), args.repeat)
+        report('dump (libyaml)', elapsed, size, reference)
+        elapsed = timed(lambda: airr.write_airr(output, data), args.repeat)
+        report('write_airr', elapsed, size, reference)
+    finally:
+        shutil.rmtree(out_dir)
+
+
+if __name__ == '__main__':
+    main()
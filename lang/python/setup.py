@@ -1,6 +1,8 @@
 """
 AIRR community formats for adaptive immune receptor data.
 """
+import os
+import runpy
 import sys
 import versioneer
 
@@ -16,10 +18,29 @@ with open('README.rst', 'r') as ip:
 with open('requirements.txt') as req:
         install_requires = req.read().splitlines()
 
+# Regenerate the pickled schema specification when building
+cmdclass = versioneer.get_cmdclass()
+_build_py = cmdclass['build_py']
+
+class build_py(_build_py):
+    def run(self):
+        _build_py.run(self)
+        if self.dry_run:
+            return
+        specs = os.path.join(self.build_lib, 'airr', 'specs')
+        if os.path.exists(os.path.join(specs, 'cache.py')):
+            try:
+                runpy.run_path(os.path.join(specs, 'cache.py'))['write_cache'](specs)
+            except ImportError:
+                # The packaged cache is used when PyYAML is unavailable at build time
+                pass
+
+cmdclass['build_py'] = build_py
+
 # Setup
 setup(name='airr',
       version=versioneer.get_version(),
-      cmdclass=versioneer.get_cmdclass(),
+      cmdclass=cmdclass,
       author='AIRR Community',
       author_email='',
       description='AIRR Community Data Representation Standard reference library for antibody and TCR sequencing data.',
@@ -30,8 +51,9 @@ setup(name='airr',
       keywords=['AIRR', 'bioinformatics', 'sequencing', 'immunoglobulin', 'antibody',
                 'adaptive immunity', 'T cell', 'B cell', 'BCR', 'TCR'],
       install_requires=install_requires,
+      extras_require={'arrow': ['pyarrow'], 'zstd': ['zstandard']},
       packages=find_packages(),
-      package_data={'airr': ['specs/*.yaml']},
+      package_data={'airr': ['specs/*.yaml', 'specs/*.pickle']},
       entry_points={'console_scripts': ['airr-tools=airr.tools:main']},
       classifiers=['Intended Audience :: Science/Research',
                    'Natural Language :: English',
@@ -0,0 +1,106 @@
+"""
+Unit tests for bgzf
+"""
+# System imports
+import gzip
+import os
+import time
+import unittest
+
+# Load imports
+import airr
+from airr.bgzf import *
+from airr.io import RearrangementReader
+
+# Paths
+test_path = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(test_path, 'data')
+
+
+class TestBgzf(unittest.TestCase):
+    def setUp(self):
+        print('-------> %s()' % self.id())
+
+        # Test data
+        self.data_good = os.path.join(data_path, 'good_rearrangement.tsv')
+        self.output_bgzf = os.path.join(data_path, 'output_rearrangement.tsv.gz')
+
+        # Start timer
+        self.start = time.time()
+
+    def tearDown(self):
+        t = time.time() - self.start
+        print('<- %.3f %s()' % (t, self.id()))
+
+    # @unittest.skip('-> write(): skipped\n')
+    def test_write(self):
+        with open(self.data_good, 'r') as handle:
+            text = handle.read()
+
+        # Small blocks of whole lines readable as gzip
+        lines = text.splitlines(keepends=True)
+        writer = BgzfWriter(self.output_bgzf)
+        for line in lines:
+            writer.write(line)
+            writer.flush()
+        writer.close()
+        self.assertTrue(is_bgzf(self.output_bgzf), 'write(): BGZF header failed')
+        self.assertFalse(is_bgzf(self.data_good), 'write(): BGZF header failed')
+        with gzip.open(self.output_bgzf, 'rt') as handle:
+            self.assertEqual(handle.read(), text, 'write(): content failed')
+
+        # Index has one entry per line and matches the index built from the file
+        index = read_index(self.output_bgzf)
+        self.assertListEqual([x[2] for x in index], list(range(len(lines))), 'write(): index failed')
+        self.assertListEqual(index_bgzf(self.output_bgzf, write=False), index, 'write(): index failed')
+
+    # @unittest.skip('-> open(): skipped\n')
+    def test_open(self):
+        with open(self.data_good, 'r') as handle:
+            rows = list(RearrangementReader(handle))
+
+        writer = BgzfWriter(self.output_bgzf)
+        for line in open(self.data_good, 'r'):
+            writer.write(line)
+            writer.flush()
+        writer.close()
+
+        # Records after a start position
+        for start in (0, 1, 4, len(rows)):
+            handle = open_bgzf(self.output_bgzf, start=start)
+            result = list(RearrangementReader(handle))
+            handle.close()
+            self.assertEqual(result, rows[start:], 'open(): start %i failed' % start)
+
+        # Writer of create_rearrangement
+        writer = airr.create_rearrangement(self.output_bgzf, compression='bgzf')
+        writer.writerows(rows)
+        writer.close()
+        self.assertTrue(is_bgzf(self.output_bgzf), 'open(): create_rearrangement failed')
+        reader = airr.read_rearrangement(self.output_bgzf)
+        self.assertEqual(list(reader), [{f: r[f] for f in reader.fields} for r in rows],
+                         'open(): read_rearrangement failed')
+        reader.close()
+
+        # Parallel validation of blocks
+        self.assertTrue(airr.validate_rearrangement(self.output_bgzf, workers=2),
+                        'open(): validate_rearrangement failed')
+
+        # Index of a file since rewritten with fewer records is not used
+        self.assertIsNotNone(read_index(self.output_bgzf), 'open(): index failed')
+        writer = BgzfWriter(self.output_bgzf, index=False)
+        for line in list(open(self.data_good, 'r'))[:3]:
+            writer.write(line)
+            writer.flush()
+        writer.close()
+        self.assertIsNone(read_index(self.output_bgzf), 'open(): stale index used')
+        handle = open_bgzf(self.output_bgzf, start=1)
+        result = list(RearrangementReader(handle))
+        handle.close()
+        self.assertEqual(result, rows[1:2], 'open(): stale index failed')
+        self.assertTrue(airr.validate_rearrangement(self.output_bgzf, workers=2),
+                        'open(): validate_rearrangement with stale index failed')
+
+
+if __name__ == '__main__':
+    unittest.main()
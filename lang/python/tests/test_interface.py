@@ -2,14 +2,24 @@
 Unit tests for interface
 """
 # System imports
+import contextlib
+import gzip
+import importlib.util
 import os
+import shutil
+import subprocess
+import tempfile
 import time
 import unittest
 import jsondiff
+from unittest import mock
+import pandas as pd
 import sys
+from io import StringIO
 
 # airr imports
 import airr
+import airr.tools
 from airr.schema import ValidationError
 
 # Paths
@@ -40,6 +50,14 @@ class TestInferface(unittest.TestCase):
         self.output_rep = os.path.join(data_path, 'output_rep.json')
         self.output_good = os.path.join(data_path, 'output_data.json')
         self.output_blank = os.path.join(data_path, 'output_blank.json')
+        self.output_rearrangement = os.path.join(data_path, 'output_rearrangement.tsv')
+        self.output_reference = os.path.join(data_path, 'output_reference.tsv')
+        self.output_parquet = os.path.join(data_path, 'output_rearrangement.parquet')
+        self.output_gzip = os.path.join(data_path, 'output_merge.tsv.gz')
+        self.output_sorted = os.path.join(data_path, 'output_sorted.tsv')
+        self.output_bgzf = os.path.join(data_path, 'output_rearrangement.tsv.gz')
+        self.output_feather = os.path.join(data_path, 'output_rearrangement.feather')
+        self.output_yaml = os.path.join(data_path, 'output_data.yaml')
 
         # Expected output
         self.shape_good = (9, 44)
@@ -63,6 +81,296 @@ class TestInferface(unittest.TestCase):
         self.assertFalse(result, 'load(): bad data failed')
         #self.assertTupleEqual(result.shape, self.shape_bad, 'load(): bad data failed')
 
+        # Values and types match the reader
+        result = airr.load_rearrangement(self.rearrangement_good, validate=True)
+        reader = airr.read_rearrangement(self.rearrangement_good)
+        expected = list(reader)
+        reader.close()
+        types = airr.schema.RearrangementSchema.pandas_types()
+        for f in ('sequence_id', 'rev_comp', 'junction_length', 'v_score', 'd_sequence_start', 'c_call'):
+            self.assertListEqual(result[f].tolist(), [r[f] for r in expected], 'load(): values failed')
+        self.assertEqual(result['junction_length'].dtype, types['junction_length'], 'load(): types failed')
+        self.assertTrue(result['c_score'].isna().all(), 'load(): missing values failed')
+
+        # Selected fields
+        fields = ['sequence_id', 'v_sequence_start', 'productive']
+        result = airr.load_rearrangement(self.rearrangement_good, validate=True, fields=fields)
+        self.assertListEqual(result.columns.tolist(), fields, 'load(): selected fields failed')
+        self.assertTupleEqual(result.shape, (self.shape_good[0], len(fields)), 'load(): selected fields failed')
+        self.assertEqual(result['v_sequence_start'][0], -1, 'load(): selected fields failed')
+
+    # @unittest.skip('-> load_rearrangement(chunksize): skipped\n')
+    def test_load_rearrangement_chunks(self):
+        # Chunks match the complete data frame
+        expected = airr.load_rearrangement(self.rearrangement_good)
+        for validate in (False, True):
+            chunks = list(airr.load_rearrangement(self.rearrangement_good, validate=validate, chunksize=4))
+            self.assertListEqual([len(x) for x in chunks], [4, 4, 1], 'load(chunksize): chunk size failed')
+            self.assertTrue(pd.concat(chunks).equals(expected), 'load(chunksize): chunks failed')
+
+        # Invalid values are reported with the record number in the file
+        with open(self.rearrangement_good, 'r') as handle:
+            lines = handle.readlines()
+        column = lines[0].split('\t').index('junction_length')
+        values = lines[7].split('\t')
+        values[column] = 'abc'
+        lines[7] = '\t'.join(values)
+        with open(self.output_rearrangement, 'w') as handle:
+            handle.writelines(lines)
+        chunks = airr.load_rearrangement(self.output_rearrangement, validate=True, chunksize=4)
+        self.assertEqual(len(next(chunks)), 4, 'load(chunksize): invalid data failed')
+        with self.assertRaisesRegex(ValidationError, 'record 7 field junction_length'):
+            next(chunks)
+
+        # Integers written as floats are rejected with and without chunks, as by the row reader
+        values[column] = '36.0'
+        lines[7] = '\t'.join(values)
+        with open(self.output_rearrangement, 'w') as handle:
+            handle.writelines(lines)
+        with contextlib.redirect_stderr(StringIO()) as stderr:
+            self.assertIsNone(airr.load_rearrangement(self.output_rearrangement, validate=True))
+        self.assertIn('record 7 field junction_length has invalid int 36.0', stderr.getvalue())
+        with self.assertRaisesRegex(ValidationError, 'record 7 field junction_length has invalid int 36.0'):
+            list(airr.load_rearrangement(self.output_rearrangement, validate=True, chunksize=4))
+        self.assertFalse(airr.validate_rearrangement(self.output_rearrangement))
+
+        # Invalid header
+        with self.assertRaises(ValidationError):
+            airr.load_rearrangement(self.rearrangement_bad, validate=True, chunksize=4)
+
+    # @unittest.skip('-> dump_rearrangement(): skipped\n')
+    def test_dump_rearrangement(self):
+        # Output matches RearrangementWriter
+        reader = airr.read_rearrangement(self.rearrangement_good)
+        rows = list(reader)
+        reader.close()
+        writer = airr.create_rearrangement(self.output_reference, fields=reader.fields)
+        for r in rows:
+            writer.write(r)
+        writer.close()
+
+        df = pd.DataFrame(rows)
+        airr.dump_rearrangement(df, self.output_rearrangement, chunksize=4)
+        with open(self.output_reference, 'r') as ref, open(self.output_rearrangement, 'r') as out:
+            self.assertEqual(out.read(), ref.read(), 'dump_rearrangement(): output does not match writer')
+
+        # Round trip
+        df = airr.load_rearrangement(self.rearrangement_good)
+        airr.dump_rearrangement(df, self.output_rearrangement)
+        result = airr.load_rearrangement(self.output_rearrangement)
+        self.assertTrue(result.equals(df[result.columns]), 'dump_rearrangement(): round trip failed')
+
+    # @unittest.skip('-> merge_rearrangement(): skipped\n')
+    def test_merge_rearrangement(self):
+        reader = airr.read_rearrangement(self.rearrangement_good)
+        rows = list(reader)
+        reader.close()
+        with open(self.rearrangement_good, 'r') as handle:
+            text = handle.read()
+        header, records = text.split('\n', 1)
+
+        # Identical headers are concatenated
+        result = airr.merge_rearrangement(self.output_rearrangement, [self.rearrangement_good] * 2)
+        self.assertTrue(result, 'merge_rearrangement(): identical headers failed')
+        with open(self.output_rearrangement, 'r') as handle:
+            self.assertEqual(handle.read(), text + records, 'merge_rearrangement(): identical headers failed')
+
+        # Permuted headers are reordered
+        with open(self.output_reference, 'w') as handle:
+            for line in text.splitlines():
+                handle.write('\t'.join(line.split('\t')[::-1]) + '\n')
+        result = airr.merge_rearrangement(self.output_rearrangement,
+                                          [self.rearrangement_good, self.output_reference])
+        self.assertTrue(result, 'merge_rearrangement(): permuted headers failed')
+        reader = airr.read_rearrangement(self.output_rearrangement)
+        self.assertEqual(list(reader), rows + rows, 'merge_rearrangement(): permuted headers failed')
+        reader.close()
+
+        # Short rows of permuted headers have empty trailing values
+        with open(self.output_reference, 'w') as handle:
+            handle.write('junction_length\tsequence_id\tv_call\n4\tB\n5\t"C"\n')
+        with open(self.output_rearrangement, 'w') as handle:
+            handle.write('sequence_id\tv_call\tjunction_length\nA\tIGHV1\t3\n')
+        result = airr.merge_rearrangement(self.output_sorted, [self.output_rearrangement, self.output_reference])
+        self.assertTrue(result, 'merge_rearrangement(): short rows failed')
+        with open(self.output_sorted, 'r') as handle:
+            self.assertEqual(handle.read(), 'sequence_id\tv_call\tjunction_length\nA\tIGHV1\t3\nB\t\t4\nC\t\t5\n',
+                             'merge_rearrangement(): short rows failed')
+
+        # Gzip and BGZF inputs with gzip output
+        writer = airr.create_rearrangement(self.output_bgzf, fields=header.split('\t'), compression='bgzf')
+        writer.writerows(rows)
+        writer.close()
+        result = airr.merge_rearrangement(self.output_gzip, [self.output_bgzf, self.output_bgzf])
+        self.assertTrue(airr.bgzf.is_bgzf(self.output_gzip), 'merge_rearrangement(): BGZF failed')
+        reader = airr.read_rearrangement(self.output_gzip)
+        self.assertEqual(list(reader), rows + rows, 'merge_rearrangement(): BGZF failed')
+        reader.close()
+        self.assertListEqual(airr.bgzf.read_index(self.output_gzip),
+                             airr.bgzf.index_bgzf(self.output_gzip, write=False), 'merge_rearrangement(): BGZF index failed')
+        self.assertTrue(airr.validate_rearrangement(self.output_gzip, workers=2), 'merge_rearrangement(): BGZF index failed')
+
+        # BGZF input without a final line terminator
+        with open(self.rearrangement_good, 'r') as handle:
+            text = handle.read().rstrip('\n')
+        with airr.bgzf.BgzfWriter(self.output_bgzf) as handle:
+            handle.write(text)
+        result = airr.merge_rearrangement(self.output_gzip, [self.output_bgzf, self.output_bgzf])
+        self.assertTrue(result, 'merge_rearrangement(): BGZF without final newline failed')
+        reader = airr.read_rearrangement(self.output_gzip)
+        self.assertEqual(list(reader), rows + rows, 'merge_rearrangement(): BGZF without final newline failed')
+        reader.close()
+        self.assertListEqual(airr.bgzf.read_index(self.output_gzip),
+                             airr.bgzf.index_bgzf(self.output_gzip, write=False),
+                             'merge_rearrangement(): BGZF without final newline failed')
+
+        result = airr.merge_rearrangement(self.output_gzip, [self.rearrangement_good_gz, self.output_bgzf])
+        reader = airr.read_rearrangement(self.output_gzip)
+        self.assertEqual(list(reader), rows + rows, 'merge_rearrangement(): gzip failed')
+        reader.close()
+
+        # Different fields are parsed
+        writer = airr.create_rearrangement(self.output_reference, fields=['clone_id'])
+        writer.writerows(rows)
+        writer.close()
+        result = airr.merge_rearrangement(self.output_rearrangement,
+                                          [self.rearrangement_good, self.output_reference])
+        self.assertTrue(result, 'merge_rearrangement(): different fields failed')
+        reader = airr.read_rearrangement(self.output_rearrangement)
+        self.assertIn('clone_id', reader.fields, 'merge_rearrangement(): different fields failed')
+        self.assertEqual(len(list(reader)), 2 * len(rows), 'merge_rearrangement(): different fields failed')
+        reader.close()
+        with open(self.output_rearrangement, 'r') as handle:
+            expected = handle.read()
+
+        # Parallel parsing keeps the order of the input files
+        result = airr.merge_rearrangement(self.output_rearrangement,
+                                          [self.rearrangement_good, self.output_reference], workers=2)
+        self.assertTrue(result, 'merge_rearrangement(workers=2): different fields failed')
+        with open(self.output_rearrangement, 'r') as handle:
+            self.assertEqual(handle.read(), expected, 'merge_rearrangement(workers=2): different fields failed')
+
+        # Failed merges leave no output
+        with open(self.output_reference, 'a') as handle:
+            handle.write('\t' * 100 + 'X\n')
+        for workers in (1, 2):
+            with contextlib.redirect_stderr(StringIO()):
+                result = airr.merge_rearrangement(self.output_rearrangement,
+                                                  [self.rearrangement_good, self.output_reference], workers=workers)
+            self.assertFalse(result, 'merge_rearrangement(workers=%i): failure failed' % workers)
+            self.assertFalse(os.path.exists(self.output_rearrangement),
+                             'merge_rearrangement(workers=%i): failure failed' % workers)
+
+    # @unittest.skip('-> merge_rearrangement(sort_key): skipped\n')
+    def test_merge_sorted(self):
+        reader = airr.read_rearrangement(self.rearrangement_good)
+        rows = list(reader)
+        reader.close()
+        key = lambda r: (r['junction_length'] is None, r['junction_length'] or 0, r['sequence_id'])
+        for i, output in enumerate((self.output_rearrangement, self.output_reference)):
+            writer = airr.create_rearrangement(output, fields=reader.fields)
+            writer.writerows(sorted(rows[i::2], key=key))
+            writer.close()
+
+        # Typed values are merged in order
+        result = airr.merge_rearrangement(self.output_sorted, [self.output_rearrangement, self.output_reference],
+                                          sort_key=['junction_length', 'sequence_id'])
+        self.assertTrue(result, 'merge_rearrangement(sort_key): failed')
+        reader = airr.read_rearrangement(self.output_sorted)
+        self.assertEqual(list(reader), sorted(rows, key=key), 'merge_rearrangement(sort_key): failed')
+        reader.close()
+
+        # Unsorted input
+        result = airr.merge_rearrangement(self.output_sorted, [self.output_rearrangement, self.output_reference],
+                                          sort_key='v_call')
+        self.assertFalse(result, 'merge_rearrangement(sort_key): unsorted input failed')
+        self.assertFalse(os.path.exists(self.output_sorted), 'merge_rearrangement(sort_key): unsorted input failed')
+
+        # Missing key fields
+        with contextlib.redirect_stderr(StringIO()) as stderr:
+            result = airr.merge_rearrangement(self.output_sorted, [self.output_rearrangement, self.output_reference],
+                                              sort_key=['junction_length', 'locus_x'])
+        self.assertFalse(result, 'merge_rearrangement(sort_key): missing field failed')
+        self.assertIn('locus_x not found', stderr.getvalue(), 'merge_rearrangement(sort_key): missing field failed')
+        self.assertFalse(os.path.exists(self.output_sorted), 'merge_rearrangement(sort_key): missing field failed')
+
+    # @unittest.skip('-> split_rearrangement(): skipped\n')
+    def test_split_rearrangement(self):
+        reader = airr.read_rearrangement(self.rearrangement_good)
+        rows = list(reader)
+        reader.close()
+
+        out_dir = tempfile.mkdtemp()
+        try:
+            # One open file at a time, reopening files for later records
+            paths = airr.split_rearrangement(self.rearrangement_good, ['productive', 'c_call'],
+                                             out_dir=out_dir, max_open=1)
+            self.assertEqual(sorted(paths), [('F', None), ('T', None)], 'split_rearrangement(): failed')
+            self.assertEqual(os.path.basename(paths[('T', None)]), 'good_rearrangement_T_NA.tsv',
+                             'split_rearrangement(): failed')
+            for key, path in paths.items():
+                reader = airr.read_rearrangement(path)
+                result = list(reader)
+                reader.close()
+                expected = [r for r in rows if r['productive'] == (key[0] == 'T')]
+                self.assertEqual(result, expected, 'split_rearrangement(): failed')
+
+            # Command line and missing fields
+            self.assertTrue(airr.tools.split_cmd(self.rearrangement_good, ['sequence_id'], out_dir=out_dir,
+                                                 prefix='seq_'))
+            self.assertEqual(len([f for f in os.listdir(out_dir) if f.startswith('seq_')]), len(rows),
+                             'split_rearrangement(): command line failed')
+            with contextlib.redirect_stderr(StringIO()):
+                self.assertIsNone(airr.split_rearrangement(self.rearrangement_good, 'locus_x', out_dir=out_dir))
+        finally:
+            shutil.rmtree(out_dir)
+
+    # @unittest.skip('-> sort_rearrangement(): skipped\n')
+    def test_sort_rearrangement(self):
+        reader = airr.read_rearrangement(self.rearrangement_good)
+        rows = list(reader)
+        reader.close()
+        key = lambda r: (r['junction_length'] is None, r['junction_length'] or 0, r['sequence_id'])
+        expected = sorted(rows, key=key)
+
+        # In memory and with compressed or uncompressed runs of one record
+        for memory_limit, compress in ((2**30, False), (1, False), (1, True)):
+            result = airr.sort_rearrangement(self.rearrangement_good, self.output_sorted,
+                                             ['junction_length', 'sequence_id'],
+                                             memory_limit=memory_limit, compress=compress)
+            self.assertTrue(result, 'sort_rearrangement(): failed')
+            reader = airr.read_rearrangement(self.output_sorted)
+            self.assertEqual(list(reader), expected, 'sort_rearrangement(): failed')
+            reader.close()
+
+        # Command line
+        self.assertTrue(airr.tools.sort_cmd(self.output_sorted, self.rearrangement_good, ['v_score'],
+                                            memory_limit='1K'))
+        reader = airr.read_rearrangement(self.output_sorted)
+        self.assertEqual([r['v_score'] for r in reader], sorted(r['v_score'] for r in rows),
+                         'sort_rearrangement(): command line failed')
+        reader.close()
+
+        # Lines are copied unchanged, with invalid key values sorted as missing values
+        with open(self.output_rearrangement, 'w') as handle:
+            handle.write('sequence_id\tjunction_length\tmy_start\nC\tabc\t7\nB\t4\t3\nA\t4\t\n')
+        for memory_limit in (2**30, 1):
+            result = airr.sort_rearrangement(self.output_rearrangement, self.output_sorted, 'junction_length',
+                                             memory_limit=memory_limit)
+            self.assertTrue(result, 'sort_rearrangement(): unchanged lines failed')
+            with open(self.output_sorted, 'r') as handle:
+                self.assertEqual(handle.read(), 'sequence_id\tjunction_length\tmy_start\nB\t4\t3\nA\t4\t\nC\tabc\t7\n',
+                                 'sort_rearrangement(): unchanged lines failed')
+
+        # Missing key fields
+        os.remove(self.output_sorted)
+        with contextlib.redirect_stderr(StringIO()) as stderr:
+            result = airr.sort_rearrangement(self.rearrangement_good, self.output_sorted,
+                                             ['sequence_id', 'locus_x'], memory_limit=1)
+        self.assertFalse(result, 'sort_rearrangement(): missing field failed')
+        self.assertIn('locus_x not found', stderr.getvalue(), 'sort_rearrangement(): missing field failed')
+        self.assertFalse(os.path.exists(self.output_sorted), 'sort_rearrangement(): missing field failed')
+
     # @unittest.skip('-> read_rearrangement(): skipped\n')
     def test_read_rearrangement(self):
         # Good data
@@ -81,6 +389,181 @@ class TestInferface(unittest.TestCase):
         reader.close()
         self.assertTrue(len(result) == self.shape_good[0], 'read_rearrangement(): good data (gzip) failed')
 
+    # @unittest.skip('-> arrow_rearrangement(): skipped\n')
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_arrow_rearrangement(self):
+        reader = airr.read_rearrangement(self.rearrangement_good)
+        rows = list(reader)
+        reader.close()
+        df = airr.load_rearrangement(self.rearrangement_good)
+
+        for output in (self.output_parquet, self.output_feather):
+            # Rows match the TSV reader
+            writer = airr.create_rearrangement(output, fields=reader.fields)
+            writer.writerows(rows)
+            writer.close()
+            result = airr.read_rearrangement(output)
+            self.assertEqual(list(result), rows, 'arrow_rearrangement(): read failed for %s' % output)
+            result.close()
+
+            # Field projection
+            result = airr.read_rearrangement(output, rows='tuple', fields=['v_sequence_start', 'v_call'])
+            self.assertEqual(list(result), [(r['v_sequence_start'], r['v_call']) for r in rows],
+                             'arrow_rearrangement(): read fields failed for %s' % output)
+            result.close()
+
+            # Data frame matches the TSV data frame
+            result = airr.load_rearrangement(output)
+            self.assertTrue(result[df.columns].equals(df), 'arrow_rearrangement(): load failed for %s' % output)
+
+        # Conversion back to TSV
+        self.assertTrue(airr.tools.convert_cmd(self.output_rearrangement, self.output_parquet))
+        reader = airr.read_rearrangement(self.output_rearrangement)
+        self.assertEqual(list(reader), rows, 'arrow_rearrangement(): conversion failed')
+        reader.close()
+
+        # Files of failed conversions are closed
+        with mock.patch.object(airr.io.ArrowRearrangementWriter, 'writerows', side_effect=ValueError('failed')), \
+                mock.patch.object(airr.io.RearrangementReader, 'close', autospec=True,
+                                  side_effect=airr.io.RearrangementReader.close) as close, \
+                contextlib.redirect_stderr(StringIO()):
+            self.assertFalse(airr.tools.convert_cmd(self.output_parquet, self.rearrangement_good))
+        close.assert_called_once()
+        result = airr.read_rearrangement(self.output_parquet)
+        self.assertEqual(list(result), [], 'arrow_rearrangement(): failed conversion not closed')
+        result.close()
+
+    # @unittest.skip('-> compressed_rearrangement(): skipped\n')
+    def test_compressed_rearrangement(self):
+        reader = airr.read_rearrangement(self.rearrangement_good)
+        rows = list(reader)
+        reader.close()
+        df = airr.load_rearrangement(self.rearrangement_good)
+
+        # zstd requires the optional zstandard package
+        extensions = ['.gz', '.bz2', '.xz']
+        if importlib.util.find_spec('zstandard'):
+            extensions.append('.zst')
+
+        for ext in extensions:
+            output = self.output_rearrangement + ext
+
+            # Compression from the extension
+            writer = airr.create_rearrangement(output, fields=reader.fields, level=1)
+            writer.writerows(rows)
+            writer.close()
+            with open(output, 'rb') as handle:
+                self.assertNotEqual(handle.read(1), b'r', 'compressed_rearrangement(): %s not compressed' % ext)
+            result = airr.read_rearrangement(output)
+            self.assertEqual(list(result), rows, 'compressed_rearrangement(): read failed for %s' % ext)
+            result.close()
+
+            # Data frames
+            self.assertTrue(airr.dump_rearrangement(df, output))
+            result = airr.load_rearrangement(output)
+            self.assertTrue(result[df.columns].equals(df), 'compressed_rearrangement(): load failed for %s' % ext)
+
+        # Explicit compression and unknown compression
+        writer = airr.derive_rearrangement(self.output_rearrangement, self.rearrangement_good, compression='xz')
+        writer.writerows(rows)
+        writer.close()
+        with open(self.output_rearrangement, 'rb') as handle:
+            self.assertEqual(handle.read(6), b'\xfd7zXZ\x00', 'compressed_rearrangement(): xz failed')
+        with self.assertRaises(ValueError):
+            airr.create_rearrangement(self.output_rearrangement, compression='zip')
+
+    # @unittest.skip('-> compressed_input(): skipped\n')
+    def test_compressed_input(self):
+        reader = airr.read_rearrangement(self.rearrangement_good)
+        rows = list(reader)
+        reader.close()
+        df = airr.load_rearrangement(self.rearrangement_good)
+
+        # zstd requires the optional zstandard package
+        compressions = ['gzip', 'bz2', 'xz']
+        if importlib.util.find_spec('zstandard'):
+            compressions.append('zstd')
+
+        for compression in compressions:
+            # Compression is detected from the contents of files without a compression extension
+            writer = airr.create_rearrangement(self.output_rearrangement, fields=reader.fields,
+                                               compression=compression)
+            writer.writerows(rows)
+            writer.close()
+            result = airr.read_rearrangement(self.output_rearrangement, mmap=True)
+            self.assertEqual(list(result), rows, 'compressed_input(): read failed for %s' % compression)
+            result.close()
+            result = airr.load_rearrangement(self.output_rearrangement)
+            self.assertTrue(result[df.columns].equals(df), 'compressed_input(): load failed for %s' % compression)
+            self.assertTrue(airr.validate_rearrangement(self.output_rearrangement, workers=2),
+                            'compressed_input(): validate failed for %s' % compression)
+            self.assertTrue(airr.merge_rearrangement(self.output_reference,
+                                                     [self.output_rearrangement, self.rearrangement_good]))
+            result = airr.read_rearrangement(self.output_reference)
+            self.assertEqual(list(result), rows + rows, 'compressed_input(): merge failed for %s' % compression)
+            result.close()
+
+        # Pipes are read once
+        if os.path.exists('/dev/stdin'):
+            with open(self.rearrangement_good, 'rb') as handle:
+                text = handle.read()
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+            for data in (text, gzip.compress(text)):
+                for call in ('len(list(airr.read_rearrangement("/dev/stdin", mmap=True)))',
+                             'len(airr.load_rearrangement("/dev/stdin"))',
+                             'airr.validate_rearrangement("/dev/stdin", workers=2)'):
+                    result = subprocess.run([sys.executable, '-c', 'import airr; print(%s)' % call], input=data,
+                                            env=env, capture_output=True, timeout=60)
+                    self.assertEqual(result.stdout.strip(), b'True' if 'validate' in call else str(len(rows)).encode(),
+                                     'compressed_input(): %s failed' % call)
+
+        # Compressed data files
+        data = airr.read_airr(self.combined_json)
+        with open(self.combined_json, 'rb') as handle, gzip.open(self.output_good + '.gz', 'wb') as output:
+            output.write(handle.read())
+        self.assertEqual(airr.read_airr(self.output_good + '.gz'), data, 'compressed_input(): read_airr failed')
+
+    # @unittest.skip('-> yaml_backends(): skipped\n')
+    def test_yaml_backends(self):
+        import yaml
+        from collections import OrderedDict
+        from airr.interface import _yaml_dumper, _yaml_loader
+
+        # Mappings are written in order with both backends
+        ordered = OrderedDict([('b', 1), ('a', {'d': 2, 'c': [OrderedDict([('f', 3), ('e', 4)])]})])
+        for libyaml in (True, False):
+            text = yaml.dump(ordered, Dumper=_yaml_dumper(libyaml=libyaml), default_flow_style=False, sort_keys=False)
+            self.assertEqual(text, 'b: 1\na:\n  d: 2\n  c:\n  - f: 3\n    e: 4\n',
+                             'yaml_backends(): libyaml=%s output differs' % libyaml)
+
+        data = airr.read_airr(self.rep_good)
+        rep = data['Repertoire'][0]
+        airr.write_airr(self.output_yaml, data)
+        with open(self.output_yaml, 'r') as handle:
+            text = handle.read()
+        self.assertNotIn('!!python', text, 'yaml_backends(): tagged output')
+
+        # Keys are read in order with both backends
+        result = airr.read_airr(self.output_yaml)
+        self.assertListEqual(list(result['Repertoire'][0]), list(rep))
+        self.assertEqual(yaml.load(text, Loader=_yaml_loader(libyaml=False)), result)
+
+        # Files of OrderedDict objects written by previous versions
+        with open(self.output_yaml, 'w') as handle:
+            yaml.dump(OrderedDict([('Repertoire', [OrderedDict(rep)])]), handle, default_flow_style=False)
+        self.assertEqual(airr.read_airr(self.output_yaml)['Repertoire'], [rep])
+
+    # @unittest.skip('-> lazy_imports(): skipped\n')
+    def test_lazy_imports(self):
+        # pandas and yaml are imported by the functions using them
+        script = 'import sys, airr, airr.tools; ' \
+                 'airr.read_rearrangement(sys.argv[1]).close(); ' \
+                 'print(" ".join(m for m in ("pandas", "yaml", "yamlordereddictloader") if m in sys.modules))'
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        result = subprocess.run([sys.executable, '-c', script, self.rearrangement_good],
+                                env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '', 'lazy_imports(): modules imported by airr')
+
     # @unittest.skip('-> repertoire_template(): skipped\n')
     def test_repertoire_template(self):
         try:
@@ -133,6 +616,27 @@ class TestInferface(unittest.TestCase):
             print(type(inst))
             raise inst
 
+        # Parallel validation reports the same errors in record order
+        with open(self.rearrangement_good, 'r') as handle:
+            lines = handle.readlines()
+        header = lines[0].split('\t')
+        for i, f in ((2, 'junction_length'), (6, 'productive'), (8, 'v_score')):
+            values = lines[i].split('\t')
+            values[header.index(f)] = 'abc'
+            lines[i] = '\t'.join(values)
+        with open(self.output_rearrangement, 'w') as handle:
+            handle.writelines(lines)
+        errors = []
+        for workers in (1, 2, 4):
+            with contextlib.redirect_stderr(StringIO()) as stderr:
+                result = airr.validate_rearrangement(self.output_rearrangement, debug=True, workers=workers)
+            self.assertFalse(result, 'validate(workers=%i): bad data failed' % workers)
+            errors.append(stderr.getvalue())
+        self.assertEqual(errors[1], errors[0], 'validate(workers=2): errors failed')
+        self.assertEqual(errors[2], errors[0], 'validate(workers=4): errors failed')
+        self.assertTrue(airr.validate_rearrangement(self.rearrangement_good, workers=2),
+                        'validate(workers=2): good data failed')
+
     # @unittest.skip('-> read_airr(): skipped\n')
     def test_read_airr(self):
         # Good data
@@ -5,9 +5,12 @@ Unit tests for interface
 import os
 import time
 import unittest
+from io import StringIO
+from unittest import mock
 
 # Load imports
 from airr.io import *
+from airr.index import index_rearrangement, read_index
 
 # Paths
 test_path = os.path.dirname(os.path.realpath(__file__))
@@ -22,6 +25,7 @@ class TestRearrangementReader(unittest.TestCase):
         self.data_good = os.path.join(data_path, 'good_rearrangement.tsv')
         self.data_bad = os.path.join(data_path, 'bad_rearrangement.tsv')
         self.data_extra = os.path.join(data_path, 'extra_rearrangement.tsv')
+        self.output_data = os.path.join(data_path, 'output_rearrangement.tsv')
 
         # Start timer
         self.start = time.time()
@@ -30,6 +34,224 @@ class TestRearrangementReader(unittest.TestCase):
         t = time.time() - self.start
         print('<- %.3f %s()' % (t, self.id()))
 
+    # @unittest.skip('-> read(): skipped\n')
+    def test_read(self):
+        # Types and coordinates
+        with open(self.data_good, 'r') as handle:
+            reader = RearrangementReader(handle)
+            row = next(iter(reader))
+        self.assertEqual(row['sequence_id'], 'IVKNQEJ01BVGQ6')
+        self.assertIs(row['rev_comp'], True)
+        self.assertEqual(row['junction_length'], 36)
+        self.assertEqual(row['v_score'], 430.0)
+        self.assertIsNone(row['c_score'])
+        self.assertEqual(row['d_sequence_start'], 278)
+        self.assertEqual(row['d_sequence_end'], 287)
+
+        # Unchanged coordinates
+        with open(self.data_good, 'r') as handle:
+            reader = RearrangementReader(handle, base=0)
+            row = next(iter(reader))
+        self.assertEqual(row['d_sequence_start'], 279)
+        self.assertEqual(row['d_sequence_end'], 287)
+
+    # @unittest.skip('-> rows(): skipped\n')
+    def test_rows(self):
+        with open(self.data_good, 'r') as handle:
+            expected = list(RearrangementReader(handle))
+
+        # Tuples
+        with open(self.data_good, 'r') as handle:
+            reader = RearrangementReader(handle, rows='tuple')
+            result = list(reader)
+        self.assertEqual([dict(zip(reader.fields, r)) for r in result], expected)
+
+        # Records
+        with open(self.data_good, 'r') as handle:
+            reader = RearrangementReader(handle, rows='record')
+            result = list(reader)
+        self.assertEqual([r._asdict() for r in result], expected)
+        self.assertEqual(result[0].sequence_id, 'IVKNQEJ01BVGQ6')
+        self.assertEqual(result[0].d_sequence_start, 278)
+        self.assertIs(type(result[0]), type(result[-1]))
+        with self.assertRaises(AttributeError):
+            result[0].not_a_field = 1
+
+        # Field names shadowing the record attributes
+        for name in ('_fields', '_asdict', 'count', 'index'):
+            data = 'sequence_id\t%s\na\tb\n' % name
+            self.assertRaises(ValueError, list, RearrangementReader(StringIO(data), rows='record'))
+            self.assertEqual(list(RearrangementReader(StringIO(data))), [{'sequence_id': 'a', name: 'b'}])
+
+        # Invalid mode
+        with open(self.data_good, 'r') as handle:
+            self.assertRaises(ValueError, RearrangementReader, handle, rows='list')
+
+    # @unittest.skip('-> fields(): skipped\n')
+    def test_fields(self):
+        fields = ['junction_length', 'sequence_id', 'd_sequence_start', 'clone_id']
+        with open(self.data_good, 'r') as handle:
+            expected = [{f: r.get(f) for f in fields} for r in RearrangementReader(handle)]
+
+        # Dictionaries
+        with open(self.data_good, 'r') as handle:
+            reader = RearrangementReader(handle, fields=fields)
+            result = list(reader)
+        self.assertEqual(result, expected)
+        self.assertEqual(list(result[0]), fields)
+
+        # Records
+        with open(self.data_good, 'r') as handle:
+            result = list(RearrangementReader(handle, rows='record', fields=fields))
+        self.assertEqual(result[0]._fields, tuple(fields))
+        self.assertEqual([r._asdict() for r in result], expected)
+
+        # Invalid values outside of the projection are not validated
+        with open(self.data_good, 'r') as handle:
+            data = handle.read().replace('\t430\t', '\tbad\t')
+        reader = RearrangementReader(StringIO(data), validate=True, fields=['sequence_id', 'v_score'])
+        self.assertRaises(ValidationError, list, reader)
+        reader = RearrangementReader(StringIO(data), validate=True, fields=['sequence_id', 'j_score'])
+        self.assertEqual(len(list(reader)), 9)
+
+        # Header is validated against all fields
+        with open(self.data_bad, 'r') as handle:
+            reader = RearrangementReader(handle, validate=True, fields=['sequence_id'])
+            self.assertRaises(ValidationError, iter, reader)
+
+    # @unittest.skip('-> mmap(): skipped\n')
+    def test_mmap(self):
+        fields = ['junction_length', 'sequence_id', 'd_sequence_start', 'clone_id']
+        for projection in (None, fields):
+            with open(self.data_good, 'r') as handle:
+                expected = list(RearrangementReader(handle, fields=projection))
+            with open(self.data_good, 'rb') as handle:
+                reader = MmapRearrangementReader(handle, fields=projection)
+                self.assertEqual(list(reader), expected)
+                reader.close()
+
+        # Line terminators, blank lines and quoted values
+        with open(self.data_good, 'r') as handle:
+            lines = handle.read().splitlines()
+        lines[2] = lines[2].replace('IGHV4-31*03', '"IGHV4-31*03\tIGHV4-31*05"', 1)
+        lines.insert(4, '')
+        with open(self.output_data, 'w', newline='') as handle:
+            handle.write('\r\n'.join(lines))
+        with open(self.output_data, 'r') as handle:
+            expected = list(RearrangementReader(handle))
+        self.assertEqual(expected[1]['v_call'], 'IGHV4-31*03\tIGHV4-31*05')
+        with open(self.output_data, 'rb') as handle:
+            reader = MmapRearrangementReader(handle, validate=True)
+            self.assertEqual(list(reader), expected)
+            reader.close()
+
+        # Empty file
+        with open(self.output_data, 'w') as handle:
+            pass
+        with open(self.output_data, 'rb') as handle:
+            reader = MmapRearrangementReader(handle)
+            self.assertEqual(list(reader), [])
+            reader.close()
+
+    # @unittest.skip('-> get(): skipped\n')
+    def test_get(self):
+        # Line terminators, blank lines and quoted values
+        with open(self.data_good, 'r') as handle:
+            lines = handle.read().splitlines()
+        lines[2] = lines[2].replace('IGHV4-31*03', '"IGHV4-31*03\tIGHV4-31*05"', 1)
+        lines.insert(4, '')
+        with open(self.output_data, 'w', newline='') as handle:
+            handle.write('\r\n'.join(lines))
+        if os.path.exists(self.output_data + '.sidx'):
+            os.remove(self.output_data + '.sidx')
+        with open(self.output_data, 'r') as handle:
+            expected = list(RearrangementReader(handle))
+        ids = [r['sequence_id'] for r in expected]
+
+        # Index is built on first use
+        with open(self.output_data, 'r') as handle:
+            reader = RearrangementReader(handle)
+            self.assertEqual(reader.get(ids[1]), expected[1])
+            self.assertTrue(os.path.exists(self.output_data + '.sidx'))
+            self.assertEqual(reader.get_many(ids[::-1] + ['missing']), expected[::-1] + [None])
+            self.assertEqual(list(reader), expected)
+        with open(self.output_data, 'rb') as handle:
+            reader = MmapRearrangementReader(handle, rows='tuple', fields=['sequence_id', 'v_call'])
+            self.assertEqual(reader.get(ids[1]), (ids[1], 'IGHV4-31*03\tIGHV4-31*05'))
+            reader.close()
+
+        # Index is rebuilt when the file changes
+        with open(self.output_data, 'a') as handle:
+            handle.write('\n' + lines[1].replace(ids[0], 'added') + '\n')
+        with open(self.output_data, 'r') as handle:
+            reader = RearrangementReader(handle)
+            row = reader.get('added')
+        self.assertEqual(row['sequence_id'], 'added')
+        self.assertEqual(row['v_call'], expected[0]['v_call'])
+
+        # Index of another field is rebuilt
+        index_rearrangement(self.output_data, field='v_call')
+        with open(self.output_data, 'r') as handle:
+            self.assertEqual(RearrangementReader(handle).get_many(ids[:2]), expected[:2])
+        self.assertIsNone(read_index(self.output_data, field='v_call'))
+        self.assertIsNotNone(read_index(self.output_data))
+
+        # Index is kept in memory when it cannot be written
+        os.remove(self.output_data + '.sidx')
+        with mock.patch('airr.index.os.replace', side_effect=PermissionError('read-only')):
+            with open(self.output_data, 'r') as handle:
+                self.assertEqual(RearrangementReader(handle).get(ids[1]), expected[1])
+        self.assertFalse(os.path.exists(self.output_data + '.sidx'))
+        self.assertFalse(os.path.exists(self.output_data + '.sidx.tmp'))
+
+    # @unittest.skip('-> iter_batches(): skipped\n')
+    def test_iter_batches(self):
+        with open(self.data_good, 'r') as handle:
+            expected = list(RearrangementReader(handle))
+
+        with open(self.data_good, 'r') as handle:
+            reader = RearrangementReader(handle)
+            batches = list(reader.iter_batches(4))
+        self.assertListEqual([len(b['sequence_id']) for b in batches], [4, 4, 1])
+
+        # Typed columns
+        batch = batches[0]
+        self.assertEqual(batch['junction_length'].dtype, 'int64')
+        self.assertEqual(batch['v_score'].dtype, 'float64')
+        self.assertEqual(batch['rev_comp'].dtype, 'bool')
+        self.assertIsInstance(batch['sequence_id'], list)
+
+        # Values match the row reader
+        for f in ('sequence_id', 'junction_length', 'd_sequence_start', 'rev_comp', 'v_score'):
+            values = [x for b in batches for x in (b[f].tolist() if hasattr(b[f], 'tolist') else b[f])]
+            self.assertListEqual(values, [r[f] for r in expected])
+
+        # Missing values
+        self.assertTrue(all(x != x for x in batch['c_score']))
+        with open(self.data_good, 'r') as handle:
+            data = handle.read().replace('\t36\t', '\t\t', 1)
+        batch = next(RearrangementReader(StringIO(data)).iter_batches(4))
+        self.assertListEqual(batch['junction_length'].mask.tolist(), [True, False, False, False])
+
+        # Blocks with quotes, blank lines and short rows
+        with open(self.data_good, 'r') as handle:
+            lines = handle.read().split('\n')
+        lines[2] = '"x\ty"' + lines[2][lines[2].index('\t'):]
+        lines[5] = '\t'.join(lines[5].split('\t')[:20])
+        lines.insert(7, '')
+        with open(self.output_data, 'w') as handle:
+            handle.write('\n'.join(lines))
+        with open(self.output_data, 'r') as handle:
+            expected = list(RearrangementReader(handle))
+        self.assertEqual(expected[1]['rearrangement_id'], 'x\ty')
+        for cls, mode in ((RearrangementReader, 'r'), (MmapRearrangementReader, 'rb')):
+            with open(self.output_data, mode) as handle:
+                batches = list(cls(handle).iter_batches(3))
+            self.assertListEqual([len(b['sequence_id']) for b in batches], [3, 3, 3])
+            for f in ('rearrangement_id', 'junction_length', 'd_sequence_start', 'rev_comp', 'v_score'):
+                values = [x for b in batches for x in (b[f].tolist() if hasattr(b[f], 'tolist') else b[f])]
+                self.assertListEqual(values, [r[f] for r in expected])
+
     # @unittest.skip('-> validate(): skipped\n')
     def test_validate(self):
         # Good data
@@ -68,5 +290,62 @@ class TestRearrangementReader(unittest.TestCase):
             raise inst
 
 
+class TestRearrangementWriter(unittest.TestCase):
+    def setUp(self):
+        print('-------> %s()' % self.id())
+
+        # Test data
+        self.data_good = os.path.join(data_path, 'good_rearrangement.tsv')
+        with open(self.data_good, 'r') as handle:
+            reader = RearrangementReader(handle)
+            self.rows = list(reader)
+            self.fields = reader.fields
+
+        # Start timer
+        self.start = time.time()
+
+    def tearDown(self):
+        t = time.time() - self.start
+        print('<- %.3f %s()' % (t, self.id()))
+
+    # @unittest.skip('-> write(): skipped\n')
+    def test_write(self):
+        # Single rows
+        handle = StringIO()
+        writer = RearrangementWriter(handle, fields=self.fields)
+        for r in self.rows:
+            writer.write(r)
+        expected = handle.getvalue()
+
+        # Coordinates and booleans are converted back to the input representation
+        with open(self.data_good, 'r') as handle:
+            header = handle.readline().rstrip('\n').split('\t')
+            data = [dict(zip(header, line.rstrip('\n').split('\t'))) for line in handle]
+        result = [dict(zip(writer.fields, line.split('\t'))) for line in expected.splitlines()[1:]]
+        for f in ('sequence_id', 'rev_comp', 'v_sequence_start', 'd_sequence_start', 'junction_length'):
+            self.assertListEqual([r[f] for r in result], [r[f] for r in data])
+
+        # Multiple rows
+        handle = StringIO()
+        writer = RearrangementWriter(handle, fields=self.fields)
+        writer.writerows(self.rows, buffer_size=4)
+        self.assertEqual(handle.getvalue(), expected)
+
+        # Column batches
+        handle = StringIO()
+        writer = RearrangementWriter(handle, fields=self.fields)
+        with open(self.data_good, 'r') as input:
+            for batch in RearrangementReader(input).iter_batches(4):
+                writer.write_batch(batch)
+        self.assertEqual(handle.getvalue(), expected)
+
+        # Column batches as lists with missing fields
+        handle = StringIO()
+        writer = RearrangementWriter(handle, fields=self.fields)
+        writer.write_batch({f: [r[f] for r in self.rows] for f in self.fields if f != 'c_call'})
+        self.assertEqual(handle.getvalue(), expected)
+        self.assertRaises(ValueError, writer.write_batch, {'sequence_id': ['a'], 'sequence': ['A', 'C']})
+
+
 if __name__ == '__main__':
     unittest.main()
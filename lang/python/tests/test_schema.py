@@ -0,0 +1,178 @@
+"""
+Unit tests for schema
+"""
+# System imports
+import contextlib
+import copy
+import hashlib
+import os
+import pathlib
+import pickle
+import shutil
+import tempfile
+import time
+import unittest
+from io import StringIO
+
+# Load imports
+import airr
+from airr.schema import *
+from airr.schema import get_schema
+from airr.specs.cache import CACHE_FILE, SPEC_FILE, _parse, load_spec, write_cache
+
+# Paths
+test_path = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(test_path, 'data')
+
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        print('-------> %s()' % self.id())
+
+        # Test data
+        self.rep_good = os.path.join(data_path, 'good_repertoire.yaml')
+        self.data_files = [os.path.join(data_path, f) for f in sorted(os.listdir(data_path))
+                           if f.endswith(('.yaml', '.json')) and not f.startswith('output')]
+
+        # Start timer
+        self.start = time.time()
+
+    def tearDown(self):
+        t = time.time() - self.start
+        print('<- %.3f %s()' % (t, self.id()))
+
+    # @unittest.skip('-> registry(): skipped\n')
+    def test_registry(self):
+        # Schema objects are shared
+        self.assertIs(get_schema('Repertoire'), RepertoireSchema)
+        self.assertIs(get_schema('Repertoire'), AIRRSchema['Repertoire'])
+        self.assertIs(get_schema('SampleProcessing'), get_schema('SampleProcessing'))
+        self.assertListEqual(get_schema('SampleProcessing').required,
+                             Schema('SampleProcessing').required)
+        with self.assertRaises(KeyError):
+            get_schema('Missing')
+
+        # Validation and templates resolve references through the registry
+        rep = airr.read_airr(self.rep_good)['Repertoire'][0]
+        self.assertTrue(RepertoireSchema.validate_object(rep))
+        rep['sample'][0]['pcr_target'][0]['pcr_target_locus'] = 'XYZ'
+        with self.assertRaises(ValidationError):
+            RepertoireSchema.validate_object(rep)
+        self.assertEqual(RepertoireSchema.template(), Schema('Repertoire').template())
+
+    # @unittest.skip('-> cache(): skipped\n')
+    def test_cache(self):
+        specs = os.path.join(os.path.dirname(airr.schema.__file__), 'specs')
+        with open(os.path.join(specs, SPEC_FILE), 'rb') as handle:
+            data = handle.read()
+        with open(os.path.join(specs, CACHE_FILE), 'rb') as handle:
+            cached = pickle.load(handle)
+
+        # Packaged cache is up to date
+        self.assertEqual(cached['sha256'], hashlib.sha256(data).hexdigest(),
+                         'cache(): %s is out of date, run python airr/specs/cache.py' % CACHE_FILE)
+        self.assertEqual(cached['spec'], _parse(data))
+        self.assertEqual(airr.schema.DEFAULT_SPEC, cached['spec'])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            spec_file = pathlib.Path(temp_dir, SPEC_FILE)
+            cache_file = pathlib.Path(temp_dir, CACHE_FILE)
+            shutil.copy(os.path.join(specs, SPEC_FILE), spec_file)
+
+            # Missing cache
+            self.assertEqual(load_spec(spec_file, cache_file), cached['spec'])
+
+            # Stale cache
+            write_cache(temp_dir)
+            self.assertEqual(load_spec(spec_file, cache_file), cached['spec'])
+            with open(spec_file, 'ab') as handle:
+                handle.write(b'\nExtra:\n    type: object\n')
+            spec = load_spec(spec_file, cache_file)
+            self.assertIn('Extra', spec)
+
+            # Unreadable cache
+            cache_file.write_bytes(b'invalid')
+            self.assertIn('Extra', load_spec(spec_file, cache_file))
+
+    # @unittest.skip('-> table(): skipped\n')
+    def test_table(self):
+        # Entries are built on first access and shared with the registry
+        table = airr.schema._SchemaTable({'Repertoire': 'Repertoire', 'Cell': 'Cell'})
+        self.assertEqual(len(table), 2)
+        self.assertListEqual(list(table), ['Repertoire', 'Cell'])
+        self.assertIn('Cell', table)
+        self.assertNotIn('Missing', table)
+        self.assertEqual(len(table._schemas), 0)
+        self.assertIs(table['Cell'], get_schema('Cell'))
+        self.assertListEqual(list(table._schemas), ['Cell'])
+        with self.assertRaises(KeyError):
+            table['Missing']
+
+        # Assigned schemas replace the definitions
+        schema = Schema('Cell')
+        table['Cell'] = schema
+        self.assertIs(table['Cell'], schema)
+        del table['Cell']
+        self.assertNotIn('Cell', table)
+        self.assertEqual(len(table), 1)
+
+        self.assertIs(AIRRSchema['GermlineSet'], GermlineSetSchema)
+        self.assertIn('Rearrangement', AIRRSchema)
+
+    # @unittest.skip('-> compile(): skipped\n')
+    def test_compile(self):
+        def outcome(validate, obj, **kwargs):
+            stderr = StringIO()
+            with contextlib.redirect_stderr(stderr):
+                try:
+                    result = validate(obj, **kwargs)
+                except Exception as e:
+                    result = (type(e).__name__, str(e))
+            return result, stderr.getvalue()
+
+        def mutations(obj):
+            # Copies of an object with each nested field removed or replaced
+            if isinstance(obj, dict):
+                for k in obj:
+                    for value in (None, 'x', 1, ['x'], {}):
+                        yield dict(obj, **{k: value})
+                    yield {x: v for x, v in obj.items() if x != k}
+                    for v in mutations(obj[k]):
+                        yield dict(obj, **{k: v})
+                yield dict(obj, extra='x')
+            elif isinstance(obj, list):
+                for i, x in enumerate(obj):
+                    for v in mutations(x):
+                        yield obj[:i] + [v] + obj[i + 1:]
+                yield obj + ['x']
+
+        count = 0
+        for filename in self.data_files:
+            if 'combined' in filename:
+                continue
+            data = airr.read_airr(filename)
+            for k, objects in data.items():
+                if k in ('Info', 'DataFile') or not objects:
+                    continue
+                schema = get_schema(k)
+                validate = schema.compile()
+                records = objects.values() if hasattr(objects, 'items') else objects
+                for record in list(records)[:1]:
+                    for obj in [record] + list(mutations(copy.deepcopy(record))):
+                        for kwargs in ({}, {'check_nullable': False, 'context': 'root'}):
+                            self.assertEqual(outcome(validate, obj, **kwargs),
+                                             outcome(schema.validate_object, obj, **kwargs),
+                                             'compile(): %s %s differs' % (os.path.basename(filename), k))
+                            count += 1
+        self.assertGreater(count, 1000)
+
+        # validate_airr results match
+        for filename in self.data_files:
+            data = airr.read_airr(filename)
+            self.assertEqual(outcome(airr.validate_airr, data, debug=True),
+                             outcome(airr.validate_airr, data, debug=True, compiled=False),
+                             'compile(): validate_airr %s differs' % os.path.basename(filename))
+
+
+if __name__ == '__main__':
+    unittest.main()